@@ -1,13 +1,77 @@
 # closer.py
+import time
 import argparse
+from concurrent.futures import ThreadPoolExecutor, Future, as_completed
+from datetime import date, timedelta
+from typing import List, Optional, Tuple
 from dotenv import load_dotenv
 from utils.db import create_connection
+from utils.archive import archive_auction
+from utils.writer import run_write
+from utils.analytics import refresh_price_stats
 from scraper import scrape_auction 
 # NEW: Import Constants
-from utils.parse import KEY_CURRENT_BID, KEY_PROD_ID, KEY_SOLD_PRICE, KEY_IS_WON
+from utils.parse import KEY_CURRENT_BID, KEY_PROD_ID, KEY_SOLD_PRICE, KEY_IS_WON, KEY_SOURCE_AUCTION, KEY_SOURCE_LOT
 
 load_dotenv(override=True)
 
+CLOSE_ALL = "close-all"
+CLOSE_WORKERS = 4  # Concurrent price refreshes; each one is a paced scrape of its own
+
+def _harvest_and_purge(conn, auction_id: int, source_name: str, close_date: str) -> None:
+    cursor = conn.cursor()
+
+    # 3. HARVEST MARKET DATA (Set-based, keyed by auction + lot so a retried close records nothing twice)
+    print("🧠 Harvesting market data...")
+    cursor.execute(f"""
+        INSERT OR IGNORE INTO product_price_history (product_id, sold_price, sold_date, auction_source, {KEY_SOURCE_AUCTION}, {KEY_SOURCE_LOT})
+        SELECT {KEY_PROD_ID}, {KEY_CURRENT_BID}, ?, ?, auction_id, lot
+        FROM auction_items
+        WHERE auction_id = ? AND {KEY_PROD_ID} IS NOT NULL AND {KEY_CURRENT_BID} > 0
+        ORDER BY id
+    """, (close_date, source_name, auction_id))
+    # Running aggregates (and avg_sold_price) are updated in O(1) per new sale by trigger;
+    # ignored rows fire nothing, so only products that gained sales are touched
+    print(f"  Recorded {cursor.rowcount} new sales.")
+
+    # 4. MIGRATE WON ITEMS
+    print("📦 Moving winners to Inventory...")
+    cursor.execute(f"""
+        INSERT INTO inventory_ledger (product_id, auction_source, lot_number, purchase_price, total_cost, status, notes)
+        SELECT {KEY_PROD_ID}, ?, lot, {KEY_CURRENT_BID}, {KEY_CURRENT_BID}, 'In Stock', 'Won: ' || IFNULL(title, '')
+        FROM auction_items
+        WHERE auction_id = ? AND {KEY_IS_WON} = 1
+        ORDER BY id
+    """, (source_name, auction_id))
+    print(f"  Moved {cursor.rowcount} items.")
+
+    # 5. ARCHIVE (Lot-level data goes to Parquet before it leaves the hot DB)
+    print("🗄️ Archiving lots...")
+    archive_path = archive_auction(conn, auction_id)
+    print(f"  Saved to {archive_path}")
+
+    # 6. PURGE (Lots explicitly: FK cascades aren't enforced on our connections)
+    print("🗑️ Deleting auction...")
+    cursor.execute("DELETE FROM auction_items WHERE auction_id = ?", (auction_id,))
+    cursor.execute("DELETE FROM auctions WHERE id = ?", (auction_id,))
+
+def _refresh_prices(auction_url: str) -> float:
+    # 2. REFRESH PRICES (Scraper Mode: Update). Returns seconds spent.
+    start = time.perf_counter()
+    try:
+        scrape_auction(auction_url, is_update=True)
+    except Exception as e:
+        print(f"⚠️ Scrape warning: {e}. Using cached data.")
+    return time.perf_counter() - start
+
+def _close_auction(conn, auction_id: int, auc_title: str, auctioneer: str, end_date: str) -> float:
+    # 3-6. One transaction on the writer thread; any failure rolls the whole close back
+    start = time.perf_counter()
+    source_name = f"{auctioneer} - {auc_title}"
+    close_date = end_date or "Unknown"
+    run_write(conn, _harvest_and_purge, auction_id, source_name, close_date)
+    return time.perf_counter() - start
+
 def process_closed_auction(auction_url: str):
     conn = create_connection()
     cursor = conn.cursor()
@@ -16,60 +80,83 @@ def process_closed_auction(auction_url: str):
         # 1. Get Auction Info
         res = cursor.execute("SELECT id, auction_title, auctioneer, end_date FROM auctions WHERE url = ?", (auction_url,)).fetchone()
         if not res: print("Auction not found."); return
-        
-        auction_id, auc_title, auctioneer, end_date = res
-        source_name = f"{auctioneer} - {auc_title}"
-        close_date = end_date or "Unknown"
 
-        # 2. REFRESH PRICES (Scraper Mode: Update)
         print("🕷️ Refreshing final prices...")
-        try:
-            scrape_auction(auction_url, is_update=True)
-        except Exception as e:
-            print(f"⚠️ Scrape warning: {e}. Using cached data.")
-
-        # 3. HARVEST MARKET DATA
-        print("🧠 Harvesting market data...")
-        # Uses Constants in SQL logic where appropriate, though SQL structure is fixed
-        market_items = cursor.execute(f"""
-            SELECT {KEY_PROD_ID}, {KEY_CURRENT_BID} FROM auction_items 
-            WHERE auction_id = ? AND {KEY_PROD_ID} IS NOT NULL AND {KEY_CURRENT_BID} > 0
-        """, (auction_id,)).fetchall()
-        
-        for pid, price in market_items:
-            cursor.execute("INSERT INTO product_price_history (product_id, sold_price, sold_date, auction_source) VALUES (?, ?, ?, ?)", 
-                           (pid, price, close_date, source_name))
-            
-            avg = cursor.execute("SELECT AVG(sold_price) FROM product_price_history WHERE product_id=?", (pid,)).fetchone()[0]
-            if avg: cursor.execute("UPDATE products SET avg_sold_price = ? WHERE id=?", (round(avg,2), pid))
-
-        # 4. MIGRATE WON ITEMS
-        print("📦 Moving winners to Inventory...")
-        won_items = cursor.execute(f"""
-            SELECT {KEY_PROD_ID}, lot, {KEY_CURRENT_BID}, title FROM auction_items 
-            WHERE auction_id = ? AND {KEY_IS_WON} = 1
-        """, (auction_id,)).fetchall()
-        
-        for pid, lot, price, title in won_items:
-            cursor.execute("""
-                INSERT INTO inventory_ledger (product_id, auction_source, lot_number, purchase_price, total_cost, status, notes)
-                VALUES (?, ?, ?, ?, ?, 'In Stock', ?)
-            """, (pid, source_name, lot, price, price, f"Won: {title}"))
-
-        # 5. PURGE
-        print("🗑️ Deleting auction...")
-        cursor.execute("DELETE FROM auctions WHERE id = ?", (auction_id,))
-        conn.commit()
+        _refresh_prices(auction_url)
+
+        _close_auction(conn, *res)
         print("✅ Auction Closed & Cleaned.")
 
+        # 7. Medians/percentiles for products that just gained sales
+        refreshed = refresh_price_stats(conn)
+        print(f"📈 Refreshed price stats for {refreshed} products.")
+
     except Exception as e:
         print(f"Error: {e}")
-        conn.rollback()
     finally:
         conn.close()
 
+# === BULK CLOSE ===
+def find_ended_auctions(conn, through: Optional[str] = None) -> List[tuple]:
+    """Auctions whose end_date is on or before `through` (YYYY-MM-DD, default yesterday)."""
+    if through is None: through = (date.today() - timedelta(days=1)).isoformat()
+    return conn.execute("""
+        SELECT id, url, auction_title, auctioneer, end_date FROM auctions
+        WHERE end_date IS NOT NULL AND end_date != '' AND end_date <= ?
+        ORDER BY end_date, id
+    """, (through,)).fetchall()
+
+def close_all_ended(through: Optional[str] = None, workers: int = CLOSE_WORKERS, report: Optional[List[dict]] = None) -> List[dict]:
+    """
+    Closes every ended auction. Final prices are refreshed for up to `workers` auctions
+    at a time; each auction is harvested and purged in its own transaction as soon as its
+    refresh finishes. Returns one timing row per auction, appended to `report` (if given)
+    as each auction finishes.
+    """
+    conn = create_connection()
+    report = [] if report is None else report
+    try:
+        ended = find_ended_auctions(conn, through)
+        if not ended: print("No ended auctions."); return report
+        print(f"🛑 Closing {len(ended)} ended auctions ({workers} at a time)...")
+
+        with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+            futures = {pool.submit(_refresh_prices, url): (auction_id, url, title, auctioneer, end_date)
+                       for auction_id, url, title, auctioneer, end_date in ended}
+            for fut in as_completed(futures):
+                auction_id, url, title, auctioneer, end_date = futures[fut]
+                row = {"auction_id": auction_id, "title": title, "refresh_s": fut.result(), "close_s": None, "status": "Closed"}
+                try:
+                    row["close_s"] = _close_auction(conn, auction_id, title, auctioneer, end_date)
+                except Exception as e:
+                    row["status"] = f"Error: {e}"
+                report.append(row)
+                print(f"  #{auction_id} {title}: refresh {row['refresh_s']:.1f}s, close {row['close_s'] or 0:.1f}s — {row['status']}")
+
+        refreshed = refresh_price_stats(conn)
+        print(f"📈 Refreshed price stats for {refreshed} products.")
+    finally:
+        conn.close()
+    return report
+
+# One background close-all at a time for the dashboard; module state outlives Streamlit reruns
+_close_all_pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix="close-all")
+
+def start_close_all(through: Optional[str] = None, workers: int = CLOSE_WORKERS) -> Tuple[Future, List[dict]]:
+    """Runs close_all_ended in the background. Returns its future and the report, filled in as auctions close."""
+    report: List[dict] = []
+    return _close_all_pool.submit(close_all_ended, through, workers, report), report
+
 if __name__ == "__main__":
     parser = argparse.ArgumentParser()
-    parser.add_argument("url", type=str)
+    parser.add_argument("url", type=str, help=f"Auction URL, or '{CLOSE_ALL}' to close every ended auction")
+    parser.add_argument("--through", type=str, default=None, help="close-all: last end date to include (YYYY-MM-DD, default yesterday)")
+    parser.add_argument("--workers", type=int, default=CLOSE_WORKERS, help="close-all: auctions refreshed concurrently")
     args = parser.parse_args()
-    process_closed_auction(args.url)
\ No newline at end of file
+    if args.url == CLOSE_ALL:
+        start = time.perf_counter()
+        report = close_all_ended(args.through, args.workers)
+        closed = sum(1 for r in report if r["status"] == "Closed")
+        print(f"✅ Closed {closed}/{len(report)} auctions in {time.perf_counter() - start:.1f}s.")
+    else:
+        process_closed_auction(args.url)
@@ -6,18 +6,18 @@ from components.grid_styles import (
     JS_CHECKBOX_RENDERER, JS_EMPTY_TEXT, JS_ROW_STYLE,
     JS_RISK_CELL_STYLE, JS_PROFIT_STYLE, JS_MSRP_STYLE,
     JS_STYLE_CONDITION, JS_STYLE_FUNCTIONAL, JS_STYLE_PACKAGING, JS_STYLE_BINARY_FLAG,
-    JS_NATURAL_SORT, JS_CURRENCY_SORT, get_persistence_js
+    JS_LOT_SORT, JS_CURRENCY_SORT, get_persistence_js
 )
 # UPDATED IMPORTS: Removed COL_SCRP_MSRP, Added Keys
 from utils.parse import (
     COL_BID, COL_EST_PROFIT, COL_MSRP, COL_MISSING, COL_DMG,
     COL_TITLE, COL_BRAND, COL_MODEL, COL_UPC, COL_ASIN, COL_CAT,
     COL_LOT, COL_PKG, COL_COND, COL_FUNC, COL_RISK, COL_WATCH, COL_SELECT, COL_WON,
-    COL_MSRP_STAT,
+    COL_MSRP_STAT, COL_COMP_MEDIAN, COL_COMP_COUNT, COL_COMP_LAST, COL_COMP_TREND, COL_COMP_DAYS,
     # Keys for hiding columns
     KEY_CURRENT_BID, KEY_IS_HIDDEN, KEY_PROD_ID, KEY_AUC_ID, KEY_SOLD_PRICE,
     KEY_SUG_MSRP, KEY_MASTER_MSRP, KEY_TARGET_PRICE, KEY_PROFIT_VAL,
-    KEY_SCRAPED_CAT, KEY_IS_WON
+    KEY_SCRAPED_CAT, KEY_IS_WON, KEY_LOT_SORT, KEY_COMP_MEDIAN, KEY_COMP_COUNT
 )
 
 
@@ -30,7 +30,8 @@ def _hide_utility_cols(gb, columns):
         KEY_SOLD_PRICE, KEY_SUG_MSRP, 
         "url", "URL", # Keeping these as strings since they vary by source
         KEY_MASTER_MSRP, KEY_TARGET_PRICE, KEY_PROFIT_VAL, 
-        COL_MSRP_STAT, KEY_SCRAPED_CAT, KEY_IS_WON
+        COL_MSRP_STAT, KEY_SCRAPED_CAT, KEY_IS_WON, KEY_LOT_SORT,
+        KEY_COMP_MEDIAN, KEY_COMP_COUNT
     ]
     for col in hidden:
         if col in columns: gb.configure_column(col, hide=True)
@@ -52,11 +53,24 @@ def _setup_metrics_cols(gb, columns):
         gb.configure_column(COL_MSRP, width=80, comparator=JS_CURRENCY_SORT, cellStyle=JS_MSRP_STYLE, type=["numericColumn", "numberColumnFilter"], valueFormatter="x > 0 ? '$' + x.toLocaleString('en-US', {minimumFractionDigits: 2, maximumFractionDigits: 2}) : ''")
     if COL_BID in columns:
         gb.configure_column(COL_BID, width=80, comparator=JS_CURRENCY_SORT)
+    if COL_COMP_MEDIAN in columns:
+        gb.configure_column(COL_COMP_MEDIAN, width=90, comparator=JS_CURRENCY_SORT, type=["numericColumn", "numberColumnFilter"], headerTooltip="Median realized price of past closes", valueFormatter="x > 0 ? '$' + x.toLocaleString('en-US', {minimumFractionDigits: 2, maximumFractionDigits: 2}) : ''")
+    if COL_COMP_COUNT in columns:
+        gb.configure_column(COL_COMP_COUNT, width=70, type=["numericColumn", "numberColumnFilter"], headerTooltip="Number of past closes", valueFormatter="x > 0 ? x : ''")
+    if COL_COMP_LAST in columns:
+        gb.configure_column(COL_COMP_LAST, width=85, comparator=JS_CURRENCY_SORT, type=["numericColumn", "numberColumnFilter"], headerTooltip="Price of the most recent close", valueFormatter="x > 0 ? '$' + x.toLocaleString('en-US', {minimumFractionDigits: 2, maximumFractionDigits: 2}) : ''")
+    if COL_COMP_TREND in columns:
+        gb.configure_column(COL_COMP_TREND, width=85, type=["numericColumn", "numberColumnFilter"], headerTooltip="Price change per day over the last 90 days (least squares)", valueFormatter="x == null ? '' : (x >= 0 ? '+' : '') + '$' + x.toFixed(2) + '/d'")
+    if COL_COMP_DAYS in columns:
+        gb.configure_column(COL_COMP_DAYS, width=85, type=["numericColumn", "numberColumnFilter"], headerTooltip="Days since the most recent close", valueFormatter="x == null ? '' : x + 'd'")
 
 def _setup_widths_and_sorting(gb, columns):
     if COL_TITLE in columns:
         gb.configure_column(COL_TITLE, autoWidth=True, pinned="left", sortable=True, wrapText=True, autoHeight=True)
     
+    if COL_LOT in columns:
+        gb.configure_column(COL_LOT, comparator=JS_LOT_SORT)
+
     tight_cols = [COL_LOT, COL_PKG, COL_COND, COL_FUNC, COL_MISSING, COL_DMG, COL_UPC, COL_ASIN, COL_CAT]
     for col in tight_cols: 
         if col in columns: gb.configure_column(col, width=110)
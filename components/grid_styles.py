@@ -87,7 +87,8 @@ function(params) {
 """)
 
 # 4. SORTERS
-JS_NATURAL_SORT = JsCode(r"""function(a,b){return a.localeCompare(b, undefined, {numeric: true, sensitivity: 'base'});}""")
+# Sorts on the numeric lot_sort rank computed server-side instead of re-parsing lot strings
+JS_LOT_SORT = JsCode(r"""function(a,b,nodeA,nodeB){if(!nodeA||!nodeB||!nodeA.data||!nodeB.data){return String(a).localeCompare(String(b), undefined, {numeric: true});} return nodeA.data.lot_sort - nodeB.data.lot_sort;}""")
 JS_CURRENCY_SORT = JsCode(r"""function(a,b){return (parseFloat(String(a).replace(/[$,]/g,''))||0) - (parseFloat(String(b).replace(/[$,]/g,''))||0);}""")
 
 # 5. PERSISTENCE
@@ -1,7 +1,7 @@
 # components/research.py
 import streamlit as st
 from typing import Any
-from utils.inventory import get_product_by_id, save_product_to_library
+from utils.inventory import get_product_by_id, save_product_to_library, rank_candidates, link_items_to_product
 from components.research_ui import render_product_form_fields
 from utils.ai import extract_data_with_gemini, get_api_key
 # IMPORT ALL NECESSARY CONSTANTS
@@ -115,6 +115,24 @@ def _render_ai_tab():
         with st.expander("View Raw AI Data"):
             st.json(st.session_state.ai_result)
 
+def _render_candidates(conn, item_id, selected_ids):
+    """Ranked library matches for the first selected lot; one click links every selected lot."""
+    ranked = rank_candidates(conn, item_ids=[item_id])
+    if ranked.empty: return
+    with st.expander("🎯 Suggested Matches", expanded=True):
+        for _, cand in ranked.iterrows():
+            c_info, c_conf, c_btn = st.columns([6, 2, 2])
+            with c_info:
+                st.markdown(f"**#{cand['product_id']}** {cand['title'] or ''}")
+                st.caption(f"{cand['brand'] or '-'} | {cand['model'] or '-'}")
+            with c_conf:
+                st.progress(float(cand['confidence']), text=f"{cand['confidence']:.0%}")
+            with c_btn:
+                if st.button("🔗 Link", key=f"cand_{item_id}_{cand['product_id']}", use_container_width=True):
+                    link_items_to_product(conn, int(cand['product_id']), selected_ids)
+                    st.success(f"Linked to Product #{cand['product_id']}.")
+                    st.rerun()
+
 def _render_manual_tab(conn, product_data, is_bulk, is_linked, count, existing_id, selected_ids):
     """Renders the Manual Entry form and Save buttons."""
     with st.form("research_form"):
@@ -175,6 +193,7 @@ def render_research_station(conn, selected_rows):
         st.success(f"✅ Linked to Master Product #{existing_id}")
     else:
         st.warning("🚫 Not in Product Library.")
+        if current_ids: _render_candidates(conn, current_ids[0], current_ids)
 
     # 4. Render Tabs
     tab_manual, tab_ai = st.tabs(["📝 Manual Entry", "🤖 AI Import (Screenshots)"])
@@ -1,7 +1,7 @@
 # components/research_ui.py
 import streamlit as st
 import math
-from utils.shipping import estimate_shipping
+from utils.shipping import quote_cheapest, DEFAULT_ZONE
 # NEW: Import ALL display constants
 from utils.parse import (
     COL_PRD_TITLE, COL_BRAND, COL_MODEL, COL_CAT, COL_UPC, COL_ASIN, COL_MSRP, COL_NOTES,
@@ -57,12 +57,14 @@ def render_product_form_fields(product_data: dict):
             with d2: val_w = st.number_input("W", value=_get_val(product_data, KEY_WIDTH))
             with d3: val_h = st.number_input("H", value=_get_val(product_data, KEY_HEIGHT))
         # --- LIVE CALCULATION & EXPLANATION ---
-        live_ship = estimate_shipping(val_lbs or 0, val_oz or 0, val_l or 0, val_w or 0, val_h or 0)
+        # Same cheapest-service quote the stored cost basis uses (shipping.reprice_shipping)
+        ship_costs, ship_methods = quote_cheapest(val_lbs or 0, val_oz or 0, val_l or 0, val_w or 0, val_h or 0)
+        live_ship = float(ship_costs[0])
         
         if live_ship > 0:
             total_lbs = (val_lbs or 0) + ((val_oz or 0)/16)
             dim_weight = ((val_l or 0) * (val_w or 0) * (val_h or 0)) / 166
-            msg = f"🚚 **Estimated Zone 9 Shipping:** ${live_ship:.2f}"
+            msg = f"🚚 **Estimated Zone {DEFAULT_ZONE} Shipping:** ${live_ship:.2f} via {ship_methods[0]}"
             if dim_weight > total_lbs:
                 msg += f" (Billed as {math.ceil(dim_weight)} lbs Dim Weight)"
             st.info(msg)
@@ -117,11 +119,9 @@ def render_product_form_fields(product_data: dict):
     with tab_profit:
         st.info("Set your 'Target' based on the Market Data in Tab 2.")
         
-        saved_ship = _get_val(product_data, KEY_SHIP_COST)
-        calculated_ship = live_ship 
-        display_ship = saved_ship if saved_ship else calculated_ship
-        if calculated_ship > 0 and (saved_ship is None or saved_ship == 0):
-            display_ship = calculated_ship
+        # A product with a weight is priced by shipping.reprice_shipping on save, so a typed cost
+        # would be overwritten: show the quote read-only and only take manual costs without a weight
+        has_weight = (val_lbs or 0) > 0 or (val_oz or 0) > 0
 
         m1, m2, m3 = st.columns(3)
         with m1:
@@ -129,7 +129,11 @@ def render_product_form_fields(product_data: dict):
         with m2: 
             val_target = st.number_input("🎯 Target Sell Price ($)", min_value=0.0, value=_get_val(product_data, KEY_DB_TARGET), step=1.0)
         with m3:
-            val_ship_cost = st.number_input("🚚 Est. Shipping Cost ($)", min_value=0.0, value=display_ship, step=1.0)
+            if has_weight:
+                val_ship_cost = st.number_input("🚚 Est. Shipping Cost ($)", min_value=0.0, value=live_ship, step=1.0, disabled=True,
+                                                help="Quoted from weight and dimensions. Clear the weight to enter a cost by hand.")
+            else:
+                val_ship_cost = st.number_input("🚚 Est. Shipping Cost ($)", min_value=0.0, value=_get_val(product_data, KEY_SHIP_COST), step=1.0)
         
         st.caption("Profit Formula: Target - (Target * 15% Fee) - Shipping - Bid")
         if val_target and val_ship_cost is not None:
@@ -7,12 +7,13 @@ import time
 
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 from utils.db import create_connection
+from utils.shipping import reprice_shipping, RATE_TABLE_ERRORS
 from scraper import scrape_auction
 # FULL IMPORT OF CONSTANTS
 from utils.parse import (
     PAGE_ACTIVE, PAGE_LIBRARY, 
-    KEY_DB_TARGET, KEY_SHIP_COST, KEY_CURRENT_BID, KEY_EST_PROFIT,
-    COL_LOT, COL_TITLE, COL_CUR_BID, COL_TARGET, COL_EST_PROFIT
+    KEY_DB_TARGET, KEY_SHIP_COST, KEY_CURRENT_BID, KEY_EST_PROFIT, KEY_COMP_MEDIAN,
+    COL_LOT, COL_TITLE, COL_CUR_BID, COL_TARGET, COL_EST_PROFIT, COL_COMP_MEDIAN
 )
 
 st.set_page_config(page_title="AuctApp Dashboard", layout="wide", page_icon="📊")
@@ -25,6 +26,13 @@ try:
     conn = create_connection()
     cursor = conn.cursor()
 
+    # Once per session: picks up products edited elsewhere and rate-table changes
+    if not st.session_state.get("shipping_repriced"):
+        reprice_shipping(conn)
+        st.session_state.shipping_repriced = True
+    for name, reason in RATE_TABLE_ERRORS.items():
+        st.warning(f"⚠️ Rate table `rates/{name}` was skipped: {reason}")
+
     # --- 1. METRICS ---
     c1, c2, c3, c4 = st.columns(4)
     
@@ -55,10 +63,7 @@ try:
             scrape_submitted = st.form_submit_button("🚀 Start Scraping", use_container_width=True)
 
         if scrape_submitted and new_url:
-            # Close UI connection before scraping to prevent locks
-            conn.close()
-            conn = None 
-
+            # Scraper writes go through the shared writer thread (WAL), so the UI connection can stay open
             with st.status("Scraping Auction...", expanded=True) as status:
                 st.write("Initializing scraper...")
                 try:
@@ -70,7 +75,6 @@ try:
                 except Exception as e:
                     status.update(label="Scrape Failed", state="error")
                     st.error(f"Error: {e}")
-                    conn = create_connection() # Re-open if failed
 
     st.divider()
 
@@ -86,9 +90,11 @@ try:
                 i.{KEY_CURRENT_BID}, 
                 p.{KEY_DB_TARGET},
                 p.{KEY_SHIP_COST},
+                s.median_price as {KEY_COMP_MEDIAN},
                 (p.{KEY_DB_TARGET} - i.{KEY_CURRENT_BID} - IFNULL(p.{KEY_SHIP_COST}, 0) - (p.{KEY_DB_TARGET} * 0.15)) as {KEY_EST_PROFIT}
             FROM auction_items i
             JOIN products p ON i.product_id = p.id
+            LEFT JOIN product_price_stats s ON s.product_id = p.id
             WHERE i.status = 'Active' AND p.{KEY_DB_TARGET} > 0
             ORDER BY {KEY_EST_PROFIT} DESC
             LIMIT 10
@@ -100,6 +106,7 @@ try:
             df_display[KEY_EST_PROFIT] = df_display[KEY_EST_PROFIT].astype(float).apply(lambda x: f"${x:,.2f}")
             df_display[KEY_CURRENT_BID] = df_display[KEY_CURRENT_BID].astype(float).apply(lambda x: f"${x:,.2f}")
             df_display[KEY_DB_TARGET] = df_display[KEY_DB_TARGET].astype(float).apply(lambda x: f"${x:,.2f}")
+            df_display[KEY_COMP_MEDIAN] = df_display[KEY_COMP_MEDIAN].astype(float).apply(lambda x: f"${x:,.2f}" if pd.notna(x) else "")
             
             # Use Constants for Renaming
             df_display = df_display.rename(columns={
@@ -107,6 +114,7 @@ try:
                 "title": COL_TITLE,
                 KEY_CURRENT_BID: COL_CUR_BID,
                 KEY_DB_TARGET: COL_TARGET,
+                KEY_COMP_MEDIAN: COL_COMP_MEDIAN,
                 KEY_EST_PROFIT: COL_EST_PROFIT
             })
 
@@ -121,7 +129,7 @@ try:
             with c_table:
                 # Use Constants for Column Selection
                 st.dataframe(
-                    df_display[[COL_LOT, COL_TITLE, COL_CUR_BID, COL_TARGET, COL_EST_PROFIT]], 
+                    df_display[[COL_LOT, COL_TITLE, COL_CUR_BID, COL_TARGET, COL_COMP_MEDIAN, COL_EST_PROFIT]], 
                     hide_index=True, 
                     use_container_width=True
                 )
@@ -7,8 +7,10 @@ import time
 
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-from utils.db import create_connection, get_active_auctions, get_auction_items, update_item_field, update_item_status
+from utils.db import create_connection, get_active_auctions, get_auction_items, update_item_field, update_item_status, search_auction_items
 from utils.inventory import auto_link_products
+from utils.analytics import get_market_trends_bulk
+from utils.writer import wait_all
 from components.grid import render_grid
 from components.research import render_research_station
 from components.filters import render_filters, apply_filters
@@ -19,12 +21,13 @@ from utils.parse import (
     COL_SELECT, COL_LOT, COL_MSRP_STAT, COL_TITLE, COL_BRAND, COL_MODEL, COL_CAT,
     COL_WATCH, COL_RISK, COL_PKG, COL_COND, COL_FUNC, COL_MISSING, COL_MISSING_DESC,
     COL_DMG, COL_DMG_DESC, COL_NOTES, COL_UPC, COL_ASIN, COL_URL, COL_MSRP, COL_WON,
-    COL_BID, COL_EST_PROFIT,
+    COL_BID, COL_EST_PROFIT, COL_COMP_MEDIAN, COL_COMP_COUNT, COL_COMP_LAST, COL_COMP_TREND, COL_COMP_DAYS,
     # Import DB Keys for Mapping
     KEY_DB_TITLE, KEY_DB_BRAND, KEY_DB_MODEL, KEY_DB_UPC, KEY_DB_ASIN, KEY_DB_SCRAPED_CAT,
     KEY_DB_PKG, KEY_DB_COND, KEY_DB_FUNC, KEY_DB_MISSING, KEY_DB_MISSING_DESC,
     KEY_DB_DMG, KEY_DB_DMG_DESC, KEY_DB_ITEM_NOTES, KEY_IS_WON, KEY_IS_WATCHED,
-    KEY_CURRENT_BID, KEY_SUG_MSRP, KEY_MASTER_MSRP, KEY_TARGET_PRICE, KEY_IS_HIDDEN, KEY_PROD_ID
+    KEY_CURRENT_BID, KEY_SUG_MSRP, KEY_MASTER_MSRP, KEY_TARGET_PRICE, KEY_IS_HIDDEN, KEY_PROD_ID,
+    KEY_LOT_SORT, KEY_COMP_MEDIAN, KEY_COMP_COUNT, KEY_COMP_LAST, KEY_COMP_TREND, KEY_COMP_DAYS
 )
 
 # MAP DISPLAY COLUMNS (Grid Headers) -> TO DATABASE COLUMNS (SQLite Keys)
@@ -60,12 +63,45 @@ with col_nav1: st.page_link("pages/2_Product_Library.py", label="📚 Go to Prod
 with col_nav2: st.page_link("pages/3_Auction_History.py", label="🏆 Go to Auction History", icon="🏆", use_container_width=True)
 st.divider()
 
+def render_close_all():
+    # Closing runs in the background (closer.start_close_all); the page only polls the job
+    if "close_all_job" not in st.session_state:
+        if st.sidebar.button("🛑 Close All Ended"):
+            from closer import start_close_all
+            st.session_state.close_all_job = start_close_all()
+            st.session_state.pop("close_all_report", None)
+            st.rerun()
+    else:
+        with st.sidebar:
+            render_close_all_progress()
+
+    if "close_all_report" in st.session_state:
+        report = st.session_state.close_all_report
+        if isinstance(report, Exception):
+            st.sidebar.error(f"Close All failed: {report}")
+        elif report:
+            st.sidebar.dataframe(pd.DataFrame(report)[["title", "refresh_s", "close_s", "status"]], hide_index=True)
+        else:
+            st.sidebar.info("No ended auctions.")
+
+@st.fragment(run_every=2)
+def render_close_all_progress():
+    # Reruns on its own every 2s while the job runs; a full rerun once it ends reloads the auction list
+    fut, report = st.session_state.close_all_job
+    if not fut.done():
+        st.info(f"🛑 Closing ended auctions in the background... {len(report)} done.")
+        return
+    del st.session_state.close_all_job
+    st.session_state.close_all_report = fut.exception() or fut.result()
+    st.rerun(scope="app")
+
 try:
     conn = create_connection()
     auction_list = get_active_auctions(conn)
 
     if auction_list.empty:
         st.warning("No active auctions found.")
+        render_close_all()
         st.stop()
 
     st.sidebar.header("Auction Selection")
@@ -125,6 +161,16 @@ try:
     df.loc[df["working_msrp"] == 0, "working_msrp"] = df[KEY_SUG_MSRP]
     df[COL_MSRP] = df["working_msrp"]
 
+    # Realized-price comps for linked products (median of past closes)
+    df[COL_COMP_MEDIAN] = pd.to_numeric(df[KEY_COMP_MEDIAN], errors="coerce").fillna(0.00)
+    # Rest of the comps for every linked product in one query
+    trends = get_market_trends_bulk(conn, df[KEY_PROD_ID].dropna().tolist())
+    comps = df[KEY_PROD_ID].map
+    df[COL_COMP_COUNT] = comps(trends[KEY_COMP_COUNT]).fillna(0).astype(int)
+    df[COL_COMP_LAST] = pd.to_numeric(comps(trends[KEY_COMP_LAST]), errors="coerce").fillna(0.00)
+    df[COL_COMP_TREND] = pd.to_numeric(comps(trends[KEY_COMP_TREND]), errors="coerce").round(2)
+    df[COL_COMP_DAYS] = pd.to_numeric(comps(trends[KEY_COMP_DAYS]), errors="coerce")
+
     def flag_favorites(row):
         title = row['title']
         if row[KEY_PROD_ID] in fav_ids:
@@ -181,13 +227,8 @@ try:
     df_display = apply_filters(df, active_filters)
 
     if search_query:
-        mask = (
-            df_display[COL_TITLE].astype(str).str.lower().str.contains(search_query) |
-            df_display[COL_BRAND].astype(str).str.lower().str.contains(search_query) |
-            df_display[COL_MODEL].astype(str).str.lower().str.contains(search_query) |
-            df_display[COL_LOT].astype(str).str.lower().str.contains(search_query)
-        )
-        df_display = df_display[mask]
+        match_ids = search_auction_items(conn, search_query, auction_id)
+        df_display = df_display[df_display["id"].isin(match_ids)]
 
     show_hidden = st.sidebar.checkbox("Show Crossed Out Items", value=False, on_change=force_refresh)
     if not show_hidden:
@@ -195,12 +236,12 @@ try:
 
     desired_cols = [
         COL_SELECT, COL_RISK, COL_WATCH, COL_WON, COL_LOT, COL_BID,
-        COL_TITLE, COL_BRAND, COL_MODEL, COL_CAT, COL_MSRP, COL_EST_PROFIT,
+        COL_TITLE, COL_BRAND, COL_MODEL, COL_CAT, COL_MSRP, COL_COMP_MEDIAN, COL_COMP_COUNT, COL_COMP_LAST, COL_COMP_TREND, COL_COMP_DAYS, COL_EST_PROFIT,
         COL_PKG, COL_COND, COL_FUNC, 
         COL_MISSING, COL_MISSING_DESC, COL_DMG, COL_DMG_DESC, 
         COL_NOTES, COL_UPC, COL_ASIN, 
         "id", KEY_IS_HIDDEN, KEY_CURRENT_BID, KEY_PROD_ID, 
-        KEY_MASTER_MSRP, KEY_TARGET_PRICE, "profit_val",
+        KEY_MASTER_MSRP, KEY_TARGET_PRICE, "profit_val", KEY_LOT_SORT, KEY_COMP_COUNT,
     ]
     final_cols = [c for c in desired_cols if c in df_display.columns]
     
@@ -224,11 +265,12 @@ try:
     if st.sidebar.button("❌ Cross Out Selected"):
         if not selected_rows: st.sidebar.warning("No items selected.")
         else:
-            with conn:
-                for row in selected_rows:
-                    raw_id = row.get("id")
-                    if raw_id is not None:
-                        update_item_status(conn, int(raw_id), KEY_IS_HIDDEN, 1)
+            pending = []
+            for row in selected_rows:
+                raw_id = row.get("id")
+                if raw_id is not None:
+                    pending.append(update_item_status(conn, int(raw_id), KEY_IS_HIDDEN, 1, wait=False))
+            wait_all(pending)
             st.sidebar.success("Items crossed out.")
             force_refresh()
             st.rerun()
@@ -236,11 +278,12 @@ try:
     if show_hidden and st.sidebar.button("↺ Restore Selected"):
         if not selected_rows: st.sidebar.warning("No items selected.")
         else:
-            with conn:
-                for row in selected_rows:
-                    raw_id = row.get("id")
-                    if raw_id is not None:
-                        update_item_status(conn, int(raw_id), KEY_IS_HIDDEN, 0)
+            pending = []
+            for row in selected_rows:
+                raw_id = row.get("id")
+                if raw_id is not None:
+                    pending.append(update_item_status(conn, int(raw_id), KEY_IS_HIDDEN, 0, wait=False))
+            wait_all(pending)
             st.sidebar.success("Items restored.")
             force_refresh()
             st.rerun()
@@ -262,26 +305,30 @@ try:
                 time.sleep(1)
                 st.switch_page("pages/3_Auction_History.py")
 
+    render_close_all()
+
     st.markdown("---")
     col_save, col_dl = st.columns([2, 8])
     with col_save:
         if st.button("💾 Save Data Edits"):
             if updated_data is not None and isinstance(updated_data, pd.DataFrame) and not updated_data.empty:
                 progress = st.progress(0)
-                with conn:
-                    for i, (index, row) in enumerate(updated_data.iterrows()):
-                        raw_id = row.get("id")
-                        if raw_id is None: continue
-                        item_id = int(raw_id)
-                        
-                        update_item_status(conn, item_id, KEY_IS_WATCHED, 1 if row.get(COL_WATCH) else 0)
-                        update_item_status(conn, item_id, KEY_IS_WON, 1 if row.get(COL_WON) else 0)
-                        
-                        for disp_col, db_col in DB_COL_MAP.items():
-                            if disp_col == COL_WON: continue 
-                            val = row.get(disp_col)
-                            if pd.notna(val): update_item_field(conn, item_id, db_col, val)
-                        progress.progress((i + 1) / len(updated_data))
+                # Queue every edit without waiting; the writer folds them into a few commits
+                pending = []
+                for i, (index, row) in enumerate(updated_data.iterrows()):
+                    raw_id = row.get("id")
+                    if raw_id is None: continue
+                    item_id = int(raw_id)
+                    
+                    pending.append(update_item_status(conn, item_id, KEY_IS_WATCHED, 1 if row.get(COL_WATCH) else 0, wait=False))
+                    pending.append(update_item_status(conn, item_id, KEY_IS_WON, 1 if row.get(COL_WON) else 0, wait=False))
+                    
+                    for disp_col, db_col in DB_COL_MAP.items():
+                        if disp_col == COL_WON: continue 
+                        val = row.get(disp_col)
+                        if pd.notna(val): pending.append(update_item_field(conn, item_id, db_col, val, wait=False))
+                    progress.progress((i + 1) / len(updated_data))
+                wait_all(pending)
                 st.success("Saved!")
                 st.rerun()
 
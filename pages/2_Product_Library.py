@@ -3,12 +3,14 @@ import streamlit as st
 import pandas as pd
 import sys
 import os
+import json
+import sqlite3
 from st_aggrid import AgGrid, GridOptionsBuilder, GridUpdateMode, JsCode
 
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-from utils.db import create_connection
-from utils.inventory import save_product_to_library, get_product_by_id, delete_product
+from utils.db import create_connection, search_products
+from utils.inventory import save_product_to_library, get_product_by_id, delete_product, set_product_favorite, import_products
 from components.research_ui import render_product_form_fields 
 from utils.ai import extract_data_with_gemini, get_api_key 
 from components.grid_styles import JS_CURRENCY_SORT, JS_MSRP_STYLE 
@@ -24,17 +26,36 @@ if 'lib_ai_result' not in st.session_state:
 try:
     conn = create_connection()
 
+    # 0. BULK IMPORT
+    with st.expander("📥 Bulk Import (CSV / Parquet)"):
+        st.caption("Columns use product field names (title, brand, model, upc, asin, msrp, ...). Rows matching an existing UPC/ASIN update it; blank cells keep current values.")
+        upload = st.file_uploader("Product file", type=["csv", "parquet"], key="lib_import_file")
+        if upload is not None and st.button("⬆️ Import Products"):
+            try:
+                with st.spinner("Importing..."):
+                    report = import_products(conn, upload)
+                st.success(f"Inserted {report['inserted']}, updated {report['updated']}, {len(report['conflicts'])} conflicts.")
+                if report['conflicts']:
+                    st.dataframe(pd.DataFrame(report['conflicts']), hide_index=True, use_container_width=True)
+            except (ValueError, sqlite3.IntegrityError) as e:
+                st.error(str(e))
+
     # 1. SEARCH
     search_term = st.text_input("🔍 Search Library (Title, Brand, UPC, ASIN)", "")
 
     # 2. LOAD MASTER DATA (ADDED MSRP, AVG SOLD)
-    query = """
-        SELECT id, title, brand, model, category, upc, asin, msrp, avg_sold_price, is_favorite 
-        FROM products
-        WHERE title LIKE ? OR brand LIKE ? OR model LIKE ? OR upc LIKE ? OR asin LIKE ?
-        ORDER BY title ASC
-    """
-    params = tuple([f"%{search_term}%"] * 5)
+    # Search goes through the FTS index (prefix match on every word); results keep its best-first ranking
+    columns = "p.id, p.title, p.brand, p.model, p.category, p.upc, p.asin, p.msrp, p.avg_sold_price, p.is_favorite"
+    if search_term.strip():
+        query = f"""
+            SELECT {columns}
+            FROM json_each(?) j JOIN products p ON p.id = j.value
+            ORDER BY j.key
+        """
+        params = (json.dumps(search_products(conn, search_term)),)
+    else:
+        query = f"SELECT {columns} FROM products p ORDER BY p.title ASC"
+        params = ()
     df = pd.read_sql_query(query, conn, params=params)
 
     # RENAME DB COLUMNS TO CONSTANTS
@@ -134,9 +155,7 @@ try:
                         
                         if st.form_submit_button("💾 Save Changes", use_container_width=True):
                             save_product_to_library(conn, form_values)
-                            cursor = conn.cursor()
-                            cursor.execute("UPDATE products SET is_favorite = ? WHERE id = ?", (1 if is_fav else 0, prod_id))
-                            conn.commit()
+                            set_product_favorite(conn, prod_id, is_fav)
                             
                             st.session_state.lib_ai_result = None # Clear after save
                             st.success("Saved!")
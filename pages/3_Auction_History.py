@@ -8,22 +8,22 @@ from st_aggrid import AgGrid, GridOptionsBuilder, JsCode, GridUpdateMode
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 from utils.db import create_connection, get_closed_auctions, get_auction_items, update_item_field
-from components.grid_styles import JS_CURRENCY_SORT, JS_NATURAL_SORT, JS_PROFIT_STYLE
+from components.grid_styles import JS_CURRENCY_SORT, JS_LOT_SORT, JS_PROFIT_STYLE
 from components.research import render_research_station
 from utils.inventory import auto_link_products
 # Constants
-from utils.parse import COL_LOT, COL_SOLD, COL_STATUS, COL_TITLE, COL_PROFIT_REALIZED, COL_MSRP_STAT, COL_MSRP, COL_BRAND, COL_MODEL
+from utils.parse import COL_LOT, COL_SOLD, COL_STATUS, COL_TITLE, COL_PROFIT_REALIZED, COL_MSRP_STAT, COL_MSRP, COL_BRAND, COL_MODEL, KEY_LOT_SORT
 
 def render_history_grid(df: pd.DataFrame):
     gb = GridOptionsBuilder.from_dataframe(df)
     gb.configure_default_column(sortable=True, filterable=True, resizable=True)
 
     for col in ["id", "current_bid", "sold_price", "is_hidden", "product_id", "auction_id", 
-                "master_msrp", "master_target_price", "suggested_msrp", "profit_val"]:
+                "master_msrp", "master_target_price", "suggested_msrp", "profit_val", KEY_LOT_SORT]:
         if col in df.columns: gb.configure_column(col, hide=True)
 
     if COL_LOT in df.columns: 
-        gb.configure_column(COL_LOT, width=80, comparator=JS_NATURAL_SORT)
+        gb.configure_column(COL_LOT, width=80, comparator=JS_LOT_SORT)
     
     if COL_STATUS in df.columns: 
         gb.configure_column(COL_STATUS, width=100)
@@ -169,7 +169,7 @@ def main():
             COL_LOT, COL_STATUS, COL_SOLD, COL_MSRP,
             COL_PROFIT_REALIZED, COL_MSRP_STAT, 
             COL_TITLE, COL_BRAND, COL_MODEL, 
-            "id", "product_id"
+            "id", "product_id", KEY_LOT_SORT
         ]
         safe_cols = [c for c in display_cols if c in df.columns]
         
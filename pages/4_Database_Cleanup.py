@@ -3,12 +3,13 @@ import streamlit as st
 import pandas as pd
 import sys
 import os
-import difflib
 from datetime import datetime, timedelta
 
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 from utils.db import create_connection
-from utils.inventory import merge_products
+from utils.inventory import merge_products, merge_product_groups
+from utils.maintenance import find_orphan_products, delete_in_chunks
+from utils.dedupe import scan_duplicates, load_duplicate_groups, dismiss_duplicates
 from utils.parse import KEY_DB_TITLE, KEY_DB_BRAND, KEY_DB_MODEL, KEY_DB_UPC, KEY_DB_ASIN, KEY_IS_FAV
 
 st.set_page_config(page_title="Cleanup Tool", layout="wide")
@@ -16,71 +17,50 @@ st.title("🧹 Database Cleanup & Merge Tool")
 
 conn = None
 
-def find_duplicates(df, threshold=0.85):
-    groups = []
-    seen = set()
-    
-    # 1. UPC
-    df['upc_norm'] = df[KEY_DB_UPC].fillna('').astype(str).str.strip().str.lstrip('0')
-    mask_upc = df['upc_norm'] != ''
-    upc_dupes = df[mask_upc & df.duplicated('upc_norm', keep=False)]
-    for norm_val, group in upc_dupes.groupby('upc_norm'):
-        ids = group['id'].tolist()
-        new_ids = [i for i in ids if i not in seen]
-        if len(new_ids) > 1:
-            groups.append({'ids': new_ids, 'reason': f"Same UPC: {norm_val}"})
-            seen.update(new_ids)
-
-    # 2. ASIN
-    df[KEY_DB_ASIN] = df[KEY_DB_ASIN].replace('', None)
-    asin_dupes = df[df.duplicated(KEY_DB_ASIN, keep=False) & df[KEY_DB_ASIN].notna()]
-    for asin, group in asin_dupes.groupby(KEY_DB_ASIN):
-        ids = group['id'].tolist()
-        new_ids = [i for i in ids if i not in seen]
-        if len(new_ids) > 1:
-            groups.append({'ids': new_ids, 'reason': f"Same ASIN: {asin}"})
-            seen.update(new_ids)
-
-    # 3. Fuzzy
-    remaining = df[~df['id'].isin(seen)].copy()
-    if not remaining.empty:
-        titles = remaining[KEY_DB_TITLE].fillna("").tolist()
-        ids = remaining['id'].tolist()
-        for i, title1 in enumerate(titles):
-            if ids[i] in seen or len(title1) < 4: continue
-            current_group = [ids[i]]
-            for j, title2 in enumerate(titles):
-                if i == j or ids[j] in seen: continue
-                ratio = difflib.SequenceMatcher(None, title1.lower(), title2.lower()).ratio()
-                if ratio >= threshold:
-                    current_group.append(ids[j])
-            if len(current_group) > 1:
-                groups.append({'ids': current_group, 'reason': "Similar Titles"})
-                seen.update(current_group)
-    return groups
-
 try:
     conn = create_connection()
     tab_scan, tab_orphan = st.tabs(["🔍 Duplicate Scanner", "🏚️ Old Orphan Manager"])
 
     with tab_scan:
-        st.info("Finds products with matching UPCs, ASINs, or similar titles.")
-        if st.button("🚀 Scan for Duplicates"):
-            with st.spinner("Scanning..."):
-                query = f"SELECT id, {KEY_DB_TITLE}, {KEY_DB_BRAND}, {KEY_DB_MODEL}, {KEY_DB_UPC}, {KEY_DB_ASIN} FROM products ORDER BY {KEY_DB_TITLE}"
-                df_prods = pd.read_sql_query(query, conn)
-                duplicate_groups = find_duplicates(df_prods)
-                if not duplicate_groups:
-                    st.success("No duplicates found!")
-                    if 'dup_groups' in st.session_state: del st.session_state.dup_groups
-                else:
-                    st.session_state.dup_groups = duplicate_groups
-                    st.rerun()
+        st.info("Finds products with matching UPCs, ASINs, or similar titles. Results are saved; a scan only checks products added or edited since the last one.")
+        c_scan, c_full = st.columns([1, 3])
+        with c_full:
+            full_rescan = st.checkbox("Full rescan", help="Re-check every product. Dismissed groups stay dismissed.")
+        with c_scan:
+            if st.button("🚀 Scan for Duplicates"):
+                bar = st.progress(0.0, text="Scanning...")
+                result = scan_duplicates(conn, full=full_rescan, progress=lambda v, text: bar.progress(v, text=text))
+                bar.empty()
+                st.toast(f"Scanned {result['scanned']} products, {result['pairs']} new pairs.")
 
-        if 'dup_groups' in st.session_state and st.session_state.dup_groups:
+        dup_groups = load_duplicate_groups(conn)
+        if not dup_groups:
+            st.success("No open duplicate groups.")
+        else:
             st.divider()
-            st.subheader(f"Found {len(st.session_state.dup_groups)} Potential Groups")
-            groups_to_show = st.session_state.dup_groups.copy()
+            st.subheader(f"Found {len(dup_groups)} Potential Groups")
+            groups_to_show = dup_groups
+
+            # Merge All: each group keeps its selected master, or the most-linked product if untouched
+            if st.button("⚔️ Merge All Groups", type="primary"):
+                all_ids = sorted({x for g in groups_to_show for x in g['ids']})
+                placeholders = ",".join("?" * len(all_ids))
+                ranks = pd.read_sql_query(f"""
+                    SELECT p.id, p.{KEY_DB_TITLE}, COUNT(i.id) as linked_items
+                    FROM products p LEFT JOIN auction_items i ON p.id = i.product_id
+                    WHERE p.id IN ({placeholders}) GROUP BY p.id
+                """, conn, params=all_ids).set_index('id')
+                batch = []
+                for i, group_data in enumerate(groups_to_show):
+                    present = [x for x in group_data['ids'] if x in ranks.index]
+                    if len(present) < 2: continue
+                    best = ranks.loc[present].sort_values(by=['linked_items', KEY_DB_TITLE], ascending=False).index[0]
+                    keep = st.session_state.get(f"sel_{group_data['ids'][0]}", best)
+                    if keep not in present: keep = best
+                    batch.append((int(keep), [int(x) for x in present if x != keep]))
+                removed = merge_product_groups(conn, batch)
+                st.success(f"Merged {len(batch)} groups ({removed} duplicates removed).")
+                st.rerun()
             for i, group_data in enumerate(groups_to_show):
                 group_ids = group_data['ids']
                 reason = group_data['reason']
@@ -108,38 +88,32 @@ try:
                             f"Select MASTER to keep (Group {i+1})", 
                             group_df['id'].tolist(), 
                             index=idx, 
-                            key=f"sel_{i}",
+                            key=f"sel_{group_ids[0]}",
                             format_func=lambda x: f"ID #{x} - {group_df[group_df['id']==x][KEY_DB_TITLE].values[0] if not group_df[group_df['id']==x].empty else 'Unknown'}"
                         )
                     with c2:
                         st.write("")
                         st.write("")
-                        if st.button("⚔️ Merge & Fix", key=f"btn_{i}"):
+                        if st.button("⚔️ Merge & Fix", key=f"btn_{group_ids[0]}"):
                             # CHECK: Ensure keep_id is not None
                             if keep_id is not None:
                                 to_merge = [x for x in group_ids if x != keep_id]
                                 if merge_products(conn, int(keep_id), to_merge):
                                     st.success("Merged!")
-                                    st.session_state.dup_groups.pop(i)
                                     st.rerun()
                             else:
                                 st.error("No Master Product selected.")
+                        if st.button("🙈 Not Duplicates", key=f"dismiss_{group_ids[0]}"):
+                            dismiss_duplicates(conn, group_ids)
+                            st.rerun()
 
     with tab_orphan:
-        st.info("Manage products that are not linked to any active/closed auction items.")
+        st.info("Manage products that have no auction items, inventory or sales history. `python -m utils.maintenance` purges them in bulk and reclaims disk space.")
         c_filter1, c_filter2 = st.columns(2)
         with c_filter1:
             days_old = st.number_input("Only show items created more than X days ago:", min_value=0, value=30, step=5)
-        cutoff_date = datetime.now() - timedelta(days=days_old)
-        cutoff_str = cutoff_date.strftime("%Y-%m-%d")
-        
-        orphan_query = f"""
-            SELECT p.id, p.{KEY_DB_TITLE}, p.{KEY_DB_BRAND}, p.created_at, p.{KEY_IS_FAV}
-            FROM products p
-            LEFT JOIN auction_items i ON p.id = i.product_id
-            WHERE i.id IS NULL AND p.created_at < ?
-        """
-        orphan_df = pd.read_sql_query(orphan_query, conn, params=(cutoff_str,))
+        cutoff_str = (datetime.now() - timedelta(days=days_old)).strftime("%Y-%m-%d")
+        orphan_df = find_orphan_products(conn, days_old, include_favorites=True)
         
         if orphan_df.empty:
             st.success(f"No orphans older than {days_old} days found.")
@@ -151,11 +125,7 @@ try:
             to_delete = edited_df[edited_df["Delete?"] == True]
             count_del = len(to_delete)
             if st.button(f"🗑️ Delete {count_del} Selected Items", disabled=count_del==0, type="primary"):
-                cursor = conn.cursor()
-                ids = to_delete['id'].tolist()
-                placeholders = ",".join("?" * len(ids))
-                cursor.execute(f"DELETE FROM products WHERE id IN ({placeholders})", ids)
-                conn.commit()
+                delete_in_chunks(conn, "products", [int(x) for x in to_delete['id'].tolist()])
                 st.success(f"Cleaned {count_del} items!")
                 st.rerun()
 
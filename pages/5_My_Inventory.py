@@ -7,6 +7,7 @@ from st_aggrid import AgGrid, GridOptionsBuilder, GridUpdateMode, JsCode
 
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 from utils.db import create_connection
+from utils.analytics import get_inventory_stats
 
 # IMPORT CONSTANTS
 from utils.parse import (
@@ -19,21 +20,14 @@ st.title("📦 My Inventory (Won Items)")
 
 conn = create_connection()
 
-# Metrics (Uses internal SQL aliases, display strings are hardcoded which is fine for UI labels)
-stats = pd.read_sql_query("""
-    SELECT 
-        COUNT(*) as total,
-        SUM(CASE WHEN status='In Stock' THEN 1 ELSE 0 END) as stock,
-        SUM(CASE WHEN status='Sold' THEN 1 ELSE 0 END) as sold,
-        SUM(total_cost) as invest
-    FROM inventory_ledger
-""", conn).iloc[0]
+# Metrics: one precomputed row (inventory_rollup) instead of a ledger scan per render
+stats = get_inventory_stats(conn)
 
 c1, c2, c3, c4 = st.columns(4)
-c1.metric("Total Items", stats['total'])
-c2.metric("In Stock", stats['stock'])
-c3.metric("Sold", stats['sold'])
-c4.metric("Total Investment", f"${stats['invest'] or 0:,.2f}")
+c1.metric("Total Items", stats['item_count'])
+c2.metric("In Stock", stats['in_stock_count'])
+c3.metric("Sold", stats['sold_count'])
+c4.metric("Total Investment", f"${stats['total_investment'] or 0:,.2f}")
 
 st.divider()
 
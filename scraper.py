@@ -13,6 +13,7 @@ from utils.parse import (
     KEY_SUG_MSRP
 )
 from utils.db import create_connection, ensure_schema, insert_auction_item, insert_auction, update_auction_metadata, update_final_price
+from utils.writer import wait_all
 from dotenv import load_dotenv
 
 load_dotenv()
@@ -387,6 +388,8 @@ def parse_description(description_text: str) -> dict:
     return data
 
 def process_items(conn, auction_id: int, items: list, is_update: bool = False) -> None:
+    # Writes are queued without waiting so a page lands in one group commit
+    pending = []
     for item in items:
         lot_number = item['lotNumber']
         current_bid = get_current_bid(item)
@@ -394,7 +397,7 @@ def process_items(conn, auction_id: int, items: list, is_update: bool = False) -
         # --- UPDATE MODE (For Closer) ---
         if is_update:
             status = get_status(item)
-            update_final_price(conn, auction_id, lot_number, current_bid, status)
+            pending.append(update_final_price(conn, auction_id, lot_number, current_bid, status, wait=False))
             continue 
 
         # --- FULL SCRAPE MODE (For Active Viewer) ---
@@ -420,7 +423,8 @@ def process_items(conn, auction_id: int, items: list, is_update: bool = False) -
             cat_obj = item.get('primaryCategory')
             parsed[COL_CAT] = cat_obj['name'] if cat_obj else "Uncategorized"
 
-        insert_auction_item(conn, auction_id, lot_number, current_bid, parsed)
+        pending.append(insert_auction_item(conn, auction_id, lot_number, current_bid, parsed, wait=False))
+    wait_all(pending)
 
 def create_request_payload(auction_id: int, page_number: int) -> dict:
     return {
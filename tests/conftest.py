@@ -0,0 +1,42 @@
+# tests/conftest.py
+import os
+import sys
+import sqlite3
+import pytest
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.db import clear_item_cache
+
+# Tables exactly as the original ensure_schema created them, before any trigger-maintained table existed
+BASELINE_SCHEMA = [
+    "CREATE TABLE auctions (id INTEGER PRIMARY KEY, url TEXT UNIQUE, scrape_date TEXT DEFAULT CURRENT_TIMESTAMP, auctioneer TEXT, auction_title TEXT, end_date TEXT)",
+    """CREATE TABLE products (
+        id INTEGER PRIMARY KEY AUTOINCREMENT, title TEXT, brand TEXT, model TEXT, upc TEXT UNIQUE, asin TEXT UNIQUE, category TEXT, msrp REAL, avg_sold_price REAL, target_list_price REAL, shipping_cost_basis REAL, weight_lbs REAL, weight_oz REAL, length REAL, width REAL, height REAL, is_irregular BOOLEAN DEFAULT 0, ship_method TEXT,
+        ebay_avg_sold_price REAL, ebay_sold_range_low REAL, ebay_sold_range_high REAL, ebay_avg_shipping_sold REAL, ebay_sell_through_rate REAL, ebay_total_sold_count INTEGER, ebay_total_sellers INTEGER, ebay_active_count INTEGER, ebay_avg_list_price REAL, ebay_active_low REAL, ebay_active_high REAL, ebay_avg_shipping_active REAL, ebay_num_watchers INTEGER, market_notes TEXT,
+        amazon_url TEXT, amazon_new_price REAL, amazon_used_price REAL, amazon_listing_price REAL, amazon_sales_rank INTEGER, amazon_reviews INTEGER, amazon_stars REAL, amazon_rank_main INTEGER, amazon_cat_name TEXT, amazon_rank_sub INTEGER, amazon_subcat_name TEXT,
+        notes TEXT, is_favorite BOOLEAN DEFAULT 0, created_at TEXT DEFAULT CURRENT_TIMESTAMP
+    )""",
+    """CREATE TABLE auction_items (
+        id INTEGER PRIMARY KEY AUTOINCREMENT, auction_id INTEGER NOT NULL, product_id INTEGER, lot TEXT, current_bid REAL DEFAULT 0, sold_price REAL DEFAULT 0, status TEXT DEFAULT 'Active', title TEXT, brand TEXT, model TEXT, packaging TEXT, condition TEXT, functional TEXT, missing_parts TEXT, missing_parts_desc TEXT, damaged TEXT, damage_desc TEXT, item_notes TEXT, upc TEXT, asin TEXT, url TEXT, suggested_msrp REAL DEFAULT 0, scraped_category TEXT, is_watched INTEGER DEFAULT 0, is_hidden INTEGER DEFAULT 0, is_won INTEGER DEFAULT 0,
+        FOREIGN KEY (auction_id) REFERENCES auctions(id) ON DELETE CASCADE, FOREIGN KEY (product_id) REFERENCES products(id) ON DELETE SET NULL
+    )""",
+    "CREATE TABLE inventory_ledger (id INTEGER PRIMARY KEY AUTOINCREMENT, product_id INTEGER, auction_source TEXT, purchase_date TEXT DEFAULT CURRENT_TIMESTAMP, lot_number TEXT, purchase_price REAL, fees_paid REAL DEFAULT 0, shipping_paid REAL DEFAULT 0, total_cost REAL DEFAULT 0, status TEXT DEFAULT 'In Stock', listing_price REAL DEFAULT 0, sold_price REAL DEFAULT 0, sold_date TEXT, notes TEXT, FOREIGN KEY (product_id) REFERENCES products(id) ON DELETE SET NULL)",
+    "CREATE TABLE product_price_history (id INTEGER PRIMARY KEY AUTOINCREMENT, product_id INTEGER NOT NULL, sold_price REAL, sold_date TEXT, auction_source TEXT, FOREIGN KEY (product_id) REFERENCES products(id) ON DELETE CASCADE)",
+]
+
+@pytest.fixture
+def baseline_db(tmp_path):
+    """Path to a database in the original schema, with one auction, two linked lots and some sales."""
+    path = str(tmp_path / "auctions.db")
+    conn = sqlite3.connect(path)
+    for sql in BASELINE_SCHEMA: conn.execute(sql)
+    conn.execute("INSERT INTO auctions (id, url) VALUES (1, 'https://hibid.com/catalog/1')")
+    conn.execute("INSERT INTO products (id, title, brand, model, category, msrp) VALUES (1, 'Sony Speaker', 'Sony', 'SRS-1', 'Audio', 5.0)")
+    conn.execute("INSERT INTO auction_items (auction_id, product_id, lot, title) VALUES (1, 1, '1', 'Sony Speaker'), (1, NULL, '2', 'Lamp')")
+    conn.execute("INSERT INTO product_price_history (product_id, sold_price, sold_date, auction_source) VALUES (1, 20, '2024-01-05', 'A'), (1, 30, 'Unknown', 'B')")
+    conn.execute("INSERT INTO inventory_ledger (product_id, total_cost, status, sold_price, sold_date) VALUES (1, 4, 'Sold', 25, '2024-02-01 10:00:00'), (1, 6, 'Sold', 35, '2024-02-03')")
+    conn.commit()
+    conn.close()
+    clear_item_cache()
+    return path
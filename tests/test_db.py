@@ -0,0 +1,56 @@
+# tests/test_db.py
+from utils.db import create_connection, get_auction_items, get_auction_version, rebuild_sales_daily
+from utils.writer import run_write
+from utils.analytics import refresh_price_stats
+from utils.inventory import save_product_to_library, get_product_by_id
+
+def test_product_edit_invalidates_items_on_upgraded_db(baseline_db):
+    conn = create_connection(baseline_db)
+    before = get_auction_version(conn, 1)
+    assert get_auction_items(conn, 1).loc[lambda df: df["id"] == 1, "master_msrp"].item() == 5.0
+
+    product = get_product_by_id(conn, 1).to_dict()
+    product["msrp"] = 99
+    save_product_to_library(conn, product)
+
+    assert get_auction_version(conn, 1) > before
+    assert get_auction_items(conn, 1).loc[lambda df: df["id"] == 1, "master_msrp"].item() == 99
+    conn.close()
+
+def _sales_daily(conn):
+    return conn.execute("SELECT sale_date, category, revenue, cogs, items_sold FROM sales_daily ORDER BY 1, 2").fetchall()
+
+def test_sales_daily_matches_rebuild_after_category_edit(baseline_db):
+    conn = create_connection(baseline_db)
+    run_write(conn, lambda c: c.execute("UPDATE products SET category = 'Electronics' WHERE id = 1"))
+    run_write(conn, lambda c: c.execute("UPDATE inventory_ledger SET sold_price = 40 WHERE id = 1"))
+    run_write(conn, lambda c: c.execute("DELETE FROM inventory_ledger WHERE id = 2"))
+    run_write(conn, lambda c: c.execute("INSERT INTO inventory_ledger (product_id, total_cost, status, sold_price, sold_date) VALUES (1, 2, 'Sold', 10, '2024-03-01')"))
+    # Returned and sold again: counts under the category of the new sale
+    run_write(conn, lambda c: c.execute("UPDATE inventory_ledger SET status = 'Listed' WHERE id = 1"))
+    run_write(conn, lambda c: c.execute("UPDATE inventory_ledger SET status = 'Sold' WHERE id = 1"))
+
+    live = _sales_daily(conn)
+    assert live == [("2024-02-01", "Electronics", 40.0, 4.0, 1), ("2024-03-01", "Electronics", 10.0, 2.0, 1)]
+    run_write(conn, rebuild_sales_daily)
+    assert _sales_daily(conn) == live
+    conn.close()
+
+def test_edited_sale_keeps_its_category(baseline_db):
+    conn = create_connection(baseline_db)
+    run_write(conn, lambda c: c.execute("UPDATE products SET category = 'Electronics' WHERE id = 1"))
+    run_write(conn, lambda c: c.execute("UPDATE inventory_ledger SET sold_price = 45 WHERE id = 2"))
+    assert _sales_daily(conn) == [("2024-02-01", "Audio", 25.0, 4.0, 1), ("2024-02-03", "Audio", 45.0, 6.0, 1)]
+    conn.close()
+
+def test_last_sold_date_skips_placeholder_dates(baseline_db):
+    conn = create_connection(baseline_db)
+    last = lambda: conn.execute("SELECT last_sold_date FROM product_price_stats WHERE product_id = 1").fetchone()[0]
+    assert last() == "2024-01-05"
+    run_write(conn, lambda c: c.execute("INSERT INTO product_price_history (product_id, sold_price, sold_date) VALUES (1, 12, 'Unknown')"))
+    assert last() == "2024-01-05"
+    run_write(conn, lambda c: c.execute("INSERT INTO product_price_history (product_id, sold_price, sold_date) VALUES (1, 12, '2024-04-01')"))
+    assert last() == "2024-04-01"
+    refresh_price_stats(conn, [1])
+    assert last() == "2024-04-01"
+    conn.close()
@@ -0,0 +1,39 @@
+# tests/test_inventory.py
+import pandas as pd
+from utils.db import create_connection
+from utils.writer import run_write
+from utils.shipping import reprice_shipping, quote_cheapest
+from utils.inventory import auto_link_products, merge_products, import_products
+
+def test_auto_link_leaves_reader_outside_transaction(baseline_db):
+    conn = create_connection(baseline_db)
+    conn.execute("INSERT INTO auction_items (auction_id, lot, title, brand, model) VALUES (1, '3', 'Sony speaker', 'Sonny', 'SRS-1')")
+    conn.commit()
+    auto_link_products(conn, 1, workers=1, min_confidence=0.0)
+    assert not conn.in_transaction
+    conn.close()
+
+def test_merge_reprices_shipping_for_filled_dimensions(baseline_db):
+    conn = create_connection(baseline_db)
+    def seed(c):
+        c.execute("INSERT INTO products (id, title, weight_lbs) VALUES (10, 'Master', 2)")
+        c.execute("INSERT INTO products (id, title, length, width, height, shipping_cost_basis, ship_method) VALUES (11, 'Dup', 30, 20, 20, 1.0, 'Hand Entered')")
+    run_write(conn, seed)
+    reprice_shipping(conn, [10])
+    merge_products(conn, 10, [11])
+
+    row = conn.execute("SELECT shipping_cost_basis, ship_method FROM products WHERE id = 10").fetchone()
+    cost, method = quote_cheapest(2, 0, 30, 20, 20)
+    assert row == (float(cost[0]), method[0])
+    assert reprice_shipping(conn, [10]) == 0
+    conn.close()
+
+def test_import_reports_raw_code_collisions_as_conflicts(baseline_db):
+    conn = create_connection(baseline_db)
+    run_write(conn, lambda c: c.execute("UPDATE products SET upc = 'N/A', asin = 'n/a' WHERE id = 1"))
+    df = pd.DataFrame({"title": ["Lamp", "Desk", "Chair", "Sofa"], "upc": ["N/A", "bad", "bad", None], "asin": [None, None, None, "n/a"]})
+    report = import_products(conn, df)
+
+    assert (report["inserted"], report["updated"]) == (1, 0)
+    assert [c["reason"] for c in report["conflicts"]] == ["UPC is already used by #1", "Duplicate of an earlier row in the file", "ASIN is already used by #1"]
+    conn.close()
@@ -0,0 +1,19 @@
+# tests/test_snapshot.py
+import pandas as pd
+from utils.db import create_connection
+from utils.writer import run_write
+from utils.snapshot import export_snapshot, Snapshot
+from utils.analytics import get_sales_by_category, get_sales_over_time
+
+def test_snapshot_sales_match_live_after_category_edit(baseline_db, tmp_path):
+    conn = create_connection(baseline_db)
+    run_write(conn, lambda c: c.execute("UPDATE products SET category = 'Electronics' WHERE id = 1"))
+    run_write(conn, lambda c: c.execute("INSERT INTO inventory_ledger (product_id, total_cost, status, sold_price, sold_date) VALUES (1, 2, 'Sold', 10, '2024-03-01')"))
+    export_snapshot(conn, str(tmp_path / "snapshot"))
+    snap = Snapshot(str(tmp_path / "snapshot"))
+
+    live, snapped = get_sales_by_category(conn), get_sales_by_category(snap)
+    assert sorted(live.iloc[:, 0]) == ["Audio", "Electronics"]
+    pd.testing.assert_frame_equal(snapped, live, check_dtype=False)
+    pd.testing.assert_frame_equal(get_sales_over_time(snap, category="Audio"), get_sales_over_time(conn, category="Audio"), check_dtype=False)
+    conn.close()
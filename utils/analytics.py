@@ -1,50 +1,104 @@
 # utils/analytics.py
+import json
 import sqlite3
 import pandas as pd
-from utils.db import create_connection
+from datetime import datetime
+from typing import Optional, List, Union
+from utils.db import create_connection, PRICE_EWMA_ALPHA
+from utils.writer import writes
+from utils.snapshot import Snapshot
 # IMPORT CONSTANTS
-from utils.parse import COL_CAT, COL_TOTAL_COST, COL_PROFIT_REALIZED
+from utils.parse import (
+    COL_CAT, COL_TOTAL_COST, COL_PROFIT_REALIZED,
+    KEY_COMP_COUNT, KEY_COMP_MEAN, KEY_COMP_MEDIAN, KEY_COMP_P25, KEY_COMP_P75,
+    KEY_COMP_LAST, KEY_COMP_LAST_DATE, KEY_COMP_TREND, KEY_COMP_DAYS, KEY_SALE_CATEGORY
+)
 
-def get_inventory_stats(conn: sqlite3.Connection):
-    query_invest = "SELECT SUM(total_cost) FROM inventory_ledger"
-    total_invest = conn.execute(query_invest).fetchone()[0] or 0.0
+# Report functions take a live connection or a Snapshot (utils.snapshot); on a snapshot the
+# same numbers come from pandas over the Parquet files, off the production database.
+Source = Union[sqlite3.Connection, Snapshot]
 
-    query_revenue = "SELECT SUM(sold_price) FROM inventory_ledger WHERE status = 'Sold'"
-    total_revenue = conn.execute(query_revenue).fetchone()[0] or 0.0
-
-    query_cogs = "SELECT SUM(total_cost) FROM inventory_ledger WHERE status = 'Sold'"
-    cogs = conn.execute(query_cogs).fetchone()[0] or 0.0
+def get_inventory_stats(conn: Source):
+    if isinstance(conn, Snapshot):
+        row = _snapshot_inventory_rollup(conn)
+    else:
+        # One row, maintained by triggers on inventory_ledger (see db._ensure_inventory_rollup)
+        row = conn.execute("""
+            SELECT item_count, in_stock_count, listed_count, sold_count, total_cost, sold_revenue, sold_cost, listed_value
+            FROM inventory_rollup WHERE id = 1
+        """).fetchone() or (0,) * 8
+    items, in_stock, listed, sold, total_invest, total_revenue, cogs, potential_revenue = row
 
     gross_profit = total_revenue - cogs
     roi = (gross_profit / cogs * 100) if cogs > 0 else 0.0
-    query_potential = "SELECT SUM(listing_price) FROM inventory_ledger WHERE status = 'Listed'"
-    potential_revenue = conn.execute(query_potential).fetchone()[0] or 0.0
 
     return {
         "total_investment": total_invest,
         "total_revenue": total_revenue,
         "gross_profit": gross_profit,
         "roi": roi,
-        "potential_revenue": potential_revenue
+        "potential_revenue": potential_revenue,
+        "item_count": int(items),
+        "in_stock_count": int(in_stock),
+        "listed_count": int(listed),
+        "sold_count": int(sold)
     }
 
-def get_sales_over_time(conn: sqlite3.Connection, period='Month'):
+def get_sales_over_time(conn: Source, period='Month', category: Optional[str] = None):
+    # Groups the sales_daily rollup (one row per day and category), not the ledger
     date_format = "%Y-%m" if period == 'Month' else "%Y-%W"
+    if isinstance(conn, Snapshot):
+        daily = _snapshot_sales_daily(conn)
+        if category is not None: daily = daily[daily["category"] == category]
+        daily = daily.assign(period=pd.to_datetime(daily["sale_date"]).dt.strftime(date_format))
+        return daily.groupby("period", as_index=False)[["revenue", "profit", "items_sold"]].sum().sort_values("period", ignore_index=True)
+    where = "WHERE category = ?" if category is not None else ""
     query = f"""
         SELECT 
-            strftime('{date_format}', sold_date) as period, 
-            SUM(sold_price) as revenue,
-            SUM(sold_price - total_cost) as profit,
-            COUNT(id) as items_sold
-        FROM inventory_ledger
-        WHERE status = 'Sold' AND sold_date IS NOT NULL
+            strftime('{date_format}', sale_date) as period, 
+            SUM(revenue) as revenue,
+            SUM(profit) as profit,
+            SUM(items_sold) as items_sold
+        FROM sales_daily
+        {where}
         GROUP BY period
         ORDER BY period ASC
     """
-    return pd.read_sql_query(query, conn)
+    return pd.read_sql_query(query, conn, params=(category,) if category is not None else ())
 
-def get_category_breakdown(conn: sqlite3.Connection):
+def get_sales_by_category(conn: Source, start: Optional[str] = None, end: Optional[str] = None):
+    """Realized sales per category between two YYYY-MM-DD dates (inclusive), from sales_daily."""
+    if isinstance(conn, Snapshot):
+        daily = _snapshot_sales_daily(conn)
+        daily = daily[(daily["sale_date"] >= (start or "")) & (daily["sale_date"] <= (end or "9999-12-31"))]
+        out = daily.groupby("category", as_index=False)[["items_sold", "revenue", "cogs", "profit"]].sum()
+        out["category"] = out["category"].replace("", None)
+        out = out.rename(columns={"category": COL_CAT, "profit": COL_PROFIT_REALIZED})
+        return out.sort_values(COL_PROFIT_REALIZED, ascending=False, ignore_index=True)
+    query = f"""
+        SELECT 
+            NULLIF(category, '') as "{COL_CAT}",
+            SUM(items_sold) as items_sold,
+            SUM(revenue) as revenue,
+            SUM(cogs) as cogs,
+            SUM(profit) as "{COL_PROFIT_REALIZED}"
+        FROM sales_daily
+        WHERE sale_date >= IFNULL(?, '') AND sale_date <= IFNULL(?, '9999-12-31')
+        GROUP BY category
+        ORDER BY "{COL_PROFIT_REALIZED}" DESC
+    """
+    return pd.read_sql_query(query, conn, params=(start, end))
+
+def get_category_breakdown(conn: Source):
     # Returns DF with standardized columns
+    if isinstance(conn, Snapshot):
+        l = conn.table("inventory_ledger", columns=["id", "product_id", "total_cost", "status", "sold_price"])
+        l[COL_CAT] = l["product_id"].map(_snapshot_categories(conn))
+        l = l[l[COL_CAT].notna()]
+        l["realized"] = (l["sold_price"] - l["total_cost"]).where(l["status"] == "Sold", 0.0)
+        out = l.groupby(COL_CAT).agg(items_count=("id", "size"), **{COL_TOTAL_COST: ("total_cost", lambda c: c.sum(min_count=1)),
+                                     COL_PROFIT_REALIZED: ("realized", lambda c: c.sum(min_count=1))}).reset_index()
+        return out.sort_values(COL_PROFIT_REALIZED, ascending=False, ignore_index=True)
     query = f"""
         SELECT 
             p.category as "{COL_CAT}",
@@ -59,11 +113,148 @@ def get_category_breakdown(conn: sqlite3.Connection):
     """
     return pd.read_sql_query(query, conn)
 
-def get_market_trends(conn: sqlite3.Connection, product_id: int):
+def get_market_trends(conn: Source, product_id: int):
+    if isinstance(conn, Snapshot):
+        hist = conn.table("product_price_history", columns=["sold_date", "sold_price", "auction_source"], filters=[("product_id", "=", int(product_id))])
+        return hist.sort_values("sold_date", kind="stable", ignore_index=True)
     query = """
         SELECT sold_date, sold_price, auction_source
         FROM product_price_history
         WHERE product_id = ?
         ORDER BY sold_date ASC
     """
-    return pd.read_sql_query(query, conn, params=(product_id,))
\ No newline at end of file
+    return pd.read_sql_query(query, conn, params=(product_id,))
+
+TREND_WINDOW_DAYS = 90
+
+def get_market_trends_bulk(conn: Source, product_ids: List[int], as_of: Optional[datetime] = None,
+                           window_days: int = TREND_WINDOW_DAYS) -> pd.DataFrame:
+    """
+    Realized-price stats for many products from one history query, indexed by product_id:
+    count, mean, median, p25/p75, last price/date, $/day trend over the last window_days
+    and days since the last sale. Products without sales are absent.
+    """
+    cols = [KEY_COMP_COUNT, KEY_COMP_MEAN, KEY_COMP_MEDIAN, KEY_COMP_P25, KEY_COMP_P75,
+            KEY_COMP_LAST, KEY_COMP_LAST_DATE, KEY_COMP_TREND, KEY_COMP_DAYS]
+    ids = sorted({int(i) for i in product_ids if pd.notna(i)})
+    if not ids: return pd.DataFrame(columns=cols).rename_axis("product_id")
+    if isinstance(conn, Snapshot):
+        hist = conn.table("product_price_history", columns=["id", "product_id", "sold_price", "sold_date"], filters=[("product_id", "in", ids)])
+        hist = hist[hist["sold_price"].notna()].sort_values(["product_id", "id"])
+    else:
+        hist = pd.read_sql_query("""
+            SELECT product_id, sold_price, sold_date FROM product_price_history
+            WHERE product_id IN (SELECT value FROM json_each(?)) AND sold_price IS NOT NULL
+            ORDER BY product_id, id
+        """, conn, params=(json.dumps(ids),))
+    if hist.empty: return pd.DataFrame(columns=cols).rename_axis("product_id")
+    hist["sold_price"] = pd.to_numeric(hist["sold_price"], errors="coerce").astype(float)
+    hist["when"] = pd.to_datetime(hist["sold_date"], errors="coerce", format="mixed")
+    # Undated sales ('Unknown') count toward the distribution but never as the last sale
+    hist = hist.sort_values(["product_id", "when"], kind="stable", na_position="first")
+    as_of = pd.Timestamp(as_of or datetime.now())
+
+    g = hist.groupby("product_id")["sold_price"]
+    out = pd.DataFrame({
+        KEY_COMP_COUNT: g.size(),
+        KEY_COMP_MEAN: g.mean(),
+        KEY_COMP_MEDIAN: g.median(),
+        KEY_COMP_P25: g.quantile(0.25),
+        KEY_COMP_P75: g.quantile(0.75),
+        KEY_COMP_LAST: g.last(),
+    })
+    last_date = hist.groupby("product_id")["when"].max()
+    out[KEY_COMP_LAST_DATE] = last_date
+    out[KEY_COMP_DAYS] = (as_of - last_date).dt.days
+
+    # Least-squares slope per product from grouped sums: (n*Sxy - Sx*Sy) / (n*Sxx - Sx^2)
+    recent = hist[hist["when"] >= as_of - pd.Timedelta(days=window_days)]
+    x = (recent["when"] - as_of).dt.total_seconds() / 86400.0
+    y = recent["sold_price"]
+    sums = pd.DataFrame({"n": 1.0, "x": x, "y": y, "xx": x * x, "xy": x * y, "product_id": recent["product_id"]}).groupby("product_id").sum()
+    denom = sums["n"] * sums["xx"] - sums["x"] ** 2
+    slope = (sums["n"] * sums["xy"] - sums["x"] * sums["y"]) / denom.where(denom > 1e-9)
+    out[KEY_COMP_TREND] = slope.reindex(out.index)
+    return out[cols]
+
+# === SNAPSHOT ROLLUPS ===
+# pandas equivalents of the trigger-maintained tables, which the snapshot doesn't carry
+def _snapshot_categories(snap: Snapshot) -> pd.Series:
+    products = snap.table("products", columns=["id", "category"])
+    return products.set_index("id")["category"].astype(object)
+
+def _snapshot_inventory_rollup(snap: Snapshot) -> tuple:
+    # Same terms as db.INVENTORY_ROLLUP_TERMS
+    l = snap.table("inventory_ledger", columns=["status", "total_cost", "sold_price", "listing_price"])
+    status = l["status"].astype(object)
+    sold, listed = status == "Sold", status == "Listed"
+    cost = l["total_cost"].fillna(0)
+    return (len(l), int((status == "In Stock").sum()), int(listed.sum()), int(sold.sum()), float(cost.sum()),
+            float(l["sold_price"].fillna(0)[sold].sum()), float(cost[sold].sum()), float(l["listing_price"].fillna(0)[listed].sum()))
+
+def _snapshot_sales_daily(snap: Snapshot) -> pd.DataFrame:
+    # Same rows as the sales_daily table (see db.rebuild_sales_daily): sales count under the
+    # category stamped when they sold, not the product's current one
+    l = snap.table("inventory_ledger", columns=["product_id", "status", "sold_price", "total_cost", "sold_day", KEY_SALE_CATEGORY])
+    l = l[(l["status"] == "Sold") & l["sold_day"].notna()]
+    revenue, cogs = l["sold_price"].fillna(0), l["total_cost"].fillna(0)
+    daily = pd.DataFrame({
+        "sale_date": l["sold_day"],
+        "category": l[KEY_SALE_CATEGORY].astype(object).fillna(l["product_id"].map(_snapshot_categories(snap))).fillna(""),
+        "revenue": revenue, "cogs": cogs, "profit": revenue - cogs, "items_sold": 1,
+    })
+    return daily.groupby(["sale_date", "category"], as_index=False).sum()
+
+@writes
+def refresh_price_stats(conn: sqlite3.Connection, product_ids: Optional[List[int]] = None) -> int:
+    """
+    Periodic job for product_price_stats: recomputes everything exactly (quantiles included)
+    for products whose sale count moved since their last refresh, or for `product_ids` if given.
+    Returns the number of products refreshed.
+    """
+    if product_ids is None:
+        stale = conn.execute("SELECT product_id FROM product_price_stats WHERE sale_count != IFNULL(quantiles_count, -1)").fetchall()
+        product_ids = [r[0] for r in stale]
+    if not product_ids: return 0
+
+    placeholders = ",".join("?" * len(product_ids))
+    hist = pd.read_sql_query(f"""
+        SELECT product_id, sold_price, sold_date FROM product_price_history
+        WHERE product_id IN ({placeholders}) AND sold_price IS NOT NULL
+        ORDER BY product_id, id
+    """, conn, params=product_ids)
+    hist["sold_price"] = pd.to_numeric(hist["sold_price"], errors="coerce").astype(float)
+
+    g = hist.groupby("product_id")["sold_price"]
+    stats = pd.DataFrame({
+        "sale_count": g.size(),
+        "price_sum": g.sum(),
+        "price_sumsq": (hist["sold_price"] ** 2).groupby(hist["product_id"]).sum(),
+        "price_min": g.min(),
+        "price_max": g.max(),
+        "last_price": g.last(),
+        # Latest real date, as db.LAST_SOLD_DATE_SQL: placeholders like 'Unknown' are skipped
+        "last_sold_date": hist["sold_date"].where(hist["sold_date"].astype(str).str.match(r"\d{4}-")).groupby(hist["product_id"]).max(),
+        "ewma_price": g.apply(lambda s: s.ewm(alpha=PRICE_EWMA_ALPHA, adjust=False).mean().iloc[-1]),
+        "p25_price": g.quantile(0.25),
+        "median_price": g.median(),
+        "p75_price": g.quantile(0.75),
+    })
+    now = datetime.now().isoformat(timespec="seconds")
+
+    rows = [(int(pid), int(r.sale_count), float(r.price_sum), float(r.price_sumsq), float(r.price_min), float(r.price_max),
+             float(r.last_price), None if pd.isna(r.last_sold_date) else r.last_sold_date, float(r.ewma_price),
+             float(r.p25_price), float(r.median_price), float(r.p75_price), int(r.sale_count), now)
+            for pid, r in stats.iterrows()]
+    conn.executemany("""
+        INSERT OR REPLACE INTO product_price_stats (product_id, sale_count, price_sum, price_sumsq, price_min, price_max,
+            last_price, last_sold_date, ewma_price, p25_price, median_price, p75_price, quantiles_count, quantiles_at)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+    """, rows)
+    # Products whose history emptied out
+    gone = [pid for pid in product_ids if pid not in stats.index]
+    if gone:
+        conn.executemany("DELETE FROM product_price_stats WHERE product_id = ?", [(pid,) for pid in gone])
+    conn.executemany("UPDATE products SET avg_sold_price = ? WHERE id = ?",
+                     [(round(r[2] / r[1], 2), r[0]) for r in rows] + [(None, pid) for pid in gone])
+    return len(rows) + len(gone)
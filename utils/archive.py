@@ -0,0 +1,83 @@
+# utils/archive.py
+import os
+import sqlite3
+import pandas as pd
+import pyarrow as pa
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+from datetime import datetime
+from typing import Optional, List, Tuple, Any, Union
+
+# Closed auctions are written here as a hive-partitioned Parquet dataset:
+#   archive/lots/close_month=YYYY-MM/auction_<id>.parquet
+ARCHIVE_DIR = "archive"
+LOTS_DATASET = "lots"
+PARTITION_COL = "close_month"
+
+# Auction metadata denormalized onto every archived lot
+AUCTION_META_COLS = {
+    "auction_url": "url",
+    "auction_title": "auction_title",
+    "auctioneer": "auctioneer",
+    "end_date": "end_date",
+    "scrape_date": "scrape_date",
+}
+
+_SQL_TO_ARROW = {"INTEGER": pa.int64(), "REAL": pa.float64(), "TEXT": pa.string()}
+
+def _lots_schema(conn: sqlite3.Connection) -> pa.Schema:
+    # Fixed schema from the table definition so all-NULL columns don't drift between files
+    fields = [pa.field(name, _SQL_TO_ARROW.get(str(decl).upper(), pa.string()))
+              for _, name, decl, *_ in conn.execute("PRAGMA table_info(auction_items)")]
+    fields += [pa.field(col, pa.string()) for col in AUCTION_META_COLS]
+    fields.append(pa.field("archived_at", pa.string()))
+    return pa.schema(fields)
+
+def _close_month(end_date: Optional[str]) -> str:
+    try: return datetime.strptime(str(end_date)[:10], "%Y-%m-%d").strftime("%Y-%m")
+    except (ValueError, TypeError): return "unknown"
+
+def archive_auction(conn: sqlite3.Connection, auction_id: int, root: str = ARCHIVE_DIR) -> Optional[str]:
+    """
+    Writes every lot of an auction (plus the auction's metadata) to the Parquet archive.
+    Safe to repeat: the file path is derived from the auction, so a retry overwrites it.
+    Returns the written path, or None if the auction doesn't exist.
+    """
+    auc = conn.execute("SELECT url, auction_title, auctioneer, end_date, scrape_date FROM auctions WHERE id = ?", (auction_id,)).fetchone()
+    if not auc: return None
+
+    lots = pd.read_sql_query("SELECT * FROM auction_items WHERE auction_id = ? ORDER BY id", conn, params=(auction_id,))
+    for col, val in zip(AUCTION_META_COLS, auc):
+        lots[col] = val
+    lots["archived_at"] = datetime.now().isoformat(timespec="seconds")
+
+    schema = _lots_schema(conn)
+    lots = lots.reindex(columns=schema.names)
+    table = pa.Table.from_pandas(lots, schema=schema, preserve_index=False)
+
+    part_dir = os.path.join(root, LOTS_DATASET, f"{PARTITION_COL}={_close_month(auc[3])}")
+    os.makedirs(part_dir, exist_ok=True)
+    path = os.path.join(part_dir, f"auction_{auction_id}.parquet")
+    pq.write_table(table, path, compression="zstd")
+    return path
+
+def open_archive(root: str = ARCHIVE_DIR) -> Optional[ds.Dataset]:
+    """Lazy handle on the archived lots; nothing is read until the dataset is scanned."""
+    path = os.path.join(root, LOTS_DATASET)
+    if not os.path.isdir(path): return None
+    return ds.dataset(path, format="parquet", partitioning="hive")
+
+def read_archive(columns: Optional[List[str]] = None,
+                 filters: Union[List[Tuple[str, str, Any]], ds.Expression, None] = None,
+                 root: str = ARCHIVE_DIR) -> pd.DataFrame:
+    """
+    Reads archived lots with column pruning and predicate pushdown.
+    `filters` is either a pyarrow expression or a list of (column, op, value) tuples
+    ANDed together, e.g. [("product_id", "=", 42), ("close_month", ">=", "2025-01")].
+    Filters on close_month skip whole partitions.
+    """
+    dataset = open_archive(root)
+    if dataset is None: return pd.DataFrame(columns=columns or [])
+    if isinstance(filters, list):
+        filters = pq.filters_to_expression(filters) if filters else None
+    return dataset.to_table(columns=columns, filter=filters).to_pandas()
@@ -1,7 +1,12 @@
 # utils/db.py
+import re
+import math
 import sqlite3
+import threading
 import pandas as pd
-from typing import Tuple, Any
+from collections import OrderedDict
+from utils.writer import configure_connection, writes, db_file
+from typing import Tuple, Any, List, Optional
 
 # NEW: Import ALL necessary keys
 from utils.parse import (
@@ -15,11 +20,51 @@ from utils.parse import (
     KEY_DB_FUNC, KEY_DB_MISSING, KEY_DB_MISSING_DESC, KEY_DB_DMG, 
     KEY_DB_DMG_DESC, KEY_DB_ITEM_NOTES, KEY_DB_UPC, KEY_DB_ASIN, KEY_DB_URL,
     KEY_IS_WATCHED, KEY_IS_HIDDEN, KEY_SOLD_PRICE, KEY_STATUS, 
-    KEY_SUG_MSRP, KEY_DB_SCRAPED_CAT, KEY_IS_WON
+    KEY_SUG_MSRP, KEY_DB_SCRAPED_CAT, KEY_IS_WON,
+    KEY_LOT_NUM, KEY_LOT_SUFFIX, KEY_LOT_SORT, KEY_COMP_MEDIAN, KEY_COMP_COUNT, KEY_SOURCE_AUCTION, KEY_SOURCE_LOT, KEY_SALE_CATEGORY, lot_sort_key,
+    KEY_SHIP_RATE_VER, KEY_SHIP_DIMS_KEY,
+    canonical_upc, canonical_asin, normalize_name, title_signature
 )
 
+# === FULL-TEXT SEARCH ===
+PRODUCT_FTS_COLS = [KEY_DB_TITLE, KEY_DB_BRAND, KEY_DB_MODEL, KEY_DB_UPC, KEY_DB_ASIN]
+ITEM_FTS_COLS = ["lot", KEY_DB_TITLE, KEY_DB_BRAND, KEY_DB_MODEL, KEY_DB_UPC, KEY_DB_ASIN, KEY_DB_ITEM_NOTES]
+
+# === INVENTORY ROLLUP ===
+# Ledger totals as (column, per-row contribution); {r} is the ledger row (new/old in triggers)
+INVENTORY_ROLLUP_TERMS = [
+    ("item_count", "1"),
+    ("in_stock_count", "({r}.status = 'In Stock')"),
+    ("listed_count", "({r}.status = 'Listed')"),
+    ("sold_count", "({r}.status = 'Sold')"),
+    ("total_cost", "IFNULL({r}.total_cost, 0)"),
+    ("sold_revenue", "CASE WHEN {r}.status = 'Sold' THEN IFNULL({r}.sold_price, 0) ELSE 0 END"),
+    ("sold_cost", "CASE WHEN {r}.status = 'Sold' THEN IFNULL({r}.total_cost, 0) ELSE 0 END"),
+    ("listed_value", "CASE WHEN {r}.status = 'Listed' THEN IFNULL({r}.listing_price, 0) ELSE 0 END"),
+]
+
+# === AUCTION ITEMS READ CACHE ===
+# Frames are keyed on (db file, auction_id, data version). The version is bumped by triggers
+# on every write that can change the frame, so any writer (scraper, closer, grid) invalidates it.
+ITEM_CACHE_MAX_ENTRIES = 32
+ITEM_CACHE_MAX_BYTES = 256 * 1024 * 1024
+# Product columns read by get_auction_items; updates to anything else leave cached frames valid
+PRODUCT_VIEW_COLS = [KEY_DB_TITLE, KEY_DB_BRAND, KEY_DB_MODEL, KEY_DB_UPC, KEY_DB_ASIN, "category", "msrp", "target_list_price", "shipping_cost_basis"]
+
+# === RUNNING PRICE AGGREGATES ===
+# Weight of the newest sale in the exponentially-decayed mean
+PRICE_EWMA_ALPHA = 0.3
+# History dates are ISO text or placeholders like 'Unknown', which would sort above every real date
+ISO_DATE_GLOB = "'[0-9][0-9][0-9][0-9]-*'"
+LAST_SOLD_DATE_SQL = f"MAX(CASE WHEN sold_date GLOB {ISO_DATE_GLOB} THEN sold_date END)"
+
+_item_cache: "OrderedDict[tuple, Tuple[pd.DataFrame, int]]" = OrderedDict()
+_item_cache_bytes = 0
+_item_cache_lock = threading.Lock()
+
 def create_connection(db_path: str = "auctions.db") -> sqlite3.Connection:
     conn = sqlite3.connect(db_path, check_same_thread=False)
+    configure_connection(conn)
     ensure_schema(conn)
     return conn
 
@@ -43,27 +88,322 @@ def ensure_schema(conn: sqlite3.Connection) -> None:
         cursor = conn.cursor()
         cols = [row[1] for row in cursor.execute("PRAGMA table_info(auction_items)")]
         if 'is_won' not in cols: cursor.execute("ALTER TABLE auction_items ADD COLUMN is_won INTEGER DEFAULT 0")
+        if KEY_LOT_NUM not in cols:
+            cursor.execute(f"ALTER TABLE auction_items ADD COLUMN {KEY_LOT_NUM} INTEGER")
+            cursor.execute(f"ALTER TABLE auction_items ADD COLUMN {KEY_LOT_SUFFIX} TEXT")
+            rows = cursor.execute("SELECT id, lot FROM auction_items").fetchall()
+            cursor.executemany(f"UPDATE auction_items SET {KEY_LOT_NUM} = ?, {KEY_LOT_SUFFIX} = ? WHERE id = ?",
+                               [(*lot_sort_key(lot), item_id) for item_id, lot in rows])
+
+        # History rows remember which lot they came from, so a repeated close can't record a sale twice
+        hist_cols = [row[1] for row in cursor.execute("PRAGMA table_info(product_price_history)")]
+        if KEY_SOURCE_AUCTION not in hist_cols:
+            cursor.execute(f"ALTER TABLE product_price_history ADD COLUMN {KEY_SOURCE_AUCTION} INTEGER")
+            cursor.execute(f"ALTER TABLE product_price_history ADD COLUMN {KEY_SOURCE_LOT} TEXT")
+
+        # Sold ledger rows keep the category they sold under, so later product edits don't move them
+        ledger_cols = [row[1] for row in cursor.execute("PRAGMA table_info(inventory_ledger)")]
+        if KEY_SALE_CATEGORY not in ledger_cols:
+            cursor.execute(f"ALTER TABLE inventory_ledger ADD COLUMN {KEY_SALE_CATEGORY} TEXT")
+            cursor.execute(f"UPDATE inventory_ledger SET {KEY_SALE_CATEGORY} = {_current_category_sql('inventory_ledger')} WHERE status = 'Sold'")
+
+        # Stored shipping quotes remember what they were priced from (see shipping.reprice_shipping)
+        prod_cols = [row[1] for row in cursor.execute("PRAGMA table_info(products)")]
+        if KEY_SHIP_RATE_VER not in prod_cols:
+            cursor.execute(f"ALTER TABLE products ADD COLUMN {KEY_SHIP_RATE_VER} TEXT")
+            cursor.execute(f"ALTER TABLE products ADD COLUMN {KEY_SHIP_DIMS_KEY} TEXT")
+
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_items_product ON auction_items(product_id)")
+        conn.execute(f"CREATE INDEX IF NOT EXISTS idx_items_lot_order ON auction_items(auction_id, {KEY_LOT_NUM}, {KEY_LOT_SUFFIX})")
+        # update_final_price looks lots up by their raw text once per lot
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_items_lot ON auction_items(auction_id, lot)")
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_history_product ON product_price_history(product_id)")
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_ledger_product ON inventory_ledger(product_id)")
+        conn.execute(f"CREATE UNIQUE INDEX IF NOT EXISTS idx_history_source ON product_price_history({KEY_SOURCE_AUCTION}, {KEY_SOURCE_LOT})")
+        _ensure_fts(conn, "products_fts", "products", PRODUCT_FTS_COLS)
+        _ensure_fts(conn, "auction_items_fts", "auction_items", ITEM_FTS_COLS)
+        _ensure_price_stats(conn)
+        _ensure_match_keys(conn)
+        _ensure_duplicate_scan(conn)
+        _ensure_inventory_rollup(conn)
+        _ensure_sales_daily(conn)
+        _ensure_version_triggers(conn)
+
+def _ensure_trigger(conn: sqlite3.Connection, name: str, body: str) -> None:
+    # For triggers whose definition has changed: IF NOT EXISTS would keep an older body forever,
+    # so the stored SQL is compared and the trigger replaced when it differs
+    sql = f"CREATE TRIGGER {name} {body}"
+    current = conn.execute("SELECT sql FROM sqlite_master WHERE type = 'trigger' AND name = ?", (name,)).fetchone()
+    if current and current[0] == sql: return
+    conn.execute(f"DROP TRIGGER IF EXISTS {name}")
+    conn.execute(sql)
+
+def _ensure_fts(conn: sqlite3.Connection, fts: str, table: str, cols: List[str]) -> None:
+    # External-content FTS5 index kept in sync with its source table by triggers
+    exists = conn.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (fts,)).fetchone()
+    col_list = ", ".join(cols)
+    new_vals = ", ".join(f"new.{c}" for c in cols)
+    old_vals = ", ".join(f"old.{c}" for c in cols)
+    conn.execute(f"CREATE VIRTUAL TABLE IF NOT EXISTS {fts} USING fts5({col_list}, content='{table}', content_rowid='id', prefix='2 3')")
+    conn.execute(f"""CREATE TRIGGER IF NOT EXISTS {fts}_ai AFTER INSERT ON {table} BEGIN
+        INSERT INTO {fts}(rowid, {col_list}) VALUES (new.id, {new_vals});
+    END""")
+    conn.execute(f"""CREATE TRIGGER IF NOT EXISTS {fts}_ad AFTER DELETE ON {table} BEGIN
+        INSERT INTO {fts}({fts}, rowid, {col_list}) VALUES ('delete', old.id, {old_vals});
+    END""")
+    conn.execute(f"""CREATE TRIGGER IF NOT EXISTS {fts}_au AFTER UPDATE OF {col_list} ON {table} BEGIN
+        INSERT INTO {fts}({fts}, rowid, {col_list}) VALUES ('delete', old.id, {old_vals});
+        INSERT INTO {fts}(rowid, {col_list}) VALUES (new.id, {new_vals});
+    END""")
+    # First run on an existing database: index the rows that are already there
+    if not exists: conn.execute(f"INSERT INTO {fts}({fts}) VALUES ('rebuild')")
+
+def _ensure_price_stats(conn: sqlite3.Connection) -> None:
+    # One row per product, updated in O(1) per new sale by trigger.
+    # Quantiles can't be maintained that way; analytics.refresh_price_stats fills them in.
+    exists = conn.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'product_price_stats'").fetchone()
+    conn.execute("""CREATE TABLE IF NOT EXISTS product_price_stats (
+        product_id INTEGER PRIMARY KEY, sale_count INTEGER NOT NULL DEFAULT 0, price_sum REAL NOT NULL DEFAULT 0, price_sumsq REAL NOT NULL DEFAULT 0,
+        price_min REAL, price_max REAL, last_price REAL, last_sold_date TEXT, ewma_price REAL,
+        p25_price REAL, median_price REAL, p75_price REAL, quantiles_count INTEGER DEFAULT 0, quantiles_at TEXT,
+        FOREIGN KEY (product_id) REFERENCES products(id) ON DELETE CASCADE
+    )""")
+    a = PRICE_EWMA_ALPHA
+    _ensure_trigger(conn, "history_stats_ai", f"""AFTER INSERT ON product_price_history
+    WHEN new.sold_price IS NOT NULL BEGIN
+        INSERT INTO product_price_stats (product_id, sale_count, price_sum, price_sumsq, price_min, price_max, last_price, last_sold_date, ewma_price)
+        VALUES (new.product_id, 1, new.sold_price, new.sold_price * new.sold_price, new.sold_price, new.sold_price, new.sold_price,
+                CASE WHEN new.sold_date GLOB {ISO_DATE_GLOB} THEN new.sold_date END, new.sold_price)
+        ON CONFLICT(product_id) DO UPDATE SET
+            sale_count = sale_count + 1,
+            price_sum = price_sum + excluded.price_sum,
+            price_sumsq = price_sumsq + excluded.price_sumsq,
+            price_min = MIN(IFNULL(price_min, excluded.price_min), excluded.price_min),
+            price_max = MAX(IFNULL(price_max, excluded.price_max), excluded.price_max),
+            last_price = excluded.last_price,
+            last_sold_date = MAX(IFNULL(last_sold_date, excluded.last_sold_date), IFNULL(excluded.last_sold_date, last_sold_date)),
+            ewma_price = {a} * excluded.ewma_price + {1 - a} * IFNULL(ewma_price, excluded.ewma_price);
+        UPDATE products SET avg_sold_price = (SELECT ROUND(price_sum / sale_count, 2) FROM product_price_stats WHERE product_id = new.product_id)
+        WHERE id = new.product_id;
+    END""")
+    # Removing a sale keeps count/sum exact; min/max/ewma are repaired by the next refresh
+    conn.execute("""CREATE TRIGGER IF NOT EXISTS history_stats_ad AFTER DELETE ON product_price_history
+    WHEN old.sold_price IS NOT NULL BEGIN
+        UPDATE product_price_stats SET
+            sale_count = sale_count - 1,
+            price_sum = price_sum - old.sold_price,
+            price_sumsq = price_sumsq - old.sold_price * old.sold_price
+        WHERE product_id = old.product_id;
+        UPDATE products SET avg_sold_price = (SELECT CASE WHEN sale_count > 0 THEN ROUND(price_sum / sale_count, 2) END FROM product_price_stats WHERE product_id = old.product_id)
+        WHERE id = old.product_id;
+    END""")
+    if not exists:
+        conn.execute(f"""
+            INSERT INTO product_price_stats (product_id, sale_count, price_sum, price_sumsq, price_min, price_max, last_price, last_sold_date, ewma_price)
+            SELECT product_id, COUNT(*), SUM(sold_price), SUM(sold_price * sold_price), MIN(sold_price), MAX(sold_price),
+                   (SELECT h2.sold_price FROM product_price_history h2 WHERE h2.product_id = h.product_id AND h2.sold_price IS NOT NULL ORDER BY h2.id DESC LIMIT 1),
+                   {LAST_SOLD_DATE_SQL}, AVG(sold_price)
+            FROM product_price_history h
+            WHERE sold_price IS NOT NULL
+            GROUP BY product_id
+        """)
+    # Stats backfilled before placeholder dates were filtered out
+    conn.execute(f"""
+        UPDATE product_price_stats SET last_sold_date = (SELECT {LAST_SOLD_DATE_SQL} FROM product_price_history h WHERE h.product_id = product_price_stats.product_id AND h.sold_price IS NOT NULL)
+        WHERE last_sold_date NOT GLOB {ISO_DATE_GLOB}
+    """)
+
+def _ensure_match_keys(conn: sqlite3.Connection) -> None:
+    # Normalized product keys for linking and duplicate scans. Normalization is Python-side,
+    # so the writers of products (save/merge) call sync_match_keys; deletes are handled here.
+    exists = conn.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'product_match_keys'").fetchone()
+    conn.execute("""CREATE TABLE IF NOT EXISTS product_match_keys (
+        product_id INTEGER PRIMARY KEY, upc_key TEXT, asin_key TEXT, brand_key TEXT, model_key TEXT, title_sig TEXT,
+        FOREIGN KEY (product_id) REFERENCES products(id) ON DELETE CASCADE
+    )""")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_match_upc ON product_match_keys(upc_key)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_match_asin ON product_match_keys(asin_key)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_match_brand_model ON product_match_keys(brand_key, model_key)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_match_title ON product_match_keys(title_sig)")
+    conn.execute("CREATE TRIGGER IF NOT EXISTS products_match_ad AFTER DELETE ON products BEGIN DELETE FROM product_match_keys WHERE product_id = old.id; END")
+    # Single-row counter bumped whenever a match key changes; caches built from the keys compare it
+    conn.execute("CREATE TABLE IF NOT EXISTS catalog_version (id INTEGER PRIMARY KEY CHECK (id = 1), version INTEGER NOT NULL DEFAULT 0)")
+    conn.execute("INSERT OR IGNORE INTO catalog_version (id, version) VALUES (1, 0)")
+    bump = "UPDATE catalog_version SET version = version + 1 WHERE id = 1;"
+    for event in ("INSERT", "UPDATE", "DELETE"):
+        conn.execute(f"CREATE TRIGGER IF NOT EXISTS match_keys_version_{event.lower()} AFTER {event} ON product_match_keys BEGIN {bump} END")
+    if not exists: sync_match_keys(conn)
+
+def _ensure_duplicate_scan(conn: sqlite3.Connection) -> None:
+    # Persisted duplicate scan (utils.dedupe.scan_duplicates). Pairs are stored once, id_a < id_b;
+    # 'dismissed' pairs are kept so a rescan never proposes them again.
+    conn.execute("""CREATE TABLE IF NOT EXISTS duplicate_candidates (
+        id_a INTEGER NOT NULL, id_b INTEGER NOT NULL, reason TEXT, score REAL, status TEXT NOT NULL DEFAULT 'open',
+        found_at TEXT DEFAULT CURRENT_TIMESTAMP, PRIMARY KEY (id_a, id_b), CHECK (id_a < id_b)
+    )""")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_dup_b ON duplicate_candidates(id_b)")
+    # Watermark: products above last_product_id haven't been scanned yet
+    conn.execute("CREATE TABLE IF NOT EXISTS duplicate_scan_state (id INTEGER PRIMARY KEY CHECK (id = 1), last_product_id INTEGER NOT NULL DEFAULT 0, scanned_at TEXT)")
+    # MinHash signature per scanned product: the index new products are compared against
+    conn.execute("CREATE TABLE IF NOT EXISTS duplicate_signatures (product_id INTEGER PRIMARY KEY, sig BLOB NOT NULL)")
+    # Edited products wait here for the next scan; REPLACE gives a re-edit a fresh seq
+    conn.execute("CREATE TABLE IF NOT EXISTS duplicate_scan_queue (seq INTEGER PRIMARY KEY AUTOINCREMENT, product_id INTEGER NOT NULL UNIQUE)")
+    conn.execute("""CREATE TRIGGER IF NOT EXISTS products_dupes_au AFTER UPDATE OF title, upc, asin ON products BEGIN
+        INSERT OR REPLACE INTO duplicate_scan_queue (product_id) VALUES (new.id);
+    END""")
+    conn.execute("""CREATE TRIGGER IF NOT EXISTS products_dupes_ad AFTER DELETE ON products BEGIN
+        DELETE FROM duplicate_candidates WHERE id_a = old.id OR id_b = old.id;
+        DELETE FROM duplicate_signatures WHERE product_id = old.id;
+        DELETE FROM duplicate_scan_queue WHERE product_id = old.id;
+    END""")
+
+def _ensure_inventory_rollup(conn: sqlite3.Connection) -> None:
+    # Single-row ledger totals, kept current by triggers: each ledger change subtracts the old
+    # row's contribution and adds the new one, so the dashboard reads one row instead of scanning
+    exists = conn.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'inventory_rollup'").fetchone()
+    cols = [c for c, _ in INVENTORY_ROLLUP_TERMS]
+    conn.execute(f"CREATE TABLE IF NOT EXISTS inventory_rollup (id INTEGER PRIMARY KEY CHECK (id = 1), {', '.join(f'{c} REAL NOT NULL DEFAULT 0' for c in cols)})")
+    add = ", ".join(f"{c} = {c} + {e.format(r='new')}" for c, e in INVENTORY_ROLLUP_TERMS)
+    sub = ", ".join(f"{c} = {c} - {e.format(r='old')}" for c, e in INVENTORY_ROLLUP_TERMS)
+    swap = ", ".join(f"{c} = {c} - {e.format(r='old')} + {e.format(r='new')}" for c, e in INVENTORY_ROLLUP_TERMS)
+    conn.execute(f"CREATE TRIGGER IF NOT EXISTS ledger_rollup_ai AFTER INSERT ON inventory_ledger BEGIN UPDATE inventory_rollup SET {add} WHERE id = 1; END")
+    conn.execute(f"CREATE TRIGGER IF NOT EXISTS ledger_rollup_ad AFTER DELETE ON inventory_ledger BEGIN UPDATE inventory_rollup SET {sub} WHERE id = 1; END")
+    conn.execute(f"CREATE TRIGGER IF NOT EXISTS ledger_rollup_au AFTER UPDATE OF status, total_cost, sold_price, listing_price ON inventory_ledger BEGIN UPDATE inventory_rollup SET {swap} WHERE id = 1; END")
+    if not exists: rebuild_inventory_rollup(conn)
+
+def rebuild_inventory_rollup(conn: sqlite3.Connection) -> None:
+    """Recomputes the rollup in one conditional-aggregation pass. Runs inside the caller's write."""
+    cols = [c for c, _ in INVENTORY_ROLLUP_TERMS]
+    sums = ", ".join(f"IFNULL(SUM({e.format(r='l')}), 0)" for _, e in INVENTORY_ROLLUP_TERMS)
+    conn.execute(f"INSERT OR REPLACE INTO inventory_rollup (id, {', '.join(cols)}) SELECT 1, {sums} FROM inventory_ledger l")
+
+def _current_category_sql(r: str) -> str:
+    return f"IFNULL((SELECT category FROM products WHERE id = {r}.product_id), '')"
+
+def _sale_category_sql(r: str) -> str:
+    # Category a Sold ledger row counts under: stamped at sale time, the product's current one until then
+    return f"IFNULL({r}.{KEY_SALE_CATEGORY}, {_current_category_sql(r)})"
 
+def _ensure_sales_daily(conn: sqlite3.Connection) -> None:
+    # One row per (day, category) of Sold ledger rows, kept current by triggers, so period and
+    # category views group a few hundred days instead of every sale
+    exists = conn.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'sales_daily'").fetchone()
+    conn.execute("""CREATE TABLE IF NOT EXISTS sales_daily (
+        sale_date TEXT NOT NULL, category TEXT NOT NULL DEFAULT '', revenue REAL NOT NULL DEFAULT 0, cogs REAL NOT NULL DEFAULT 0,
+        profit REAL NOT NULL DEFAULT 0, items_sold INTEGER NOT NULL DEFAULT 0, PRIMARY KEY (sale_date, category)
+    )""")
+    sold = "{r}.status = 'Sold' AND date({r}.sold_date) IS NOT NULL"
+    add = """INSERT INTO sales_daily (sale_date, category, revenue, cogs, profit, items_sold)
+        SELECT date({r}.sold_date), {cat}, IFNULL({r}.sold_price, 0), IFNULL({r}.total_cost, 0), IFNULL({r}.sold_price, 0) - IFNULL({r}.total_cost, 0), 1
+        WHERE {sold}
+        ON CONFLICT(sale_date, category) DO UPDATE SET revenue = revenue + excluded.revenue, cogs = cogs + excluded.cogs,
+            profit = profit + excluded.profit, items_sold = items_sold + 1;
+        UPDATE inventory_ledger SET """ + KEY_SALE_CATEGORY + """ = {cat} WHERE id = {r}.id AND {r}.status = 'Sold';"""
+    sub = """UPDATE sales_daily SET revenue = revenue - IFNULL({r}.sold_price, 0), cogs = cogs - IFNULL({r}.total_cost, 0),
+            profit = profit - (IFNULL({r}.sold_price, 0) - IFNULL({r}.total_cost, 0)), items_sold = items_sold - 1
+        WHERE {sold} AND (sale_date, category) = (date({r}.sold_date), {cat});
+        DELETE FROM sales_daily WHERE items_sold <= 0;"""
+    fill = lambda tpl, r, cat: tpl.format(r=r, cat=cat, sold=sold.format(r=r))
+    # A row that stays Sold keeps its category (also when its product is deleted); a new sale takes the product's current one
+    resold = f"""CASE WHEN old.status = 'Sold' AND (new.product_id IS old.product_id OR new.product_id IS NULL)
+        THEN {_sale_category_sql('new')} ELSE {_current_category_sql('new')} END"""
+    _ensure_trigger(conn, "ledger_sales_ai", f"AFTER INSERT ON inventory_ledger BEGIN {fill(add, 'new', _sale_category_sql('new'))} END")
+    _ensure_trigger(conn, "ledger_sales_ad", f"AFTER DELETE ON inventory_ledger BEGIN {fill(sub, 'old', _sale_category_sql('old'))} END")
+    _ensure_trigger(conn, "ledger_sales_au", f"""AFTER UPDATE OF status, sold_price, total_cost, sold_date, product_id ON inventory_ledger BEGIN
+        {fill(sub, 'old', _sale_category_sql('old'))}
+        {fill(add, 'new', resold)}
+    END""")
+    if not exists: rebuild_sales_daily(conn)
+
+def rebuild_sales_daily(conn: sqlite3.Connection) -> None:
+    """Recomputes sales_daily from the ledger, by each sale's stamped category. Runs inside the caller's write."""
+    conn.execute(f"UPDATE inventory_ledger SET {KEY_SALE_CATEGORY} = {_current_category_sql('inventory_ledger')} WHERE status = 'Sold' AND {KEY_SALE_CATEGORY} IS NULL")
+    conn.execute("DELETE FROM sales_daily")
+    conn.execute(f"""
+        INSERT INTO sales_daily (sale_date, category, revenue, cogs, profit, items_sold)
+        SELECT date(l.sold_date), {_sale_category_sql('l')}, SUM(IFNULL(l.sold_price, 0)), SUM(IFNULL(l.total_cost, 0)),
+               SUM(IFNULL(l.sold_price, 0) - IFNULL(l.total_cost, 0)), COUNT(*)
+        FROM inventory_ledger l
+        WHERE l.status = 'Sold' AND date(l.sold_date) IS NOT NULL
+        GROUP BY 1, 2
+    """)
+
+def sync_match_keys(conn: sqlite3.Connection, product_ids: Optional[List[int]] = None) -> None:
+    """Recomputes match keys for the given products (all when None). Runs inside the caller's write."""
+    query = "SELECT id, upc, asin, brand, model, title FROM products"
+    params: List[Any] = []
+    if product_ids is not None:
+        if not product_ids: return
+        query += f" WHERE id IN ({','.join('?' * len(product_ids))})"
+        params = list(product_ids)
+    rows = [(pid, canonical_upc(upc), canonical_asin(asin), normalize_name(brand), normalize_name(model), title_signature(title))
+            for pid, upc, asin, brand, model, title in conn.execute(query, params)]
+    conn.executemany("INSERT OR REPLACE INTO product_match_keys (product_id, upc_key, asin_key, brand_key, model_key, title_sig) VALUES (?, ?, ?, ?, ?, ?)", rows)
+
+def find_legacy_history_duplicates(conn: sqlite3.Connection) -> List[Tuple[str, int, float, str, int, List[int]]]:
+    """
+    Suspected repeats among rows recorded before history was keyed by lot. Closing an auction
+    k times left every one of its sales k times, so within an auction_source whose (product,
+    price, date) copy counts share a divisor k >= 2, all but 1/k of each are suspects.
+    Legacy rows have no lot, so a real close that sold everything k times looks the same:
+    this only reports (source, product_id, price, date, copies, extra ids). Nothing is deleted
+    here; see `python -m utils.maintenance --dedupe-history`.
+    """
+    groups = conn.execute(f"""
+        SELECT auction_source, product_id, sold_price, sold_date, GROUP_CONCAT(id) AS ids
+        FROM (SELECT * FROM product_price_history WHERE {KEY_SOURCE_AUCTION} IS NULL ORDER BY id)
+        GROUP BY auction_source, product_id, sold_price, sold_date
+    """).fetchall()
+
+    by_source = {}
+    for source, product_id, price, date, ids in groups:
+        by_source.setdefault(source, []).append((product_id, price, date, [int(i) for i in ids.split(",")]))
+
+    suspects = []
+    for source, rows in by_source.items():
+        runs = math.gcd(*(len(ids) for *_, ids in rows))
+        if runs < 2: continue
+        for product_id, price, date, ids in rows:
+            suspects.append((source, product_id, price, date, len(ids), ids[len(ids) // runs:]))
+    return suspects
+
+def _ensure_version_triggers(conn: sqlite3.Connection) -> None:
+    # Not tied to auctions by FK: a purged and re-scraped auction keeps counting up
+    conn.execute("CREATE TABLE IF NOT EXISTS data_versions (auction_id INTEGER PRIMARY KEY, version INTEGER NOT NULL DEFAULT 0)")
+    bump = "INSERT INTO data_versions (auction_id, version) VALUES ({}, 1) ON CONFLICT(auction_id) DO UPDATE SET version = version + 1;"
+    # Upsert, not UPDATE: on an upgraded database most auctions have no version row yet
+    bump_linked = """INSERT INTO data_versions (auction_id, version) SELECT DISTINCT auction_id, 1 FROM auction_items WHERE product_id = {}
+        ON CONFLICT(auction_id) DO UPDATE SET version = version + 1;"""
+    conn.execute(f"CREATE TRIGGER IF NOT EXISTS items_version_ai AFTER INSERT ON auction_items BEGIN {bump.format('new.auction_id')} END")
+    conn.execute(f"CREATE TRIGGER IF NOT EXISTS items_version_au AFTER UPDATE ON auction_items BEGIN {bump.format('new.auction_id')} END")
+    conn.execute(f"CREATE TRIGGER IF NOT EXISTS items_version_ad AFTER DELETE ON auction_items BEGIN {bump.format('old.auction_id')} END")
+    _ensure_trigger(conn, "products_version_au", f"AFTER UPDATE OF {', '.join(PRODUCT_VIEW_COLS)} ON products BEGIN {bump_linked.format('new.id')} END")
+    _ensure_trigger(conn, "products_version_ad", f"AFTER DELETE ON products BEGIN {bump_linked.format('old.id')} END")
+    _ensure_trigger(conn, "stats_version_ai", f"AFTER INSERT ON product_price_stats BEGIN {bump_linked.format('new.product_id')} END")
+    _ensure_trigger(conn, "stats_version_au", f"AFTER UPDATE OF sale_count, median_price ON product_price_stats BEGIN {bump_linked.format('new.product_id')} END")
+
+@writes
 def insert_auction(conn, auction_id, url):
     conn.execute("INSERT OR IGNORE INTO auctions (id, url) VALUES (?, ?)", (auction_id, url))
-    conn.commit()
 
+@writes
 def update_auction_metadata(conn, auction_id, title, auctioneer, end_date):
     conn.execute("UPDATE auctions SET auction_title = ?, auctioneer = ?, end_date = ? WHERE id = ?", (title, auctioneer, end_date, auction_id))
-    conn.commit()
 
+@writes
 def insert_auction_item(conn, auction_id, lot, current_bid, details: dict):
     # Lookup values using Display Keys (COL_) because that's what Scraper sends
     # Use KEY_SUG_MSRP because we updated Scraper to use that specific Key
-    conn.execute("""
+    lot_num, lot_suffix = lot_sort_key(lot)
+    conn.execute(f"""
         INSERT INTO auction_items (
-            auction_id, lot, current_bid, title, brand, model,
+            auction_id, lot, {KEY_LOT_NUM}, {KEY_LOT_SUFFIX}, current_bid, title, brand, model,
             packaging, condition, functional, missing_parts, missing_parts_desc,
             damaged, damage_desc, item_notes, upc, asin, url, 
             suggested_msrp, scraped_category
-        ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
     """, (
-        auction_id, lot, current_bid,
+        auction_id, lot, lot_num, lot_suffix, current_bid,
         details.get(COL_TITLE), details.get(COL_BRAND), details.get(COL_MODEL),
         details.get(COL_PKG), details.get(COL_COND), details.get(COL_FUNC),
         details.get(COL_MISSING), details.get(COL_MISSING_DESC),
@@ -71,8 +411,8 @@ def insert_auction_item(conn, auction_id, lot, current_bid, details: dict):
         details.get(COL_NOTES), details.get(COL_UPC), details.get(COL_ASIN), details.get(COL_URL),
         details.get(KEY_SUG_MSRP, 0), details.get(COL_CAT)
     ))
-    conn.commit()
 
+@writes
 def update_item_field(conn, item_id: int, field: str, value: Any):
     # Uses Database Keys (KEY_DB_)
     allowed = [
@@ -84,17 +424,16 @@ def update_item_field(conn, item_id: int, field: str, value: Any):
     ]
     if field.lower() not in allowed: return
     conn.execute(f"UPDATE auction_items SET {field} = ? WHERE id = ?", (value, item_id))
-    conn.commit()
 
-def update_item_status(conn, item_id: int, field: str, value: int):
-    update_item_field(conn, item_id, field, value)
+def update_item_status(conn, item_id: int, field: str, value: int, wait: bool = True):
+    return update_item_field(conn, item_id, field, value, wait=wait)
 
+@writes
 def update_final_price(conn, auction_id: int, lot_number: str, sold_price: float, status: str):
     cursor = conn.cursor()
     cursor.execute("""
         UPDATE auction_items SET sold_price = ?, status = ? WHERE auction_id = ? AND lot = ?
     """, (sold_price, status, auction_id, lot_number))
-    conn.commit()
 
 def get_active_auctions(conn) -> pd.DataFrame:
     return pd.read_sql_query("""
@@ -116,11 +455,63 @@ def get_closed_auctions(conn) -> pd.DataFrame:
         ORDER BY a.scrape_date DESC
     """, conn)
 
+def get_auction_version(conn, auction_id: int) -> int:
+    res = conn.execute("SELECT version FROM data_versions WHERE auction_id = ?", (auction_id,)).fetchone()
+    return res[0] if res else 0
+
+def get_catalog_version(conn) -> int:
+    res = conn.execute("SELECT version FROM catalog_version WHERE id = 1").fetchone()
+    return res[0] if res else 0
+
+def clear_item_cache() -> None:
+    global _item_cache_bytes
+    with _item_cache_lock:
+        _item_cache.clear()
+        _item_cache_bytes = 0
+
+def _cache_get(key: tuple) -> Optional[pd.DataFrame]:
+    with _item_cache_lock:
+        hit = _item_cache.get(key)
+        if hit is None: return None
+        _item_cache.move_to_end(key)
+        return hit[0]
+
+def _cache_put(key: tuple, df: pd.DataFrame) -> None:
+    global _item_cache_bytes
+    size = int(df.memory_usage(deep=True).sum())
+    if size > ITEM_CACHE_MAX_BYTES: return
+    with _item_cache_lock:
+        if key in _item_cache:
+            _item_cache_bytes -= _item_cache.pop(key)[1]
+        # Older versions of the same auction can never be hit again
+        for stale in [k for k in _item_cache if k[:2] == key[:2]]:
+            _item_cache_bytes -= _item_cache.pop(stale)[1]
+        _item_cache[key] = (df, size)
+        _item_cache_bytes += size
+        while _item_cache and (len(_item_cache) > ITEM_CACHE_MAX_ENTRIES or _item_cache_bytes > ITEM_CACHE_MAX_BYTES):
+            _item_cache_bytes -= _item_cache.popitem(last=False)[1][1]
+
 def get_auction_items(conn, auction_id: int) -> pd.DataFrame:
-    return pd.read_sql_query("""
+    """
+    Read-through cached. Returns a copy, so callers are free to add or rename columns.
+    The version is read before the frame: a write racing the load can only make the
+    entry stale under an already-outdated key, never serve stale data under a new one.
+    """
+    path = db_file(conn)
+    key = (path, auction_id, get_auction_version(conn, auction_id))
+    df = _cache_get(key) if path else None
+    if df is None:
+        df = _load_auction_items(conn, auction_id)
+        if path: _cache_put(key, df)
+    return df.copy()
+
+def _load_auction_items(conn, auction_id: int) -> pd.DataFrame:
+    # Rows come back in natural lot order; lot_sort gives the grid a plain number to sort on
+    return pd.read_sql_query(f"""
         SELECT
             i.id, i.auction_id, i.product_id,
             i.lot as lot_number, 
+            ROW_NUMBER() OVER (ORDER BY i.{KEY_LOT_NUM} IS NULL, i.{KEY_LOT_NUM}, i.{KEY_LOT_SUFFIX}, i.id) as {KEY_LOT_SORT},
             i.current_bid, i.sold_price, i.status, 
             i.suggested_msrp,
             i.scraped_category,
@@ -135,6 +526,8 @@ def get_auction_items(conn, auction_id: int) -> pd.DataFrame:
             p.msrp as master_msrp,
             p.target_list_price as master_target_price,
             p.shipping_cost_basis,
+            s.median_price as {KEY_COMP_MEDIAN},
+            s.sale_count as {KEY_COMP_COUNT},
             
             i.packaging, i.condition, i.functional, 
             i.missing_parts, i.missing_parts_desc,
@@ -145,5 +538,52 @@ def get_auction_items(conn, auction_id: int) -> pd.DataFrame:
             
         FROM auction_items i
         LEFT JOIN products p ON i.product_id = p.id
+        LEFT JOIN product_price_stats s ON s.product_id = i.product_id
         WHERE i.auction_id = ?
-    """, conn, params=(auction_id,))
\ No newline at end of file
+        ORDER BY {KEY_LOT_SORT}
+    """, conn, params=(auction_id,))
+
+def fts_query(text: str) -> Optional[str]:
+    """Turns free text into an FTS5 MATCH expression (every word, prefix-matched)."""
+    tokens = re.findall(r"\w+", str(text or "").lower())
+    if not tokens: return None
+    return " ".join(f'"{t}"*' for t in tokens)
+
+def search_products(conn, text: str, limit: Optional[int] = None) -> List[int]:
+    """Returns product ids matching the search text, best match first."""
+    match = fts_query(text)
+    if not match: return []
+    query = "SELECT rowid FROM products_fts WHERE products_fts MATCH ? ORDER BY rank"
+    params: list = [match]
+    if limit:
+        query += " LIMIT ?"
+        params.append(limit)
+    return [r[0] for r in conn.execute(query, params).fetchall()]
+
+def search_auction_items(conn, text: str, auction_id: Optional[int] = None, limit: Optional[int] = None) -> List[int]:
+    """
+    Returns auction item ids matching the search text, best match first.
+    Items linked to a product also match on the product's title/brand/model/UPC/ASIN.
+    """
+    match = fts_query(text)
+    if not match: return []
+    auction_filter = "AND i.auction_id = ?" if auction_id is not None else ""
+    query = f"""
+        SELECT id FROM (
+            SELECT i.id, f.rank FROM auction_items_fts f
+            JOIN auction_items i ON i.id = f.rowid
+            WHERE auction_items_fts MATCH ? {auction_filter}
+            UNION ALL
+            SELECT i.id, f.rank FROM products_fts f
+            JOIN auction_items i ON i.product_id = f.rowid
+            WHERE products_fts MATCH ? {auction_filter}
+        )
+        GROUP BY id
+        ORDER BY MIN(rank)
+    """
+    params: list = [match] + ([auction_id] if auction_id is not None else [])
+    params = params + params
+    if limit:
+        query += " LIMIT ?"
+        params.append(limit)
+    return [r[0] for r in conn.execute(query, params).fetchall()]
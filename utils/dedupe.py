@@ -0,0 +1,222 @@
+# utils/dedupe.py
+import zlib
+import sqlite3
+import difflib
+import numpy as np
+import pandas as pd
+from typing import Optional, Dict, Any, List, Tuple, Callable
+from utils.writer import writes, run_write
+from utils.parse import KEY_DB_TITLE
+
+# Duplicate scan: UPC -> ASIN -> similar titles.
+# Titles are blocked with MinHash/LSH over character shingles, so difflib only scores pairs
+# that share a band bucket instead of all n^2 pairs.
+TITLE_THRESHOLD = 0.85
+MIN_TITLE_LEN = 4    # Shorter (or blank) titles are never title-matched: '' and 'ab' aren't evidence
+SHINGLE = 3
+NUM_PERM = 64
+LSH_ROWS = 4         # 16 bands of 4: shingle Jaccard 0.6 collides ~88% of the time, 0.7 ~98%
+MAX_BUCKET = 1000    # Buckets this big are shared boilerplate, not duplicates; skipped
+MIN_JACCARD = 0.4    # Lowest shingle Jaccard seen among pairs at difflib ratio >= 0.85
+PAIR_CHUNK = 1_000_000
+HASH_PRIME = (1 << 31) - 1
+HASH_SEED = 20240601
+
+Progress = Callable[[float, str], None]
+
+def _report(progress: Optional[Progress], value: float, text: str) -> None:
+    if progress: progress(min(1.0, value), text)
+
+def _shingle_hashes(title: str) -> List[int]:
+    t = f" {title} "
+    return [zlib.crc32(t[i:i + SHINGLE].encode()) for i in range(max(1, len(t) - SHINGLE + 1))]
+
+def minhash_signatures(titles: List[str], num_perm: int = NUM_PERM, progress: Optional[Progress] = None) -> np.ndarray:
+    """(len(titles), num_perm) MinHash signatures of each title's character shingles."""
+    hashes = [_shingle_hashes(t) for t in titles]
+    sizes = np.array([len(h) for h in hashes], dtype=np.int64)
+    flat = np.fromiter((x for h in hashes for x in h), dtype=np.uint64, count=int(sizes.sum()))
+    starts = np.concatenate(([0], np.cumsum(sizes)[:-1]))
+    rng = np.random.default_rng(HASH_SEED)
+    a = rng.integers(1, HASH_PRIME, num_perm, dtype=np.uint64)
+    b = rng.integers(0, HASH_PRIME, num_perm, dtype=np.uint64)
+    sig = np.empty((len(titles), num_perm), dtype=np.uint32)
+    for k in range(num_perm):
+        # a < 2^31 and crc32 < 2^32, so a * h fits in uint64
+        sig[:, k] = np.minimum.reduceat((a[k] * flat + b[k]) % HASH_PRIME, starts)
+        if k % 8 == 7: _report(progress, 0.1 + 0.3 * (k + 1) / num_perm, "Hashing titles...")
+    return sig
+
+def lsh_candidates(sig: np.ndarray, rows: int = LSH_ROWS, max_bucket: int = MAX_BUCKET,
+                   min_jaccard: float = MIN_JACCARD, focus: Optional[np.ndarray] = None) -> np.ndarray:
+    """
+    Distinct (i, j), i < j, pairs that share at least one band bucket and whose estimated
+    shingle Jaccard (share of equal signature slots) is >= min_jaccard, as an (m, 2) array.
+    With a boolean focus mask, only pairs touching a focus row are returned.
+    """
+    n = len(sig)
+    kept = []
+    for start in range(0, sig.shape[1] - rows + 1, rows):
+        band = np.ascontiguousarray(sig[:, start:start + rows]).view(np.dtype((np.void, 4 * rows))).ravel()
+        _, inverse, counts = np.unique(band, return_inverse=True, return_counts=True)
+        order = np.argsort(inverse, kind="stable")
+        ends = np.cumsum(counts)
+        codes = []
+        for bucket in np.flatnonzero((counts > 1) & (counts <= max_bucket)):
+            members = np.sort(order[ends[bucket] - counts[bucket]:ends[bucket]])
+            if focus is not None and not focus[members].any(): continue
+            i, j = np.triu_indices(len(members), 1)
+            if focus is not None:
+                keep = focus[members[i]] | focus[members[j]]
+                i, j = i[keep], j[keep]
+            codes.append(members[i].astype(np.int64) * n + members[j])
+        if not codes: continue
+        codes = np.unique(np.concatenate(codes))
+        for chunk in range(0, len(codes), PAIR_CHUNK):
+            part = codes[chunk:chunk + PAIR_CHUNK]
+            agree = (sig[part // n] == sig[part % n]).mean(axis=1)
+            kept.append(part[agree >= min_jaccard])
+    if not kept: return np.empty((0, 2), dtype=np.int64)
+    codes = np.unique(np.concatenate(kept))
+    return np.column_stack((codes // n, codes % n))
+
+def score_pairs(titles: List[str], pairs: np.ndarray, threshold: float = TITLE_THRESHOLD,
+                progress: Optional[Progress] = None) -> List[Tuple[int, int, float]]:
+    """(i, j, ratio) for the candidate pairs whose difflib ratio is >= threshold."""
+    # Score as SequenceMatcher(a=row i, b=row j); b is cached, so group by j
+    found = []
+    if not len(pairs): return found
+    matcher = difflib.SequenceMatcher(None)
+    pairs = pairs[np.lexsort((pairs[:, 0], pairs[:, 1]))]
+    step = max(1, len(pairs) // 20)
+    for k, (i, j) in enumerate(pairs.tolist()):
+        if matcher.b is not titles[j]: matcher.set_seq2(titles[j])
+        matcher.set_seq1(titles[i])
+        if matcher.real_quick_ratio() >= threshold and matcher.quick_ratio() >= threshold:
+            ratio = matcher.ratio()
+            if ratio >= threshold: found.append((i, j, ratio))
+        if k % step == 0: _report(progress, 0.5 + 0.45 * k / len(pairs), f"Scoring {len(pairs):,} candidate pairs...")
+    return found
+
+# === INCREMENTAL SCAN ===
+# scan_duplicates persists pairs to duplicate_candidates. Only products above the watermark
+# (new) or in duplicate_scan_queue (edited) are compared, against every stored signature.
+REASON_UPC = "Same UPC"
+REASON_ASIN = "Same ASIN"
+REASON_TITLE = "Similar Titles"
+REASON_ORDER = (REASON_UPC, REASON_ASIN, REASON_TITLE)
+
+def _key_pairs(conn: sqlite3.Connection, column: str, reason: str) -> List[Tuple[int, int, str, float]]:
+    # Every product sharing a match key with a dirty one; match keys are canonical, so
+    # UPC-A vs EAN-13 forms of the same code pair up too
+    rows = conn.execute(f"""
+        SELECT d.product_id, k.product_id, d.{column}
+        FROM product_match_keys d JOIN product_match_keys k ON k.{column} = d.{column} AND k.product_id != d.product_id
+        WHERE d.{column} IS NOT NULL AND d.product_id IN (SELECT product_id FROM temp.scan_dirty)
+    """).fetchall()
+    return [(min(a, b), max(a, b), f"{reason}: {key}", 1.0) for a, b, key in rows]
+
+def scan_duplicates(conn: sqlite3.Connection, full: bool = False, threshold: float = TITLE_THRESHOLD,
+                    progress: Optional[Progress] = None) -> Dict[str, int]:
+    """
+    Incremental duplicate scan. Compares products added or edited since the last run (all of them
+    when full=True) against the whole library and stores the pairs; dismissed pairs stay dismissed.
+    Reads here; one writer job saves the result. Returns {'scanned': n, 'pairs': n}.
+    """
+    _report(progress, 0.0, "Finding new and edited products...")
+    state = conn.execute("SELECT last_product_id FROM duplicate_scan_state WHERE id = 1").fetchone()
+    last_id = 0 if full or not state else state[0]
+    top_id = conn.execute("SELECT IFNULL(MAX(id), 0) FROM products").fetchone()[0]
+    queue_seq = conn.execute("SELECT IFNULL(MAX(seq), 0) FROM duplicate_scan_queue").fetchone()[0]
+    df = pd.read_sql_query(f"""
+        SELECT p.id, p.{KEY_DB_TITLE}, s.sig,
+               (p.id > ? OR s.sig IS NULL OR q.product_id IS NOT NULL) AS dirty
+        FROM products p
+        LEFT JOIN duplicate_signatures s ON s.product_id = p.id
+        LEFT JOIN duplicate_scan_queue q ON q.product_id = p.id AND q.seq <= ?
+        WHERE p.id <= ? ORDER BY p.id
+    """, conn, params=(last_id, queue_seq, top_id))
+    dirty = df["dirty"].to_numpy(dtype=bool)
+    if not dirty.any():
+        _report(progress, 1.0, "Nothing new to scan.")
+        return {"scanned": 0, "pairs": 0}
+
+    ids = df["id"].tolist()
+    dirty_ids = [ids[k] for k in np.flatnonzero(dirty)]
+    conn.execute("DROP TABLE IF EXISTS temp.scan_dirty")
+    conn.execute("CREATE TEMP TABLE scan_dirty (product_id INTEGER PRIMARY KEY)")
+    conn.executemany("INSERT INTO temp.scan_dirty VALUES (?)", [(i,) for i in dirty_ids])
+    pairs = _key_pairs(conn, "upc_key", REASON_UPC) + _key_pairs(conn, "asin_key", REASON_ASIN)
+    conn.execute("DROP TABLE temp.scan_dirty")
+    conn.commit()
+
+    titles = df[KEY_DB_TITLE].fillna("").astype(str).str.strip().str.lower().tolist()
+    titled = np.array([len(t) >= MIN_TITLE_LEN for t in titles], dtype=bool)
+    sig = np.empty((len(df), NUM_PERM), dtype=np.uint32)
+    clean = np.flatnonzero(~dirty)
+    if len(clean): sig[clean] = np.frombuffer(b"".join(df["sig"].iloc[clean]), dtype=np.uint32).reshape(-1, NUM_PERM)
+    sig[dirty] = minhash_signatures([titles[k] for k in np.flatnonzero(dirty)], progress=progress)
+    # Untitled products still get a signature (so they aren't rescanned) but never a title pair
+    candidates = lsh_candidates(sig, focus=dirty & titled)
+    candidates = candidates[titled[candidates[:, 0]] & titled[candidates[:, 1]]]
+    _report(progress, 0.5, f"Scoring {len(candidates):,} candidate pairs...")
+    pairs += [(ids[i], ids[j], REASON_TITLE, ratio) for i, j, ratio in score_pairs(titles, candidates, threshold, progress)]
+
+    signatures = [(ids[k], sig[k].tobytes()) for k in np.flatnonzero(dirty)]
+    saved = run_write(conn, _save_scan, dirty_ids, pairs, signatures, top_id, queue_seq)
+    _report(progress, 1.0, f"Scanned {len(dirty_ids):,} products.")
+    return {"scanned": len(dirty_ids), "pairs": saved}
+
+def _save_scan(conn: sqlite3.Connection, dirty_ids: List[int], pairs: List[Tuple[int, int, str, float]],
+               signatures: List[Tuple[int, bytes]], top_id: int, queue_seq: int) -> int:
+    conn.execute("DROP TABLE IF EXISTS temp.scan_dirty")
+    conn.execute("CREATE TEMP TABLE scan_dirty (product_id INTEGER PRIMARY KEY)")
+    conn.executemany("INSERT INTO temp.scan_dirty VALUES (?)", [(i,) for i in dirty_ids])
+    # A rescanned product's open pairs are replaced by what this scan found
+    conn.execute("""
+        DELETE FROM duplicate_candidates WHERE status = 'open'
+        AND (id_a IN (SELECT product_id FROM temp.scan_dirty) OR id_b IN (SELECT product_id FROM temp.scan_dirty))
+    """)
+    before = conn.total_changes
+    # Strongest reason first, so a pair found by UPC and by title keeps the UPC reason
+    ranked = sorted(pairs, key=lambda p: REASON_ORDER.index(p[2].split(":")[0]))
+    conn.executemany("INSERT OR IGNORE INTO duplicate_candidates (id_a, id_b, reason, score) VALUES (?, ?, ?, ?)", ranked)
+    saved = conn.total_changes - before
+    conn.executemany("INSERT OR REPLACE INTO duplicate_signatures (product_id, sig) VALUES (?, ?)", signatures)
+    conn.execute("DELETE FROM duplicate_scan_queue WHERE seq <= ?", (queue_seq,))
+    conn.execute("""
+        INSERT INTO duplicate_scan_state (id, last_product_id, scanned_at) VALUES (1, ?, CURRENT_TIMESTAMP)
+        ON CONFLICT(id) DO UPDATE SET last_product_id = MAX(last_product_id, excluded.last_product_id), scanned_at = excluded.scanned_at
+    """, (top_id,))
+    conn.execute("DROP TABLE temp.scan_dirty")
+    return saved
+
+def load_duplicate_groups(conn: sqlite3.Connection) -> List[Dict[str, Any]]:
+    """
+    Open candidate pairs as [{'ids': [...], 'reason': str}, ...]. Grouped greedily by lowest id:
+    each group is a product plus its not-yet-grouped candidates, under its strongest reason.
+    """
+    rows = conn.execute("SELECT id_a, id_b, reason FROM duplicate_candidates WHERE status = 'open' ORDER BY id_a, id_b").fetchall()
+    edges: Dict[int, Dict[int, str]] = {}
+    for a, b, reason in rows:
+        edges.setdefault(a, {})[b] = reason
+        edges.setdefault(b, {})[a] = reason
+    groups, seen = [], set()
+    for anchor in sorted(edges):
+        if anchor in seen: continue
+        members = [m for m in sorted(edges[anchor]) if m not in seen]
+        if not members: continue
+        reason = min((edges[anchor][m] for m in members), key=lambda r: REASON_ORDER.index(r.split(":")[0]))
+        groups.append({'ids': [anchor] + members, 'reason': reason})
+        seen.update([anchor] + members)
+    return groups
+
+@writes
+def dismiss_duplicates(conn: sqlite3.Connection, product_ids: List[int]) -> None:
+    """Marks every pair within product_ids as not duplicates; rescans won't propose them again."""
+    ids = sorted({int(i) for i in product_ids})
+    pairs = [(a, b) for k, a in enumerate(ids) for b in ids[k + 1:]]
+    conn.executemany("""
+        INSERT INTO duplicate_candidates (id_a, id_b, reason, status) VALUES (?, ?, 'Dismissed', 'dismissed')
+        ON CONFLICT(id_a, id_b) DO UPDATE SET status = 'dismissed'
+    """, pairs)
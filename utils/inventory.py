@@ -1,18 +1,28 @@
 # utils/inventory.py
+import os
 import sqlite3
-import pandas as pd
 import difflib
-from typing import Optional, Dict, Any, List, Union
+import threading
+import multiprocessing
+import numpy as np
+import pandas as pd
+from concurrent.futures import ProcessPoolExecutor
+from typing import Optional, Dict, Any, List, Tuple, Union, Callable
+from utils.writer import writes, run_write, db_file
+from utils.db import sync_match_keys, get_catalog_version, LAST_SOLD_DATE_SQL
+from utils.shipping import reprice_shipping
 # NEW: Import Constants
 from utils.parse import (
     KEY_DB_TITLE, KEY_DB_BRAND, KEY_DB_MODEL, KEY_DB_UPC, KEY_DB_ASIN, KEY_DB_CAT, KEY_DB_MSRP, KEY_DB_AVG_SOLD,
-    KEY_DB_TARGET, KEY_SHIP_COST, KEY_DB_NOTES, KEY_IS_FAV,
+    KEY_DB_TARGET, KEY_SHIP_COST, KEY_DB_PROD_NOTES, KEY_IS_FAV,
     KEY_WEIGHT_LBS, KEY_WEIGHT_OZ, KEY_LENGTH, KEY_WIDTH, KEY_HEIGHT, KEY_IRREGULAR,
     KEY_EBAY_AVG_SOLD, KEY_EBAY_SOLD_LOW, KEY_EBAY_SOLD_HIGH, KEY_EBAY_AVG_SHIP, KEY_EBAY_STR,
     KEY_EBAY_SOLD_COUNT, KEY_EBAY_SELLERS, KEY_EBAY_ACTIVE_CNT, KEY_EBAY_LIST_AVG,
     KEY_EBAY_ACTIVE_LOW, KEY_EBAY_ACTIVE_HIGH, KEY_EBAY_ACTIVE_SHIP, KEY_EBAY_WATCHERS, KEY_MKT_NOTES,
     KEY_AMZ_URL, KEY_AMZ_NEW, KEY_AMZ_USED, KEY_AMZ_LIST, KEY_AMZ_RANK, KEY_AMZ_REVS, KEY_AMZ_STARS,
-    KEY_AMZ_RANK_MAIN, KEY_AMZ_CAT_MAIN, KEY_AMZ_RANK_SUB, KEY_AMZ_CAT_SUB
+    KEY_AMZ_RANK_MAIN, KEY_AMZ_CAT_MAIN, KEY_AMZ_RANK_SUB, KEY_AMZ_CAT_SUB,
+    KEY_SHIP_METHOD, KEY_SHIP_RATE_VER, KEY_SHIP_DIMS_KEY,
+    canonical_upc, canonical_asin, normalize_name, title_signature
 )
 
 # ... (Keep existing helpers: _clean_str, _prepare_product_fields, etc.) ...
@@ -34,7 +44,7 @@ def _prepare_product_fields(data: Dict[str, Any]) -> Dict[str, Any]:
         KEY_DB_AVG_SOLD: data.get(KEY_DB_AVG_SOLD),
         KEY_DB_TARGET: data.get(KEY_DB_TARGET),
         KEY_SHIP_COST: data.get(KEY_SHIP_COST),
-        KEY_DB_NOTES: data.get(KEY_DB_NOTES),
+        KEY_DB_PROD_NOTES: data.get(KEY_DB_PROD_NOTES),
         KEY_IS_FAV: 1 if data.get(KEY_IS_FAV) else 0,
         
         # Physical
@@ -75,7 +85,7 @@ def _prepare_product_fields(data: Dict[str, Any]) -> Dict[str, Any]:
         KEY_AMZ_CAT_SUB: data.get(KEY_AMZ_CAT_SUB),
     }
 
-# ... (Keep helpers: _resolve_existing_id, _match_brand_model, _check_for_conflicts, _execute_db_write, _link_items) ...
+# ... (Keep helpers: _resolve_existing_id, _check_for_conflicts, _execute_db_write, _link_items) ...
 def _resolve_existing_id(cursor: sqlite3.Cursor, data_id: Optional[int], 
                         upc: Optional[str], asin: Optional[str]) -> Optional[int]:
     if data_id: return data_id
@@ -87,25 +97,6 @@ def _resolve_existing_id(cursor: sqlite3.Cursor, data_id: Optional[int],
         if res: return res[0]
     return None
 
-def _match_brand_model(item: pd.Series, products_df: pd.DataFrame) -> Optional[int]:
-    if not (item.get('brand') and item.get('model')): return None
-    i_brand = str(item['brand']).strip().lower()
-    i_model = str(item['model']).strip().lower()
-    if len(i_brand) < 2 or len(i_model) < 2: return None
-    match = products_df[
-        (products_df['brand'].str.lower().str.strip() == i_brand) & 
-        (products_df['model'].str.lower().str.strip() == i_model)
-    ]
-    if not match.empty: return int(match.iloc[0]['id'])
-    for _, prod in products_df.iterrows():
-        p_brand = str(prod['brand']).lower().strip()
-        p_model = str(prod['model']).lower().strip()
-        brand_score = difflib.SequenceMatcher(None, i_brand, p_brand).ratio()
-        model_score = difflib.SequenceMatcher(None, i_model, p_model).ratio()
-        if brand_score > 0.85 and model_score > 0.85:
-            return int(prod['id'])
-    return None
-
 def _check_for_conflicts(cursor: sqlite3.Cursor, product_id: int, upc: Optional[str], asin: Optional[str]) -> int:
     target_id = product_id
     if upc:
@@ -148,99 +139,656 @@ def get_product_by_id(conn: sqlite3.Connection, product_id: int) -> Optional[pd.
     except Exception: pass
     return None
 
+def _delete_product(conn: sqlite3.Connection, product_id: int) -> None:
+    cursor = conn.cursor()
+    cursor.execute("UPDATE auction_items SET product_id = NULL WHERE product_id = ?", (product_id,))
+    cursor.execute("DELETE FROM products WHERE id = ?", (product_id,))
+
 def delete_product(conn: sqlite3.Connection, product_id: int) -> bool:
     try:
-        cursor = conn.cursor()
-        cursor.execute("UPDATE auction_items SET product_id = NULL WHERE product_id = ?", (product_id,))
-        cursor.execute("DELETE FROM products WHERE id = ?", (product_id,))
-        conn.commit()
+        run_write(conn, _delete_product, product_id)
         return True
     except Exception: return False
 
+@writes
+def delete_products(conn: sqlite3.Connection, product_ids: List[int]) -> int:
+    if not product_ids: return 0
+    placeholders = ",".join("?" * len(product_ids))
+    return conn.execute(f"DELETE FROM products WHERE id IN ({placeholders})", product_ids).rowcount
+
+@writes
+def set_product_favorite(conn: sqlite3.Connection, product_id: int, is_fav: bool) -> None:
+    conn.execute("UPDATE products SET is_favorite = ? WHERE id = ?", (1 if is_fav else 0, product_id))
+
+@writes
 def save_product_to_library(conn: sqlite3.Connection, data: Dict[str, Any], link_item_ids: Union[int, List[int], None] = None) -> Optional[int]:
     cursor = conn.cursor()
     fields = _prepare_product_fields(data)
     product_id = _resolve_existing_id(cursor, data.get('id'), fields['upc'], fields['asin'])
     final_id = _execute_db_write(cursor, product_id, fields)
-    if final_id: _link_items(cursor, final_id, link_item_ids)
-    conn.commit()
+    if final_id:
+        sync_match_keys(conn, [final_id])
+        reprice_shipping(conn, [final_id])
+        _link_items(cursor, final_id, link_item_ids)
     return final_id
 
-def auto_link_products(conn: sqlite3.Connection, auction_id: Optional[int] = None) -> int:
-    cursor = conn.cursor()
+def find_product_links(conn: sqlite3.Connection, auction_id: Optional[int] = None, workers: Optional[int] = None,
+                       chunk_size: Optional[int] = None, min_confidence: Optional[float] = None) -> List[tuple]:
+    """
+    (product_id, item_id) for every unlinked lot that matches a product. Read-only.
+    UPC/ASIN/exact brand+model always link; fuzzy and ranked matches need min_confidence
+    (AUTO_LINK_CONFIDENCE by default).
+    """
+    if min_confidence is None: min_confidence = AUTO_LINK_CONFIDENCE
     query = "SELECT id, title, brand, model, upc, asin FROM auction_items WHERE product_id IS NULL"
-    if auction_id is not None: query += f" AND auction_id = {auction_id}"
-    
-    items = pd.read_sql_query(query, conn)
-    linked_count = 0
-    products_df = pd.read_sql_query("SELECT id, upc, asin, brand, model FROM products", conn)
+    params = []
+    if auction_id is not None:
+        query += " AND auction_id = ?"
+        params.append(auction_id)
     
-    for _, item in items.iterrows():
-        p_id = _find_product_match(item, products_df)
-        if p_id:
-            cursor.execute("UPDATE auction_items SET product_id = ? WHERE id = ?", (p_id, item['id']))
-            linked_count += 1
-            
-    conn.commit()
-    return linked_count
-
-def _find_product_match(item: pd.Series, products_df: pd.DataFrame) -> Optional[int]:
-    if item.get('upc') and str(item['upc']).strip():
-        match = products_df[products_df['upc'] == item['upc']]
-        if not match.empty: return int(match.iloc[0]['id'])
-            
-    if item.get('asin') and str(item['asin']).strip():
-        match = products_df[products_df['asin'] == item['asin']]
-        if not match.empty: return int(match.iloc[0]['id'])
-            
-    return _match_brand_model(item, products_df)
+    items = pd.read_sql_query(query, conn, params=params)
+    if items.empty: return []
+
+    # Only the lots are normalized here; products are looked up through product_match_keys
+    # Temp-table writes open an implicit transaction on this (reader) connection; it is always
+    # committed, or the connection would keep reading an old snapshot and pin the WAL
+    conn.execute("CREATE TEMP TABLE IF NOT EXISTS link_keys (item_id INTEGER PRIMARY KEY, upc_key TEXT, asin_key TEXT, brand_key TEXT, model_key TEXT)")
+    try:
+        conn.execute("DELETE FROM temp.link_keys")
+        conn.executemany("INSERT INTO temp.link_keys VALUES (?, ?, ?, ?, ?)", [
+            (int(it['id']), canonical_upc(it['upc']), canonical_asin(it['asin']), normalize_name(it['brand']), normalize_name(it['model']))
+            for it in items.to_dict("records")
+        ])
+
+        # UPC -> ASIN -> exact brand/model, each an indexed lookup
+        matches = conn.execute(f"""
+            SELECT l.item_id, COALESCE(
+                (SELECT MIN(k.product_id) FROM product_match_keys k WHERE k.upc_key = l.upc_key),
+                (SELECT MIN(k.product_id) FROM product_match_keys k WHERE k.asin_key = l.asin_key),
+                (SELECT MIN(k.product_id) FROM product_match_keys k WHERE k.brand_key = l.brand_key AND k.model_key = l.model_key
+                    AND LENGTH(l.brand_key) >= {MIN_KEY_LEN} AND LENGTH(l.model_key) >= {MIN_KEY_LEN})
+            ), l.brand_key, l.model_key
+            FROM temp.link_keys l
+        """).fetchall()
+    finally:
+        conn.execute("DELETE FROM temp.link_keys")
+        conn.commit()  # Temp tables only; ends the implicit transaction
+    links = [(pid, item_id) for item_id, pid, _, _ in matches if pid]
+
+    # Everything past the exact keys is only linked when the ranker is confident about it
+    unmatched = {item_id: (brand, model) for item_id, pid, brand, model in matches if not pid}
+    if not unmatched: return links
+    fuzzy = [(item_id, b, m) for item_id, (b, m) in unmatched.items()
+             if b and m and len(b) >= MIN_KEY_LEN and len(m) >= MIN_KEY_LEN]
+    proposed: Dict[int, int] = {}
+    if fuzzy:
+        matcher = _fuzzy_candidates(conn, {b for _, b, _ in fuzzy})
+        found = matcher.match_brand_models([(b, m) for _, b, m in fuzzy], workers, chunk_size or FUZZY_CHUNK_SIZE)
+        proposed = {item_id: pid for (item_id, _, _), pid in zip(fuzzy, found) if pid}
+
+    ranker = get_candidate_ranker(conn)
+    for it in items[items['id'].isin(list(unmatched))].to_dict("records"):
+        keys = _lot_keys(it)
+        pid = proposed.get(int(it['id']))
+        if pid and ranker.confidence(ranker.cosine_pair(_match_text(*keys[2:]), pid)) >= min_confidence:
+            links.append((pid, int(it['id'])))
+            continue
+        ranked = ranker.top_k(keys, 1)
+        if ranked and ranked[0][2] >= min_confidence:
+            links.append((ranked[0][0], int(it['id'])))
+    return links
+
+def _apply_links(conn: sqlite3.Connection, links: List[tuple]) -> int:
+    # Lots linked by hand in the meantime keep their product
+    cur = conn.executemany("UPDATE auction_items SET product_id = ? WHERE id = ? AND product_id IS NULL", links)
+    return cur.rowcount
+
+def auto_link_products(conn: sqlite3.Connection, auction_id: Optional[int] = None, workers: Optional[int] = None,
+                       min_confidence: Optional[float] = None) -> int:
+    # Matching (the slow part) runs on the reader; the writer only applies the links
+    links = find_product_links(conn, auction_id, workers, min_confidence=min_confidence)
+    if not links: return 0
+    return run_write(conn, _apply_links, links)
+
+def _fuzzy_candidates(conn: sqlite3.Connection, brands: set) -> "ProductMatcher":
+    # Only the distinct brand list is scanned; products are loaded for brands that pass the
+    # cheap bound, and the matcher scores the ones it actually needs
+    all_brands = [r[0] for r in conn.execute("SELECT DISTINCT brand_key FROM product_match_keys WHERE brand_key IS NOT NULL AND model_key IS NOT NULL")]
+    if not all_brands: return ProductMatcher(pd.DataFrame(columns=["id", "upc", "asin", "brand", "model"]))
+    counts, lens = _char_counts(all_brands), np.array([len(b) for b in all_brands], dtype=np.int64)
+    keep = set()
+    for brand in brands:
+        bound = _ratio_upper_bound(counts, lens, brand) > FUZZY_THRESHOLD
+        keep.update(all_brands[i] for i in np.flatnonzero(bound))
+
+    conn.execute("CREATE TEMP TABLE IF NOT EXISTS link_brands (brand_key TEXT PRIMARY KEY)")
+    try:
+        conn.execute("DELETE FROM temp.link_brands")
+        conn.executemany("INSERT INTO temp.link_brands VALUES (?)", [(b,) for b in keep])
+        cands = pd.read_sql_query("""
+            SELECT k.product_id AS id, NULL AS upc, NULL AS asin, k.brand_key AS brand, k.model_key AS model
+            FROM temp.link_brands b JOIN product_match_keys k ON k.brand_key = b.brand_key
+            WHERE k.model_key IS NOT NULL
+            ORDER BY k.product_id
+        """, conn)
+    finally:
+        conn.execute("DELETE FROM temp.link_brands")
+        conn.commit()  # Same as link_keys: don't leave the reader inside a transaction
+    return ProductMatcher(cands)
+
+# === FUZZY MATCHING ===
+FUZZY_THRESHOLD = 0.85
+MIN_KEY_LEN = 2
+CHAR_BUCKETS = 128
+
+def _similar(a: str, b: str) -> bool:
+    return difflib.SequenceMatcher(None, a, b).ratio() > FUZZY_THRESHOLD
+
+def _char_counts(texts: List[str]) -> np.ndarray:
+    counts = np.zeros((len(texts), CHAR_BUCKETS), dtype=np.uint16)
+    for row, text in enumerate(texts):
+        for ch in text: counts[row, ord(ch) % CHAR_BUCKETS] += 1
+    return counts
+
+def _ratio_upper_bound(counts: np.ndarray, lens: np.ndarray, text: str) -> np.ndarray:
+    # difflib's quick_ratio over character buckets: never below the real ratio, so it's a safe filter
+    inter = np.minimum(counts, _char_counts([text])[0]).sum(axis=1)
+    return 2.0 * inter / np.maximum(lens + len(text), 1)
+
+# === PARALLEL FUZZY ENGINE ===
+# difflib is pure Python, so CPU-bound scoring is sharded across processes. Work is cut into
+# fixed chunks and results come back in input order, so output never depends on scheduling.
+FUZZY_WORKERS = os.cpu_count() or 1
+FUZZY_CHUNK_SIZE = 2000      # Pairs per task
+MIN_PARALLEL_PAIRS = 20000   # Below this, process start-up costs more than it saves
+
+def _ratio_chunk(pairs: List[tuple]) -> List[float]:
+    return [difflib.SequenceMatcher(None, a, b).ratio() for a, b in pairs]
+
+def _run_chunks(fn: Callable, tasks: List[Any], workers: Optional[int]) -> List[Any]:
+    workers = FUZZY_WORKERS if workers is None else workers
+    if workers <= 1 or len(tasks) <= 1:
+        return [fn(t) for t in tasks]
+    # spawn, not fork: the parent has a writer thread and open SQLite handles
+    ctx = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(max_workers=min(workers, len(tasks)), mp_context=ctx) as pool:
+        return list(pool.map(fn, tasks))
+
+def fuzzy_ratios(pairs: List[tuple], workers: Optional[int] = None, chunk_size: int = FUZZY_CHUNK_SIZE) -> List[float]:
+    """difflib ratio for each (a, b) pair, in input order."""
+    if len(pairs) < MIN_PARALLEL_PAIRS: workers = 1
+    chunks = [pairs[i:i + chunk_size] for i in range(0, len(pairs), chunk_size)]
+    return [score for chunk in _run_chunks(_ratio_chunk, chunks, workers) for score in chunk]
+
+# === PRODUCT MATCHER ===
+class ProductMatcher:
+    """
+    Prebuilt indexes over the product library for linking auction lots:
+    UPC -> ASIN -> exact (brand, model) -> fuzzy brand + model.
+    The fuzzy step only runs difflib on products whose brand and model both pass a vectorized
+    character-count bound; brand scores are cached, so each distinct pair is scored once.
+    Ties resolve to the lowest product id, the same product a top-down scan would find first.
+    """
+    def __init__(self, products_df: pd.DataFrame):
+        self.by_upc: Dict[str, int] = {}
+        self.by_asin: Dict[str, int] = {}
+        self.by_brand_model: Dict[tuple, int] = {}
+        self._brand_cache: Dict[str, np.ndarray] = {}
+        self._brand_scores: Dict[tuple, bool] = {}
+
+        brands: Dict[str, int] = {}
+        ids, brand_codes, models = [], [], []
+        for row in products_df.sort_values("id").itertuples(index=False):
+            pid = int(row.id)
+            upc, asin = canonical_upc(row.upc), canonical_asin(row.asin)
+            if upc: self.by_upc.setdefault(upc, pid)
+            if asin: self.by_asin.setdefault(asin, pid)
+            brand, model = normalize_name(row.brand), normalize_name(row.model)
+            if brand and model:
+                self.by_brand_model.setdefault((brand, model), pid)
+                ids.append(pid)
+                brand_codes.append(brands.setdefault(brand, len(brands)))
+                models.append(model)
+
+        self._ids = np.array(ids, dtype=np.int64)
+        self._brand_codes = np.array(brand_codes, dtype=np.int64)
+        self._models = models
+        self._brands = list(brands)
+        self._brand_counts = _char_counts(self._brands)
+        self._brand_lens = np.array([len(b) for b in self._brands], dtype=np.int64)
+        self._model_counts = _char_counts(models)
+        self._model_lens = np.array([len(m) for m in models], dtype=np.int64)
+
+    def _brand_bound(self, brand: str) -> np.ndarray:
+        # Boolean mask over brand codes; exact scores are taken lazily in _brand_ok
+        if brand not in self._brand_cache:
+            self._brand_cache[brand] = _ratio_upper_bound(self._brand_counts, self._brand_lens, brand) > FUZZY_THRESHOLD
+        return self._brand_cache[brand]
+
+    def _brand_ok(self, brand: str, code: int) -> bool:
+        key = (brand, code)
+        if key not in self._brand_scores:
+            self._brand_scores[key] = _similar(brand, self._brands[code])
+        return self._brand_scores[key]
+
+    def _candidate_rows(self, brand: str, model: str) -> np.ndarray:
+        # Rows (in id order) whose brand and model both pass the cheap bound
+        if not self._models: return np.array([], dtype=np.int64)
+        rows = np.flatnonzero(self._brand_bound(brand)[self._brand_codes])
+        return rows[_ratio_upper_bound(self._model_counts[rows], self._model_lens[rows], model) > FUZZY_THRESHOLD]
+
+    def _exact_or_key(self, brand: Any, model: Any):
+        # (product id, None) on an exact hit, (None, (brand, model)) if fuzzy matching should run
+        brand, model = normalize_name(brand), normalize_name(model)
+        if not (brand and model) or len(brand) < MIN_KEY_LEN or len(model) < MIN_KEY_LEN: return None, None
+        exact = self.by_brand_model.get((brand, model))
+        if exact: return exact, None
+        return None, (brand, model)
+
+    def match_brand_model(self, brand: Any, model: Any) -> Optional[int]:
+        exact, key = self._exact_or_key(brand, model)
+        if key is None: return exact
+        brand, model = key
+        for r in self._candidate_rows(brand, model):
+            if self._brand_ok(brand, self._brand_codes[r]) and _similar(model, self._models[r]):
+                return int(self._ids[r])
+        return None
+
+    def match_brand_models(self, queries: List[tuple], workers: Optional[int] = None,
+                           chunk_size: int = FUZZY_CHUNK_SIZE) -> List[Optional[int]]:
+        """
+        match_brand_model for many (brand, model) queries at once. Every distinct candidate pair is
+        scored through the fuzzy engine (in parallel for big batches); results are the same.
+        """
+        results: List[Optional[int]] = [None] * len(queries)
+        pending = []
+        for qi, (brand, model) in enumerate(queries):
+            exact, key = self._exact_or_key(brand, model)
+            if key is None: results[qi] = exact; continue
+            rows = self._candidate_rows(*key)
+            if len(rows): pending.append((qi, key[0], key[1], rows))
+
+        brand_pairs = sorted({(b, self._brands[c]) for _, b, _, rows in pending for c in set(self._brand_codes[rows].tolist())})
+        model_pairs = sorted({(m, self._models[r]) for _, _, m, rows in pending for r in rows})
+        brand_ok = dict(zip(brand_pairs, (s > FUZZY_THRESHOLD for s in fuzzy_ratios(brand_pairs, workers, chunk_size))))
+        model_ok = dict(zip(model_pairs, (s > FUZZY_THRESHOLD for s in fuzzy_ratios(model_pairs, workers, chunk_size))))
+
+        for qi, brand, model, rows in pending:
+            for r in rows:
+                if brand_ok[(brand, self._brands[self._brand_codes[r]])] and model_ok[(model, self._models[r])]:
+                    results[qi] = int(self._ids[r])
+                    break
+        return results
+
+    def match(self, item: Dict[str, Any]) -> Optional[int]:
+        upc = canonical_upc(item.get('upc'))
+        if upc and upc in self.by_upc: return self.by_upc[upc]
+        asin = canonical_asin(item.get('asin'))
+        if asin and asin in self.by_asin: return self.by_asin[asin]
+        return self.match_brand_model(item.get('brand'), item.get('model'))
+
+# === RANKED CANDIDATES ===
+# Top-k products per lot by cosine similarity of character 3-gram TF-IDF vectors over the match keys
+# (brand, model, title tokens). Scores become confidences through a logistic (Platt) fit on lots that
+# are already linked; a UPC/ASIN key hit is certain.
+TOP_K = 5
+NGRAM = 3
+AUTO_LINK_CONFIDENCE = 0.9
+DEFAULT_PLATT = (12.0, -8.0)   # Used until enough linked lots exist: cosine 0.67 -> 0.5, 0.85 -> ~0.9
+MIN_CALIBRATION_LOTS = 30
+CALIBRATION_SAMPLE = 2000
+
+def _match_text(brand: Optional[str], model: Optional[str], title_sig: Optional[str]) -> str:
+    return " ".join(t for t in (brand, model, title_sig) if t)
+
+def _ngrams(text: str) -> Dict[str, int]:
+    grams: Dict[str, int] = {}
+    for tok in text.split():
+        padded = f" {tok} "
+        for i in range(max(1, len(padded) - NGRAM + 1)):
+            g = padded[i:i + NGRAM]
+            grams[g] = grams.get(g, 0) + 1
+    return grams
+
+def _sigmoid(x):
+    return 1.0 / (1.0 + np.exp(-x))
+
+class CandidateRanker:
+    """
+    Sparse TF-IDF index over product_match_keys. Products are stored twice: by row (CSR) for
+    scoring one pair, and as posting lists per n-gram (CSC) so a lot is scored against every
+    product with one bincount over the postings of its own n-grams.
+    """
+    def __init__(self, keys_df: pd.DataFrame):
+        keys_df = keys_df.sort_values("product_id")
+        self.ids = keys_df["product_id"].to_numpy(dtype=np.int64)
+        self.row_of = {int(pid): r for r, pid in enumerate(self.ids)}
+        self.by_upc: Dict[str, int] = {}
+        self.by_asin: Dict[str, int] = {}
+        for r, (upc, asin) in enumerate(zip(keys_df["upc_key"], keys_df["asin_key"])):
+            if upc: self.by_upc.setdefault(upc, r)
+            if asin: self.by_asin.setdefault(asin, r)
+
+        docs = [_ngrams(_match_text(b, m, t)) for b, m, t in zip(keys_df["brand_key"], keys_df["model_key"], keys_df["title_sig"])]
+        self.vocab: Dict[str, int] = {}
+        indptr, indices, tf = [0], [], []
+        for grams in docs:
+            for g, c in grams.items():
+                indices.append(self.vocab.setdefault(g, len(self.vocab)))
+                tf.append(c)
+            indptr.append(len(indices))
+        self.indptr = np.array(indptr, dtype=np.int64)
+        self.indices = np.array(indices, dtype=np.int64)
+
+        n = len(docs)
+        df = np.bincount(self.indices, minlength=len(self.vocab))
+        self.idf = np.log((1 + n) / (1 + df)) + 1.0
+        data = (1.0 + np.log(np.array(tf, dtype=np.float64))) * self.idf[self.indices] if indices else np.array([], dtype=np.float64)
+        norms = np.sqrt(np.add.reduceat(data ** 2, self.indptr[:-1])) if n and len(data) else np.zeros(n)
+        lengths = np.diff(self.indptr)
+        norms = np.where(lengths > 0, norms, 1.0)
+        self.data = data / np.repeat(norms, lengths)
+
+        # Column-major copy: postings per n-gram
+        order = np.argsort(self.indices, kind="stable")
+        self.post_rows = np.repeat(np.arange(n, dtype=np.int64), lengths)[order]
+        self.post_vals = self.data[order]
+        self.post_ptr = np.concatenate(([0], np.cumsum(df)))
+        self.platt = DEFAULT_PLATT
+
+    def _vectorize(self, text: str):
+        grams = [(self.vocab[g], c) for g, c in _ngrams(text).items() if g in self.vocab]
+        if not grams: return np.array([], dtype=np.int64), np.array([])
+        cols = np.array([g for g, _ in grams], dtype=np.int64)
+        vals = (1.0 + np.log(np.array([c for _, c in grams], dtype=np.float64))) * self.idf[cols]
+        return cols, vals / np.linalg.norm(vals)
+
+    def cosine_all(self, text: str) -> np.ndarray:
+        cols, vals = self._vectorize(text)
+        if not len(cols): return np.zeros(len(self.ids))
+        starts, stops = self.post_ptr[cols], self.post_ptr[cols + 1]
+        take = np.concatenate([np.arange(a, b) for a, b in zip(starts, stops)])
+        weights = self.post_vals[take] * np.repeat(vals, stops - starts)
+        return np.bincount(self.post_rows[take], weights=weights, minlength=len(self.ids))
+
+    def cosine_pair(self, text: str, product_id: int) -> float:
+        r = self.row_of.get(int(product_id))
+        if r is None: return 0.0
+        cols, vals = self._vectorize(text)
+        row_cols = self.indices[self.indptr[r]:self.indptr[r + 1]]
+        row_vals = self.data[self.indptr[r]:self.indptr[r + 1]]
+        common, qi, ri = np.intersect1d(cols, row_cols, return_indices=True)
+        return float(np.dot(vals[qi], row_vals[ri]))
+
+    def confidence(self, cosine):
+        a, b = self.platt
+        return _sigmoid(a * np.asarray(cosine, dtype=np.float64) + b)
+
+    def _exact_row(self, keys: tuple) -> Optional[int]:
+        upc, asin = keys[0], keys[1]
+        if upc and upc in self.by_upc: return self.by_upc[upc]
+        if asin and asin in self.by_asin: return self.by_asin[asin]
+        return None
+
+    def top_k(self, keys: tuple, k: int = TOP_K) -> List[tuple]:
+        """[(product_id, cosine, confidence), ...] best first. keys = (upc, asin, brand, model, title_sig)."""
+        if not len(self.ids): return []
+        scores = self.cosine_all(_match_text(*keys[2:]))
+        exact = self._exact_row(keys)
+        k = min(k, len(scores))
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.lexsort((self.ids[top], -scores[top]))]  # Score desc, then lowest id
+        conf = self.confidence(scores[top])
+        ranked = [(int(self.ids[r]), float(scores[r]), float(c)) for r, c in zip(top, conf) if scores[r] > 0]
+        if exact is not None:
+            ranked = [(int(self.ids[exact]), float(scores[exact]), 1.0)] + [c for c in ranked if c[0] != self.ids[exact]][:k - 1]
+        return ranked
+
+    def calibrate(self, keys: List[tuple], linked_ids: List[int], k: int = TOP_K) -> None:
+        """Platt fit of P(correct | cosine) on lots whose product is known."""
+        x, y = [], []
+        for item_keys, pid in zip(keys, linked_ids):
+            if self._exact_row(item_keys) is not None: continue  # Key hits don't need calibrating
+            for cand, cos, _ in self.top_k(item_keys, k):
+                x.append(cos)
+                y.append(1.0 if cand == pid else 0.0)
+        x, y = np.array(x), np.array(y)
+        n_pos, n_neg = y.sum(), len(y) - y.sum()
+        if n_pos < MIN_CALIBRATION_LOTS or n_neg < MIN_CALIBRATION_LOTS: return
+        t = np.where(y > 0, (n_pos + 1) / (n_pos + 2), 1 / (n_neg + 2))  # Platt's smoothed targets
+        A = np.column_stack([x, np.ones_like(x)])
+        w = np.array(DEFAULT_PLATT, dtype=np.float64)
+        for _ in range(50):
+            p = _sigmoid(A @ w)
+            grad = A.T @ (p - t)
+            hess = A.T @ (A * (p * (1 - p))[:, None]) + 1e-9 * np.eye(2)
+            step = np.linalg.solve(hess, grad)
+            w -= step
+            if np.abs(step).max() < 1e-8: break
+        self.platt = (float(w[0]), float(w[1]))
+
+_ranker_cache: Dict[tuple, CandidateRanker] = {}
+_ranker_lock = threading.Lock()
+
+def _lot_keys(item: Dict[str, Any]) -> tuple:
+    return (canonical_upc(item.get('upc')), canonical_asin(item.get('asin')), normalize_name(item.get('brand')),
+            normalize_name(item.get('model')), title_signature(item.get('title')))
+
+def get_candidate_ranker(conn: sqlite3.Connection) -> CandidateRanker:
+    """Ranker for the current catalog, rebuilt (and recalibrated) only when a match key changes."""
+    key = (db_file(conn), get_catalog_version(conn))
+    with _ranker_lock:
+        if key in _ranker_cache: return _ranker_cache[key]
+    ranker = CandidateRanker(pd.read_sql_query("SELECT product_id, upc_key, asin_key, brand_key, model_key, title_sig FROM product_match_keys", conn))
+    linked = pd.read_sql_query(f"""
+        SELECT id, upc, asin, brand, model, title, product_id FROM auction_items
+        WHERE product_id IS NOT NULL ORDER BY id DESC LIMIT {CALIBRATION_SAMPLE}
+    """, conn)
+    if not linked.empty:
+        ranker.calibrate([_lot_keys(it) for it in linked.to_dict("records")], linked["product_id"].astype(int).tolist())
+    with _ranker_lock:
+        _ranker_cache.clear()
+        _ranker_cache[key] = ranker
+    return ranker
+
+def rank_candidates(conn: sqlite3.Connection, auction_id: Optional[int] = None, item_ids: Optional[List[int]] = None,
+                    k: int = TOP_K, unlinked_only: bool = False) -> pd.DataFrame:
+    """
+    Top-k candidate products for each lot of an auction (or the given lots).
+    Columns: item_id, rank, product_id, score (cosine), confidence (0-1), title, brand, model.
+    """
+    cols = ["item_id", "rank", "product_id", "score", "confidence", KEY_DB_TITLE, KEY_DB_BRAND, KEY_DB_MODEL]
+    query = "SELECT id, upc, asin, brand, model, title FROM auction_items WHERE 1 = 1"
+    params: List[Any] = []
+    if auction_id is not None:
+        query += " AND auction_id = ?"
+        params.append(auction_id)
+    if item_ids is not None:
+        if not item_ids: return pd.DataFrame(columns=cols)
+        query += f" AND id IN ({','.join('?' * len(item_ids))})"
+        params += list(item_ids)
+    if unlinked_only: query += " AND product_id IS NULL"
+    items = pd.read_sql_query(query + " ORDER BY id", conn, params=params)
+    if items.empty: return pd.DataFrame(columns=cols)
+
+    ranker = get_candidate_ranker(conn)
+    rows = [(int(it['id']), rank, pid, score, conf)
+            for it in items.to_dict("records")
+            for rank, (pid, score, conf) in enumerate(ranker.top_k(_lot_keys(it), k), start=1)]
+    ranked = pd.DataFrame(rows, columns=cols[:5])
+    if ranked.empty: return pd.DataFrame(columns=cols)
+    prods = pd.read_sql_query(f"""
+        SELECT id AS product_id, {KEY_DB_TITLE}, {KEY_DB_BRAND}, {KEY_DB_MODEL} FROM products
+        WHERE id IN ({','.join('?' * ranked['product_id'].nunique())})
+    """, conn, params=[int(p) for p in ranked['product_id'].unique()])
+    return ranked.merge(prods, on="product_id", how="left")[cols]
+
+@writes
+def link_items_to_product(conn: sqlite3.Connection, product_id: int, item_ids: List[int]) -> None:
+    _link_items(conn.cursor(), product_id, [int(i) for i in item_ids])
+
+# === BULK IMPORT ===
+PRODUCT_FIELDS = list(_prepare_product_fields({}).keys())
+
+def _read_import_source(source: Any, column_map: Optional[Dict[str, str]] = None) -> pd.DataFrame:
+    if isinstance(source, pd.DataFrame):
+        df = source.copy()
+    else:
+        name = str(getattr(source, "name", source)).lower()
+        # CSV cells stay text (UPC leading zeros); column affinity turns numbers back into REAL/INTEGER
+        df = pd.read_parquet(source) if name.endswith(".parquet") else pd.read_csv(source, dtype=str)
+    if column_map: df = df.rename(columns=column_map)
+    cols = [c for c in PRODUCT_FIELDS if c in df.columns]
+    if not cols: raise ValueError(f"No product columns found. Expected some of: {', '.join(PRODUCT_FIELDS)}")
+    df = df[cols].astype(object)
+    for col in cols:
+        df[col] = pd.Series([_clean_str(v) if isinstance(v, str) else (None if pd.isna(v) else v) for v in df[col]], index=df.index, dtype=object)
+    return df
+
+def _import_products(conn: sqlite3.Connection, df: pd.DataFrame) -> Dict[str, Any]:
+    cols = list(df.columns)
+    upcs = df[KEY_DB_UPC].tolist() if KEY_DB_UPC in cols else [None] * len(df)
+    asins = df[KEY_DB_ASIN].tolist() if KEY_DB_ASIN in cols else [None] * len(df)
+    keys = [(canonical_upc(u), canonical_asin(a)) for u, a in zip(upcs, asins)]
+
+    # Stage the file, then resolve existing products for all rows in one indexed pass
+    conn.execute("DROP TABLE IF EXISTS temp.import_rows")
+    conn.execute(f"CREATE TEMP TABLE import_rows (n INTEGER PRIMARY KEY, upc_key TEXT, asin_key TEXT, product_id INTEGER, action TEXT, {', '.join(cols)})")
+    conn.executemany(f"INSERT INTO temp.import_rows (n, upc_key, asin_key, {', '.join(cols)}) VALUES ({', '.join('?' * (len(cols) + 3))})",
+                     [(n, u, a) + tuple(row) for n, ((u, a), row) in enumerate(zip(keys, df.itertuples(index=False)))])
+    # Raw values are checked too: the UNIQUE columns compare them as stored, and values with no
+    # canonical key (malformed codes) would otherwise fail the whole write
+    upc_sql = "(SELECT p.id FROM products p WHERE p.upc = r.upc)" if KEY_DB_UPC in cols else "NULL"
+    asin_sql = "(SELECT p.id FROM products p WHERE p.asin = r.asin)" if KEY_DB_ASIN in cols else "NULL"
+    resolved = conn.execute(f"""
+        SELECT (SELECT MIN(k.product_id) FROM product_match_keys k WHERE k.upc_key = r.upc_key),
+               (SELECT MIN(k.product_id) FROM product_match_keys k WHERE k.asin_key = r.asin_key),
+               {upc_sql}, {asin_sql}
+        FROM temp.import_rows r ORDER BY r.n
+    """).fetchall()
+
+    actions, conflicts = [], []
+    seen_ids, seen_upc, seen_asin, seen_raw = set(), set(), set(), set()
+    for n, ((upc_key, asin_key), (upc_id, asin_id, raw_upc_id, raw_asin_id)) in enumerate(zip(keys, resolved)):
+        conflict = lambda reason: conflicts.append({"row": df.index[n], KEY_DB_UPC: upcs[n], KEY_DB_ASIN: asins[n], "reason": reason})
+        if upc_id and asin_id and upc_id != asin_id:
+            conflict(f"UPC matches #{upc_id}, ASIN matches #{asin_id}")
+            continue
+        target = upc_id or asin_id
+        raw = {(KEY_DB_UPC, upcs[n]), (KEY_DB_ASIN, asins[n])} - {(KEY_DB_UPC, None), (KEY_DB_ASIN, None)}
+        if (target and target in seen_ids) or (upc_key and upc_key in seen_upc) or (asin_key and asin_key in seen_asin) or raw & seen_raw:
+            conflict("Duplicate of an earlier row in the file")
+            continue
+        if raw_upc_id and raw_upc_id != target:
+            conflict(f"UPC is already used by #{raw_upc_id}")
+            continue
+        if raw_asin_id and raw_asin_id != target:
+            conflict(f"ASIN is already used by #{raw_asin_id}")
+            continue
+        if target: seen_ids.add(target)
+        if upc_key: seen_upc.add(upc_key)
+        if asin_key: seen_asin.add(asin_key)
+        seen_raw |= raw
+        actions.append((target, "update" if target else "insert", n))
+    conn.executemany("UPDATE temp.import_rows SET product_id = ?, action = ? WHERE n = ?", actions)
+
+    # Set-based writes: the FTS/version triggers batch far better inside one statement than per row.
+    # Updates only fill in what the file has; blanks never wipe existing data.
+    set_clause = ", ".join(f"{c} = COALESCE(r.{c}, products.{c})" for c in cols)
+    updated = conn.execute(f"UPDATE products SET {set_clause} FROM temp.import_rows r WHERE r.action = 'update' AND products.id = r.product_id").rowcount
+    last_id = conn.execute("SELECT IFNULL(MAX(id), 0) FROM products").fetchone()[0]
+    inserted = conn.execute(f"INSERT INTO products ({', '.join(cols)}) SELECT {', '.join(cols)} FROM temp.import_rows WHERE action = 'insert' ORDER BY n").rowcount
+    touched = [r[0] for r in conn.execute("SELECT product_id FROM temp.import_rows WHERE action = 'update' UNION ALL SELECT id FROM products WHERE id > ?", (last_id,))]
+    sync_match_keys(conn, touched)
+    reprice_shipping(conn, touched)
+    conn.execute("DROP TABLE temp.import_rows")
+    return {"inserted": inserted, "updated": updated, "conflicts": conflicts}
+
+def import_products(conn: sqlite3.Connection, source: Any, column_map: Optional[Dict[str, str]] = None) -> Dict[str, Any]:
+    """
+    Bulk upsert into the product library from a DataFrame or a CSV/Parquet path (or uploaded file).
+    Columns use product DB keys (rename others with column_map); unknown columns are ignored.
+    Rows resolve to existing products by UPC/ASIN match keys. All of it is one transaction.
+    Returns {'inserted': n, 'updated': n, 'conflicts': [{'row', 'upc', 'asin', 'reason'}, ...]}.
+    """
+    df = _read_import_source(source, column_map)
+    if df.empty: return {"inserted": 0, "updated": 0, "conflicts": []}
+    return run_write(conn, _import_products, df)
 
 # === NEW MERGE LOGIC ===
-def merge_products(conn: sqlite3.Connection, keep_id: int, merge_ids: List[int]) -> bool:
+EMPTY_SQL = "NULLIF(NULLIF({}, ''), 0)" # Same "missing" test as the old Python merge: NULL, "" or 0
+# Priced together from the master's own weight/dims by reprice_shipping, never filled from duplicates
+MERGE_REPRICED_COLS = (KEY_SHIP_COST, KEY_SHIP_METHOD, KEY_SHIP_RATE_VER, KEY_SHIP_DIMS_KEY)
+
+def _merge_groups(conn: sqlite3.Connection, groups: List[Tuple[int, List[int]]]) -> int:
     """
-    Merges duplicate products into a single Master record.
-    1. Moves auction items to Master.
-    2. Copies missing data from duplicates to Master.
-    3. Deletes duplicates.
+    Merges every (keep_id, merge_ids) group in the caller's transaction:
+    1. Moves auction items, ledger rows and price history to each master.
+    2. Deletes the duplicates (first, so their UPC/ASIN no longer block the master's).
+    3. Fills the master's empty columns from its duplicates, first non-empty in merge_ids order,
+       then reprices its shipping if the filled weight/dims changed.
     """
+    conn.execute("DROP TABLE IF EXISTS temp.merge_map")
+    conn.execute("CREATE TEMP TABLE merge_map (dup_id INTEGER PRIMARY KEY, keep_id INTEGER NOT NULL, pos INTEGER NOT NULL)")
+    keep_ids = {int(k) for k, _ in groups}
+    rows, seen = [], set()
+    for keep_id, merge_ids in groups:
+        for pos, mid in enumerate(merge_ids):
+            mid = int(mid)
+            # A master can't be merged away, and a duplicate only goes to the first group that claims it
+            if mid in keep_ids or mid in seen: continue
+            seen.add(mid)
+            rows.append((mid, int(keep_id), pos))
+    conn.executemany("INSERT INTO temp.merge_map VALUES (?, ?, ?)", rows)
+    conn.execute("DELETE FROM temp.merge_map WHERE keep_id NOT IN (SELECT id FROM products) OR dup_id NOT IN (SELECT id FROM products)")
+    if not conn.execute("SELECT 1 FROM temp.merge_map LIMIT 1").fetchone(): return 0
+
+    cols = [r[1] for r in conn.execute("PRAGMA table_info(products)") if r[1] not in ("id", "created_at")]
+    conn.execute("DROP TABLE IF EXISTS temp.merge_dups")
+    conn.execute(f"CREATE TEMP TABLE merge_dups AS SELECT m.keep_id, m.pos, {', '.join('p.' + c for c in cols)} FROM products p JOIN temp.merge_map m ON m.dup_id = p.id")
+    conn.execute("CREATE INDEX temp.idx_merge_dups ON merge_dups(keep_id, pos)")
+
+    for table in ("auction_items", "inventory_ledger", "product_price_history"):
+        conn.execute(f"UPDATE {table} SET product_id = m.keep_id FROM temp.merge_map m WHERE {table}.product_id = m.dup_id")
+    conn.execute("DELETE FROM product_price_stats WHERE product_id IN (SELECT dup_id FROM temp.merge_map)")
+    removed = conn.execute("DELETE FROM products WHERE id IN (SELECT dup_id FROM temp.merge_map)").rowcount
+
+    fill = ", ".join(
+        f"{c} = COALESCE({EMPTY_SQL.format(c)}, (SELECT d.{c} FROM temp.merge_dups d WHERE d.keep_id = products.id AND {EMPTY_SQL.format('d.' + c)} IS NOT NULL ORDER BY d.pos LIMIT 1), {c})"
+        for c in cols if c not in MERGE_REPRICED_COLS)
+    conn.execute(f"UPDATE products SET {fill} WHERE id IN (SELECT keep_id FROM temp.merge_map)")
+
+    # History moved under the masters: rebuild their running stats (quantiles follow on the next refresh)
+    conn.execute("DELETE FROM product_price_stats WHERE product_id IN (SELECT keep_id FROM temp.merge_map)")
+    conn.execute(f"""
+        INSERT INTO product_price_stats (product_id, sale_count, price_sum, price_sumsq, price_min, price_max, last_price, last_sold_date, ewma_price)
+        SELECT product_id, COUNT(*), SUM(sold_price), SUM(sold_price * sold_price), MIN(sold_price), MAX(sold_price),
+               (SELECT h2.sold_price FROM product_price_history h2 WHERE h2.product_id = h.product_id AND h2.sold_price IS NOT NULL ORDER BY h2.id DESC LIMIT 1),
+               {LAST_SOLD_DATE_SQL}, AVG(sold_price)
+        FROM product_price_history h
+        WHERE sold_price IS NOT NULL AND product_id IN (SELECT keep_id FROM temp.merge_map)
+        GROUP BY product_id
+    """)
+    conn.execute("""
+        UPDATE products SET avg_sold_price = ROUND(s.price_sum / s.sale_count, 2)
+        FROM product_price_stats s WHERE s.product_id = products.id AND s.sale_count > 0
+        AND products.id IN (SELECT keep_id FROM temp.merge_map)
+    """)
+    masters = [r[0] for r in conn.execute("SELECT DISTINCT keep_id FROM temp.merge_map")]
+    sync_match_keys(conn, masters)
+    reprice_shipping(conn, masters)
+    conn.execute("DROP TABLE temp.merge_dups")
+    conn.execute("DROP TABLE temp.merge_map")
+    return removed
+
+@writes
+def merge_products(conn: sqlite3.Connection, keep_id: int, merge_ids: List[int]) -> bool:
+    """Merges duplicate products into a single Master record (see _merge_groups)."""
     if not merge_ids: return False
-    
-    cursor = conn.cursor()
-    
-    # 1. Get Master Record
-    master = get_product_by_id(conn, keep_id)
-    if master is None: return False
-    master_data = master.to_dict()
-    
-    updates = {}
-    
-    # 2. Iterate through Duplicates to find missing data
-    for mid in merge_ids:
-        dup = get_product_by_id(conn, mid)
-        if dup is None: continue
-        dup_data = dup.to_dict()
-        
-        for key, val in dup_data.items():
-            # If Master is empty but Duplicate has value, copy it
-            if key in master_data and (master_data[key] is None or master_data[key] == "" or master_data[key] == 0):
-                if val is not None and val != "" and val != 0:
-                    master_data[key] = val # Update local ref
-                    updates[key] = val     # Queue for DB update
-
-    # 3. Update Master with new found data
-    if updates:
-        set_clause = ", ".join([f"{k} = ?" for k in updates.keys()])
-        values = list(updates.values()) + [keep_id]
-        cursor.execute(f"UPDATE products SET {set_clause} WHERE id = ?", values)
-
-    # 4. Move Auction Items
-    placeholders = ",".join("?" * len(merge_ids))
-    sql_relink = f"UPDATE auction_items SET product_id = ? WHERE product_id IN ({placeholders})"
-    cursor.execute(sql_relink, [keep_id] + merge_ids)
-    
-    # 5. Delete Duplicates
-    sql_delete = f"DELETE FROM products WHERE id IN ({placeholders})"
-    cursor.execute(sql_delete, merge_ids)
-    
-    conn.commit()
-    return True
\ No newline at end of file
+    return _merge_groups(conn, [(keep_id, merge_ids)]) > 0
+
+@writes
+def merge_product_groups(conn: sqlite3.Connection, groups: List[Tuple[int, List[int]]]) -> int:
+    """Merges many (keep_id, merge_ids) groups in one transaction. Returns how many duplicates were removed."""
+    if not groups: return 0
+    return _merge_groups(conn, groups)
@@ -0,0 +1,158 @@
+# utils/maintenance.py
+import os
+import time
+import sqlite3
+import argparse
+import pandas as pd
+from datetime import datetime, timedelta
+from typing import Dict, Any, List
+from utils.db import create_connection, rebuild_inventory_rollup, rebuild_sales_daily, find_legacy_history_duplicates
+from utils.writer import run_write, db_file, configure_connection, BUSY_TIMEOUT_S
+from utils.parse import KEY_DB_TITLE, KEY_DB_BRAND, KEY_IS_FAV
+
+# Orphan purge: products nothing refers to, lots whose auction is gone and history rows whose
+# product is gone. Found with NOT EXISTS on indexed keys, deleted in short writer jobs so
+# other writes interleave, then freed pages are handed back to the filesystem.
+PURGE_CHUNK = 500
+ORPHAN_DAYS = 30
+VACUUM_PAGES = 0  # incremental_vacuum(0) frees the whole freelist
+
+ORPHAN_PRODUCTS_SQL = f"""
+    SELECT p.id, p.{KEY_DB_TITLE}, p.{KEY_DB_BRAND}, p.created_at, p.{KEY_IS_FAV}
+    FROM products p
+    WHERE p.created_at < ?
+      AND NOT EXISTS (SELECT 1 FROM auction_items i WHERE i.product_id = p.id)
+      AND NOT EXISTS (SELECT 1 FROM inventory_ledger l WHERE l.product_id = p.id)
+      AND NOT EXISTS (SELECT 1 FROM product_price_history h WHERE h.product_id = p.id)
+"""
+
+def find_orphan_products(conn: sqlite3.Connection, days_old: int = ORPHAN_DAYS, include_favorites: bool = False) -> pd.DataFrame:
+    """Products older than days_old with no lots, no inventory and no sales history."""
+    cutoff = (datetime.now() - timedelta(days=days_old)).strftime("%Y-%m-%d")
+    query = ORPHAN_PRODUCTS_SQL + ("" if include_favorites else f" AND IFNULL(p.{KEY_IS_FAV}, 0) = 0")
+    return pd.read_sql_query(query + " ORDER BY p.id", conn, params=(cutoff,))
+
+def _delete_chunk(conn: sqlite3.Connection, table: str, ids: List[int]) -> int:
+    return conn.execute(f"DELETE FROM {table} WHERE id IN ({','.join('?' * len(ids))})", ids).rowcount
+
+def delete_in_chunks(conn: sqlite3.Connection, table: str, ids: List[int], chunk_size: int = PURGE_CHUNK) -> int:
+    """Deletes rows by id, one short writer transaction per chunk."""
+    deleted = 0
+    for start in range(0, len(ids), chunk_size):
+        deleted += run_write(conn, _delete_chunk, table, [int(i) for i in ids[start:start + chunk_size]])
+    return deleted
+
+def _orphan_ids(conn: sqlite3.Connection, days_old: int) -> Dict[str, List[int]]:
+    return {
+        "products": find_orphan_products(conn, days_old)["id"].tolist(),
+        # Lots left behind by an auction deleted without its items
+        "auction_items": [r[0] for r in conn.execute("SELECT i.id FROM auction_items i WHERE NOT EXISTS (SELECT 1 FROM auctions a WHERE a.id = i.auction_id)")],
+        # Sales of products deleted before merges/purges cleaned up after themselves
+        "product_price_history": [r[0] for r in conn.execute("SELECT h.id FROM product_price_history h WHERE NOT EXISTS (SELECT 1 FROM products p WHERE p.id = h.product_id)")],
+    }
+
+def _purge_side_tables(conn: sqlite3.Connection) -> None:
+    # Per-product side tables are small and keyed by product_id: one anti-join each
+    for table in ("product_price_stats", "product_match_keys", "duplicate_signatures"):
+        conn.execute(f"DELETE FROM {table} WHERE NOT EXISTS (SELECT 1 FROM products p WHERE p.id = {table}.product_id)")
+
+def _rebuild_rollups(conn: sqlite3.Connection) -> None:
+    rebuild_inventory_rollup(conn)
+    rebuild_sales_daily(conn)
+
+def _file_bytes(path: str) -> int:
+    return sum(os.path.getsize(p) for p in (path, path + "-wal") if os.path.exists(p))
+
+def reclaim_space(path: str) -> Dict[str, Any]:
+    """
+    Returns freed pages to the filesystem. VACUUM can't run inside a transaction, so this uses
+    its own autocommit connection rather than the writer. The first run switches the file to
+    auto_vacuum=INCREMENTAL, which takes one full VACUUM; later runs only trim the freelist.
+    """
+    conn = sqlite3.connect(path, timeout=BUSY_TIMEOUT_S, isolation_level=None)
+    try:
+        configure_connection(conn)
+        freelist = conn.execute("PRAGMA freelist_count").fetchone()[0]
+        converted = conn.execute("PRAGMA auto_vacuum").fetchone()[0] != 2
+        if converted:
+            conn.execute("PRAGMA auto_vacuum = INCREMENTAL")
+            conn.execute("VACUUM")
+        else:
+            # Each step frees one page; executescript steps the pragma to completion
+            conn.executescript(f"PRAGMA incremental_vacuum({VACUUM_PAGES});")
+        conn.execute("PRAGMA wal_checkpoint(TRUNCATE)").fetchall()
+        return {"freed_pages": freelist, "full_vacuum": converted}
+    finally:
+        conn.close()
+
+def purge_orphans(conn: sqlite3.Connection, days_old: int = ORPHAN_DAYS, dry_run: bool = False,
+                  chunk_size: int = PURGE_CHUNK) -> Dict[str, Any]:
+    """
+    Deletes orphan products (see find_orphan_products), lots of deleted auctions and history rows
+    of deleted products, then reclaims the space. Returns counts, file sizes and timings.
+    """
+    path = db_file(conn)
+    report: Dict[str, Any] = {"size_before": _file_bytes(path) if path else 0}
+    start = time.perf_counter()
+    ids = _orphan_ids(conn, days_old)
+    report["find_s"] = time.perf_counter() - start
+    report["found"] = {table: len(found) for table, found in ids.items()}
+    if dry_run: return report
+
+    start = time.perf_counter()
+    report["deleted"] = {table: delete_in_chunks(conn, table, found, chunk_size) for table, found in ids.items()}
+    run_write(conn, _purge_side_tables)
+    # Triggers keep the rollups current; a full rebuild after bulk deletes is cheap insurance
+    run_write(conn, _rebuild_rollups)
+    report["delete_s"] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    if path: report.update(reclaim_space(path))
+    report["vacuum_s"] = time.perf_counter() - start
+    report["size_after"] = _file_bytes(path) if path else 0
+    return report
+
+def dedupe_legacy_history(conn: sqlite3.Connection, confirm: bool = False) -> Dict[str, Any]:
+    """
+    Reports suspected repeated closes among pre-lot history rows (see
+    db.find_legacy_history_duplicates) and deletes the extra copies only when confirm is set.
+    Deletes go through the stats triggers, so counts and averages follow.
+    """
+    suspects = find_legacy_history_duplicates(conn)
+    ids = [i for *_, extra in suspects for i in extra]
+    report = {"groups": suspects, "found": len(ids), "deleted": 0}
+    if confirm and ids:
+        report["deleted"] = delete_in_chunks(conn, "product_price_history", ids)
+        run_write(conn, _rebuild_rollups)
+    return report
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Purge orphaned rows and reclaim database space")
+    parser.add_argument("--db", type=str, default="auctions.db")
+    parser.add_argument("--days", type=int, default=ORPHAN_DAYS, help="only purge products created more than this many days ago")
+    parser.add_argument("--dry-run", action="store_true", help="count orphans without deleting")
+    parser.add_argument("--dedupe-history", action="store_true", help="report sales recorded twice by repeated closes before history was keyed by lot")
+    parser.add_argument("--confirm", action="store_true", help="with --dedupe-history: delete the reported copies")
+    args = parser.parse_args()
+    conn = create_connection(args.db)
+    if args.dedupe_history:
+        try:
+            report = dedupe_legacy_history(conn, args.confirm)
+        finally:
+            conn.close()
+        for source, product_id, price, date, copies, extra in report["groups"]:
+            print(f"🔁 {source}: product #{product_id} ${price} on {date} x{copies} -> {len(extra)} extra")
+        if report["deleted"]: print(f"🧹 Removed {report['deleted']} duplicated price-history rows.")
+        elif report["found"]: print(f"⚠️ {report['found']} suspected copies. A close that really sold everything this many times looks the same; re-run with --confirm to delete them.")
+        else: print("✅ No suspected duplicates.")
+        raise SystemExit
+    try:
+        report = purge_orphans(conn, args.days, args.dry_run)
+    finally:
+        conn.close()
+    mb = lambda n: n / (1024 * 1024)
+    for table, n in report["found"].items():
+        print(f"🏚️ {table}: {n} orphans" + (f", {report['deleted'][table]} deleted" if "deleted" in report else ""))
+    print(f"⏱️ Find {report['find_s']:.2f}s" + (f", delete {report['delete_s']:.2f}s, vacuum {report['vacuum_s']:.2f}s" if "deleted" in report else ""))
+    if "size_after" in report:
+        print(f"💾 {mb(report['size_before']):.1f} MB -> {mb(report['size_after']):.1f} MB ({report['freed_pages']} free pages reclaimed{', converted to incremental auto-vacuum' if report['full_vacuum'] else ''})")
@@ -1,6 +1,7 @@
 # utils/parse.py
 import pandas as pd
 import re
+from typing import Optional, Tuple
 
 # === PAGE PATHS ===
 PAGE_ACTIVE = "pages/1_Active_Viewer.py"
@@ -47,6 +48,11 @@ COL_TARGET = "Target List Price"
 COL_EST_PROFIT = "Est. Profit"
 COL_SOLD = "Sold Price"
 COL_AVG_SOLD = "Avg Sold"
+COL_COMP_MEDIAN = "Comp Median"
+COL_COMP_COUNT = "Comps"
+COL_COMP_LAST = "Last Sale"
+COL_COMP_TREND = "90d Trend"
+COL_COMP_DAYS = "Days Since Sale"
 COL_PROFIT_REALIZED = "Realized Profit"
 COL_TOTAL_COST = "Total Cost"
 COL_STATUS = "Status"
@@ -89,6 +95,9 @@ KEY_LENGTH = "length"
 KEY_WIDTH = "width"
 KEY_HEIGHT = "height"
 KEY_IRREGULAR = "is_irregular"
+KEY_SHIP_METHOD = "ship_method"          # Cheapest service that can ship it (shipping.quote_cheapest)
+KEY_SHIP_RATE_VER = "ship_rate_version" # Rate tables shipping_cost_basis was priced with
+KEY_SHIP_DIMS_KEY = "ship_dims_key"     # ... and the weight/dimensions it was priced for
 
 # eBay Data
 KEY_EBAY_AVG_SOLD = "ebay_avg_sold_price"
@@ -134,6 +143,22 @@ KEY_PROD_ID = "product_id"
 KEY_AUC_ID = "auction_id"
 KEY_EST_PROFIT = "est_profit"
 KEY_STATUS = "status"
+KEY_LOT_NUM = "lot_num"       # Leading integer of the lot number (stored at ingest)
+KEY_LOT_SUFFIX = "lot_suffix" # Remainder of the lot number, lowercased
+KEY_LOT_SORT = "lot_sort"     # Natural-order rank of the lot within its auction
+KEY_COMP_MEDIAN = "comp_median" # Median realized price from product_price_stats
+KEY_COMP_COUNT = "comp_count"
+# get_market_trends_bulk output (one row per product)
+KEY_COMP_MEAN = "comp_mean"
+KEY_COMP_P25 = "comp_p25"
+KEY_COMP_P75 = "comp_p75"
+KEY_COMP_LAST = "comp_last_price"
+KEY_COMP_LAST_DATE = "comp_last_date"
+KEY_COMP_TREND = "comp_trend_slope" # $/day, least squares over the trend window
+KEY_COMP_DAYS = "comp_days_since"
+KEY_SOURCE_AUCTION = "source_auction_id" # product_price_history: (auction, lot) a sale came from
+KEY_SOURCE_LOT = "source_lot"
+KEY_SALE_CATEGORY = "sale_category" # inventory_ledger: the product's category when the row was sold
 
 # AI/Scraper Keys
 KEY_SCRAPED_MSRP = "Scraped MSRP"
@@ -155,6 +180,59 @@ def normalize_value(val: str) -> str:
     if "unable" in val or "untested" in val: return "Unable To Test"
     return val.title()
 
+LOT_PATTERN = re.compile(r'^\s*(\d+)(.*)$')
+
+def lot_sort_key(lot) -> Tuple[Optional[int], str]:
+    """Splits a lot number into (leading integer, suffix) so "2" < "10" < "10A" < "B5"."""
+    text = str(lot or "").strip()
+    m = LOT_PATTERN.match(text)
+    if m: return int(m.group(1)), m.group(2).strip().lower()
+    return None, text.lower()
+
+# Match keys (product_match_keys): normalized forms used to link lots and spot duplicates
+TOKEN_PATTERN = re.compile(r'[a-z0-9]+')
+GTIN_LENGTHS = (8, 12, 13, 14)
+
+def _key_text(val) -> Optional[str]:
+    if val is None: return None
+    s = str(val).strip()
+    if not s or s.lower() in ("nan", "none"): return None
+    return s
+
+def gtin_check_ok(digits: str) -> bool:
+    """Mod-10 check digit shared by EAN-8, UPC-A, EAN-13 and GTIN-14."""
+    body = digits[:-1][::-1]
+    total = sum(int(d) * (3 if i % 2 == 0 else 1) for i, d in enumerate(body))
+    return (10 - total % 10) % 10 == int(digits[-1])
+
+def canonical_upc(val) -> Optional[str]:
+    """
+    Valid UPC/EAN/GTIN codes lose their leading zeros, so a UPC-A and its EAN-13 form compare equal.
+    Anything that isn't a valid code keeps its raw alphanumerics (exact matches still work).
+    """
+    s = _key_text(val)
+    if not s: return None
+    s = "".join(ch for ch in s if ch.isalnum()).upper()
+    if s.isdigit() and len(s) in GTIN_LENGTHS and gtin_check_ok(s):
+        return s.lstrip("0") or None
+    return s or None
+
+def canonical_asin(val) -> Optional[str]:
+    s = _key_text(val)
+    if not s: return None
+    return "".join(ch for ch in s if ch.isalnum()).upper() or None
+
+def normalize_name(val) -> Optional[str]:
+    """Brand/model key: lowercased, whitespace collapsed."""
+    s = _key_text(val)
+    return " ".join(s.lower().split()) if s else None
+
+def title_signature(val) -> Optional[str]:
+    """Sorted distinct title tokens: word order, case and punctuation don't matter."""
+    s = _key_text(val)
+    if not s: return None
+    return " ".join(sorted(set(TOKEN_PATTERN.findall(s.lower())))) or None
+
 def classify_risk(row: pd.Series) -> str:
     # Use keys that match the DataFrame columns (usually lowercase DB keys)
     cond = str(row.get(KEY_DB_COND, "")).strip().lower()
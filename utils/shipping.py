@@ -1,5 +1,21 @@
 # utils/shipping.py
+import os
 import math
+import json
+import time
+import hashlib
+import sqlite3
+import argparse
+import numpy as np
+import pandas as pd
+from functools import lru_cache
+from typing import Dict, Tuple, Union, Optional, List, Any
+from utils.writer import writes
+from utils.db import create_connection
+from utils.parse import (
+    KEY_SHIP_COST, KEY_SHIP_METHOD, KEY_SHIP_RATE_VER, KEY_SHIP_DIMS_KEY,
+    KEY_WEIGHT_LBS, KEY_WEIGHT_OZ, KEY_LENGTH, KEY_WIDTH, KEY_HEIGHT
+)
 
 # Official 2025 USPS Ground Advantage Retail - Zone 9 Rates
 # Source: Book1.pdf (Pages 4-6)
@@ -99,4 +115,254 @@ def estimate_shipping(lbs: float, oz: float = 0, length: float = 0, width: float
     if price == 0:
         return 0.0 # Error state (too heavy/large)
 
-    return price + surcharge
\ No newline at end of file
+    return price + surcharge
+
+# === VECTORIZED RATE ENGINE ===
+# Same rules as estimate_shipping, for whole arrays of packages and any number of services.
+# A service is a per-zone rate table plus size rules. Each zone table is compiled once into
+# ascending weight breakpoints + prices; a package pays the price of the first breakpoint >=
+# its rated weight (np.searchsorted), and can't ship past the last one.
+
+ZONE_9_OUNCE_RATES = {0.25: 8.40, 0.50: 9.25, 0.75: 11.10}  # 4/8/12 oz; 15.999 oz bills as 1 lb
+
+# Only Zone 9 has been transcribed from the rate book; add a zone with its ounce tiers,
+# pound table and oversized price.
+GROUND_ADVANTAGE = {
+    "carrier": "USPS", "service": "Ground Advantage",
+    "zones": {9: {"ounces": ZONE_9_OUNCE_RATES, "pounds": ZONE_9_RATES, "oversized": OVERSIZED_PRICE}},
+    "dim_divisor": 166.0, "dim_min_cu_ft": 1.0,     # Retail dim weight above 1 cu ft
+    "oversized_lg": 108.0, "max_lg": 130.0,          # Length + girth limits
+    "nonstandard_length": [[22.0, 30.0, 4.00], [30.0, None, 8.40]],  # (above, up to, fee) inches
+    "nonstandard_volume": [2.0, 18.00],              # (above, fee) cu ft
+}
+
+# Service name -> table. Extra carriers/services are JSON files in RATES_DIR (see load_rate_tables).
+SHIPPING_SERVICES: Dict[str, Dict] = {}
+RATES_DIR = "rates"
+RATE_TABLE_ERRORS: Dict[str, str] = {}  # Rate files skipped by the last load_rate_tables
+DEFAULT_SERVICE = "USPS Ground Advantage"
+DEFAULT_ZONE = 9
+
+ArrayLike = Union[float, np.ndarray, list]
+
+def register_service(table: Dict) -> str:
+    """
+    Adds (or replaces) a service. Only carrier, service and zones are required; a missing
+    rule disables it (no dim weight, no size limits, no surcharges). Returns the service name.
+    """
+    name = f"{table['carrier']} {table['service']}"
+    SHIPPING_SERVICES[name] = {
+        "carrier": table["carrier"], "service": table["service"],
+        # JSON keys arrive as strings
+        "zones": {int(z): {"ounces": {float(w): float(p) for w, p in (t.get("ounces") or {}).items()},
+                           "pounds": {float(w): float(p) for w, p in t["pounds"].items()},
+                           "oversized": t.get("oversized")}
+                  for z, t in table["zones"].items()},
+        "dim_divisor": table.get("dim_divisor"), "dim_min_cu_ft": table.get("dim_min_cu_ft") or 0.0,
+        "oversized_lg": table.get("oversized_lg"), "max_lg": table.get("max_lg"),
+        "nonstandard_length": [list(r) for r in table.get("nonstandard_length") or []],
+        "nonstandard_volume": list(table["nonstandard_volume"]) if table.get("nonstandard_volume") else None,
+    }
+    _compiled_service.cache_clear()
+    return name
+
+def load_rate_tables(path: str = RATES_DIR) -> List[str]:
+    """
+    Registers every <path>/*.json rate table. A file has the same shape as GROUND_ADVANTAGE:
+    {"carrier": "...", "service": "...", "zones": {"9": {"ounces": {"0.25": 5.1}, "pounds": {"1": 7.2, ...},
+    "oversized": null}}, ...rules}. Pound keys are the heaviest weight (lbs) each price covers.
+    A file that can't be read or parsed is skipped (the rest still load) and recorded in
+    RATE_TABLE_ERRORS as file name -> reason.
+    """
+    RATE_TABLE_ERRORS.clear()
+    if not os.path.isdir(path): return []
+    names = []
+    for name in sorted(os.listdir(path)):
+        if not name.endswith(".json"): continue
+        previous = dict(SHIPPING_SERVICES)
+        try:
+            with open(os.path.join(path, name)) as f:
+                service = register_service(json.load(f))
+            _compiled_service(service)  # Surfaces bad breakpoints/rules now rather than mid-quote
+            names.append(service)
+        except (OSError, ValueError, KeyError, TypeError, AttributeError, IndexError) as e:
+            SHIPPING_SERVICES.clear()
+            SHIPPING_SERVICES.update(previous)
+            _compiled_service.cache_clear()
+            RATE_TABLE_ERRORS[name] = f"{type(e).__name__}: {e}"
+            print(f"⚠️ Skipped rate table {name}: {RATE_TABLE_ERRORS[name]}")
+    return names
+
+@lru_cache(maxsize=None)
+def _compiled_service(name: str) -> Dict:
+    if name not in SHIPPING_SERVICES:
+        raise ValueError(f"Unknown shipping service {name!r}")
+    svc = SHIPPING_SERVICES[name]
+    zones = {}
+    for zone, table in svc["zones"].items():
+        tiers = sorted(table["ounces"].items()) + sorted(table["pounds"].items())
+        # Trailing 0.0 is what searchsorted lands on past the heaviest breakpoint: not shippable
+        zones[zone] = (np.array([w for w, _ in tiers], dtype=float), np.array([p for _, p in tiers] + [0.0], dtype=float),
+                       float(table["oversized"] or 0.0))
+    inf = lambda v: math.inf if v is None else float(v)
+    return {"zones": zones, "dim_divisor": svc["dim_divisor"], "dim_min_cu_ft": float(svc["dim_min_cu_ft"]),
+            "oversized_lg": inf(svc["oversized_lg"]), "max_lg": inf(svc["max_lg"]),
+            "nonstandard_length": [(float(a), inf(b), float(fee)) for a, b, fee in svc["nonstandard_length"]],
+            "nonstandard_volume": svc["nonstandard_volume"]}
+
+def _as_array(values: ArrayLike, n: int) -> np.ndarray:
+    arr = np.nan_to_num(np.asarray(values, dtype=float), nan=0.0)
+    return np.broadcast_to(arr, (n,)) if arr.ndim == 0 else arr
+
+def _packages(lbs, oz, length, width, height, zone) -> Dict[str, Any]:
+    # Service-independent measurements, computed once per batch
+    n = max(np.size(v) for v in (lbs, oz, length, width, height, zone))
+    # Sorted per package with min/max (cheaper than np.sort on 3 values): L longest, H shortest
+    a, b, c = _as_array(length, n), _as_array(width, n), _as_array(height, n)
+    lo, hi = np.minimum(a, b), np.maximum(a, b)
+    L, H = np.maximum(hi, c), np.minimum(lo, c)
+    W = np.maximum(lo, np.minimum(hi, c))
+    return {"n": n, "total_lbs": _as_array(lbs, n) + _as_array(oz, n) / 16.0, "L": L,
+            "has_dims": (L != 0) & (W != 0) & (H != 0), "length_girth": L + 2 * (W + H), "cubic": L * W * H,
+            "zone": int(zone) if np.ndim(zone) == 0 else np.asarray(zone, dtype=int)}
+
+def _price(svc: Dict, pkg: Dict, strict: bool) -> np.ndarray:
+    # One service over a batch; 0.0 where it can't ship (or has no rates for the zone, unless strict)
+    n, has_dims, L, total_lbs = pkg["n"], pkg["has_dims"], pkg["L"], pkg["total_lbs"]
+    too_large = has_dims & (pkg["length_girth"] > svc["max_lg"])
+    oversized = has_dims & (pkg["length_girth"] > svc["oversized_lg"])
+
+    volume_cu_ft = pkg["cubic"] / 1728.0
+    rated = total_lbs
+    if svc["dim_divisor"]:
+        dim_weight = pkg["cubic"] / svc["dim_divisor"]
+        rated = np.where(has_dims & (volume_cu_ft > svc["dim_min_cu_ft"]) & (dim_weight > total_lbs), dim_weight, total_lbs)
+
+    surcharge = np.zeros(n)
+    for above, up_to, fee in svc["nonstandard_length"]:
+        surcharge += np.where(has_dims & (L > above) & (L <= up_to), fee, 0.0)
+    if svc["nonstandard_volume"]:
+        surcharge += np.where(has_dims & (volume_cu_ft > svc["nonstandard_volume"][0]), svc["nonstandard_volume"][1], 0.0)
+
+    zone, base = pkg["zone"], np.zeros(n)
+    for z in ([zone] if np.ndim(zone) == 0 else np.unique(zone)):
+        if int(z) not in svc["zones"]:
+            if strict: raise ValueError(f"No rates loaded for zone {z}")
+            continue
+        bounds, prices, oversized_price = svc["zones"][int(z)]
+        if np.ndim(zone) == 0:
+            base = np.where(oversized, oversized_price, prices[np.searchsorted(bounds, rated, side="left")])
+        else:
+            mask = zone == z
+            base[mask] = np.where(oversized[mask], oversized_price, prices[np.searchsorted(bounds, rated[mask], side="left")])
+    return np.where((base == 0) | too_large, 0.0, base + surcharge)
+
+def quote_shipping(lbs: ArrayLike, oz: ArrayLike = 0, length: ArrayLike = 0, width: ArrayLike = 0,
+                   height: ArrayLike = 0, zone: Union[int, ArrayLike] = DEFAULT_ZONE,
+                   service: str = DEFAULT_SERVICE) -> np.ndarray:
+    """
+    Vectorized estimate_shipping for one service: one price per package, 0.0 where it can't ship.
+    Arguments are scalars or equal-length arrays (missing values count as 0); `zone` may be
+    per package. For Ground Advantage zone 9 the result equals estimate_shipping element for element.
+    """
+    return _price(_compiled_service(service), _packages(lbs, oz, length, width, height, zone), strict=True)
+
+def quote_cheapest(lbs: ArrayLike, oz: ArrayLike = 0, length: ArrayLike = 0, width: ArrayLike = 0,
+                   height: ArrayLike = 0, zone: Union[int, ArrayLike] = DEFAULT_ZONE,
+                   services: Optional[List[str]] = None) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Cheapest service that can ship each package, across `services` (default: all loaded).
+    Returns (prices, service names); 0.0 and None where no service can ship it.
+    """
+    names = list(services or SHIPPING_SERVICES)
+    pkg = _packages(lbs, oz, length, width, height, zone)
+    prices = np.vstack([_price(_compiled_service(name), pkg, strict=False) for name in names])
+    prices[prices <= 0] = np.inf
+    best = prices.argmin(axis=0)  # ties go to the earlier service
+    cost = prices[best, np.arange(pkg["n"])]
+    ok = np.isfinite(cost)
+    return np.where(ok, cost, 0.0), np.where(ok, np.array(names, dtype=object)[best], None)
+
+register_service(GROUND_ADVANTAGE)
+load_rate_tables()
+
+# === STORED COST BASIS ===
+# products.shipping_cost_basis is priced by this job, not by the research form. Each row keeps the
+# rate-table version and the weight/dims it was priced for; only rows where either moved reprice.
+SHIP_INPUT_COLS = [KEY_WEIGHT_LBS, KEY_WEIGHT_OZ, KEY_LENGTH, KEY_WIDTH, KEY_HEIGHT]
+SHIP_DIMS_KEY_SQL = " || '|' || ".join(f"IFNULL({c}, 0)" for c in SHIP_INPUT_COLS)
+HAS_WEIGHT_SQL = f"(IFNULL({KEY_WEIGHT_LBS}, 0) > 0 OR IFNULL({KEY_WEIGHT_OZ}, 0) > 0)"
+
+def rate_table_version() -> str:
+    """Fingerprint of every loaded service's rates and rules; changes whenever a table is edited."""
+    tables = {name: {**svc, "zones": {z: {k: sorted(v.items()) if isinstance(v, dict) else v for k, v in t.items()}
+                                       for z, t in svc["zones"].items()}}
+              for name, svc in SHIPPING_SERVICES.items()}
+    return hashlib.sha1(json.dumps({"services": tables, "zone": DEFAULT_ZONE}, sort_keys=True).encode()).hexdigest()[:12]
+
+@writes
+def reprice_shipping(conn: sqlite3.Connection, product_ids: Optional[List[int]] = None) -> int:
+    """
+    Prices shipping_cost_basis (cheapest service, stored in ship_method) for every product with
+    a weight whose dimensions or rate-table version changed since it was last priced (limited
+    to product_ids if given), in one vectorized pass. Returns the number of products repriced.
+    """
+    version = rate_table_version()
+    scope, params = "", [version]
+    if product_ids is not None:
+        scope, params = "AND id IN (SELECT value FROM json_each(?))", params + [json.dumps([int(i) for i in product_ids])]
+    stale = pd.read_sql_query(f"""
+        SELECT id, {', '.join(SHIP_INPUT_COLS)}, {SHIP_DIMS_KEY_SQL} AS dims_key FROM products
+        WHERE {HAS_WEIGHT_SQL} AND ({KEY_SHIP_RATE_VER} IS NOT ? OR {KEY_SHIP_DIMS_KEY} IS NOT {SHIP_DIMS_KEY_SQL}) {scope}
+    """, conn, params=params)
+    # Weight removed since pricing: stop tracking, keep whatever cost was entered
+    conn.execute(f"UPDATE products SET {KEY_SHIP_RATE_VER} = NULL, {KEY_SHIP_DIMS_KEY} = NULL WHERE {KEY_SHIP_RATE_VER} IS NOT NULL AND NOT {HAS_WEIGHT_SQL} {scope}", params[1:])
+    if stale.empty: return 0
+
+    costs, methods = quote_cheapest(*(pd.to_numeric(stale[c], errors="coerce").to_numpy(dtype=float) for c in SHIP_INPUT_COLS))
+    conn.execute("DROP TABLE IF EXISTS temp.ship_quotes")
+    conn.execute("CREATE TEMP TABLE ship_quotes (id INTEGER PRIMARY KEY, cost REAL, method TEXT, dims_key TEXT)")
+    conn.executemany("INSERT INTO temp.ship_quotes VALUES (?, ?, ?, ?)",
+                     zip(stale["id"].tolist(), costs.tolist(), methods.tolist(), stale["dims_key"].tolist()))
+    repriced = conn.execute(f"""
+        UPDATE products SET {KEY_SHIP_COST} = q.cost, {KEY_SHIP_METHOD} = q.method, {KEY_SHIP_DIMS_KEY} = q.dims_key, {KEY_SHIP_RATE_VER} = ?
+        FROM temp.ship_quotes q WHERE products.id = q.id
+    """, (version,)).rowcount
+    conn.execute("DROP TABLE temp.ship_quotes")
+    return repriced
+
+def _benchmark(n: int, seed: int = 0) -> None:
+    rng = np.random.default_rng(seed)
+    lbs = rng.integers(0, 80, n).astype(float)
+    oz = rng.integers(0, 16, n).astype(float)
+    dims = np.round(rng.uniform(0, 40, (3, n)), 1)
+    dims[:, rng.random(n) < 0.2] = 0  # some products have no dimensions
+    start = time.perf_counter()
+    scalar = np.array([estimate_shipping(*args) for args in zip(lbs, oz, *dims)])
+    scalar_s = time.perf_counter() - start
+    start = time.perf_counter()
+    vector = quote_shipping(lbs, oz, *dims)
+    vector_s = time.perf_counter() - start
+    mismatches = int(np.count_nonzero(scalar != vector))
+    print(f"📦 {n} packages: scalar {scalar_s:.3f}s, vectorized {vector_s:.4f}s ({scalar_s / vector_s:.0f}x), {mismatches} mismatches")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Shipping rate engine tools")
+    sub = parser.add_subparsers(dest="command", required=True)
+    p_reprice = sub.add_parser("reprice", help="reprice stored shipping costs whose dimensions or rates changed")
+    p_reprice.add_argument("--db", type=str, default="auctions.db")
+    p_bench = sub.add_parser("bench", help="benchmark the vectorized engine against estimate_shipping")
+    p_bench.add_argument("--packages", type=int, default=100_000)
+    args = parser.parse_args()
+    if args.command == "bench":
+        _benchmark(args.packages)
+    else:
+        conn = create_connection(args.db)
+        try:
+            start = time.perf_counter()
+            n = reprice_shipping(conn)
+        finally:
+            conn.close()
+        print(f"🚚 Repriced {n} products (rates {rate_table_version()}) in {time.perf_counter() - start:.2f}s")
+        if RATE_TABLE_ERRORS:
+            print(f"⚠️ {len(RATE_TABLE_ERRORS)} rate table(s) in {RATES_DIR}/ were skipped; fix them and rerun")
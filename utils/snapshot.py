@@ -0,0 +1,148 @@
+# utils/snapshot.py
+import os
+import json
+import shutil
+import sqlite3
+import argparse
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+from datetime import datetime
+from typing import Optional, List, Dict, Any
+from utils.db import create_connection
+from utils.writer import db_file, configure_connection, BUSY_TIMEOUT_S
+
+# Point-in-time Parquet copy of the tables analytics reads, so heavy reporting runs on
+# columnar data instead of contending with the scraper and UI for the live file:
+#   snapshot/<table>.parquet + snapshot/_snapshot.json
+SNAPSHOT_DIR = "snapshot"
+MANIFEST = "_snapshot.json"
+EXPORT_CHUNK = 50_000
+
+SNAPSHOT_TABLES = ("products", "product_price_history", "inventory_ledger", "auction_items")
+
+# Low-cardinality text columns, stored as Arrow dictionaries (pandas category on read)
+CATEGORICAL_COLS = {
+    "products": ["brand", "category", "ship_method", "amazon_cat_name", "amazon_subcat_name"],
+    "product_price_history": ["auction_source"],
+    "inventory_ledger": ["auction_source", "status", "sale_category"],
+    "auction_items": ["status", "brand", "packaging", "condition", "functional", "missing_parts", "damaged", "scraped_category", "lot_suffix"],
+}
+
+# Columns computed by SQLite at export time so snapshot results match the live queries exactly
+DERIVED_COLS = {
+    "inventory_ledger": [("sold_day", "date(sold_date)")],
+    "product_price_history": [("sold_day", "date(sold_date)")],
+}
+
+_SQL_TO_ARROW = {"INTEGER": pa.int64(), "BOOLEAN": pa.int64(), "REAL": pa.float64(), "TEXT": pa.string()}
+
+def _table_schema(conn: sqlite3.Connection, table: str) -> pa.Schema:
+    categorical = set(CATEGORICAL_COLS.get(table, []))
+    fields = []
+    for _, name, decl, *_ in conn.execute(f"PRAGMA table_info({table})"):
+        kind = _SQL_TO_ARROW.get(str(decl).upper(), pa.string())
+        fields.append(pa.field(name, pa.dictionary(pa.int32(), pa.string()) if name in categorical else kind))
+    fields += [pa.field(name, pa.string()) for name, _ in DERIVED_COLS.get(table, [])]
+    return pa.schema(fields)
+
+def _to_batch(rows: List[tuple], schema: pa.Schema) -> pa.RecordBatch:
+    # SQLite columns only have affinity: coerce stray values to the declared type
+    df = pd.DataFrame.from_records(rows, columns=schema.names)
+    for field in schema:
+        col = df[field.name]
+        if pa.types.is_integer(field.type):
+            df[field.name] = pd.to_numeric(col, errors="coerce").astype("Int64")
+        elif pa.types.is_floating(field.type):
+            df[field.name] = pd.to_numeric(col, errors="coerce").astype(float)
+        else:
+            df[field.name] = pd.Series([None if v is None or v != v else str(v) for v in col.tolist()], dtype=object)
+    return pa.RecordBatch.from_pandas(df, schema=schema, preserve_index=False)
+
+def _export_table(conn: sqlite3.Connection, table: str, path: str) -> int:
+    schema = _table_schema(conn, table)
+    select = ", ".join([f'"{f}"' for f in schema.names[:len(schema) - len(DERIVED_COLS.get(table, []))]]
+                       + [expr for _, expr in DERIVED_COLS.get(table, [])])
+    cur = conn.execute(f"SELECT {select} FROM {table} ORDER BY id")
+    rows = 0
+    with pq.ParquetWriter(path, schema, compression="zstd") as writer:
+        while True:
+            chunk = cur.fetchmany(EXPORT_CHUNK)
+            if not chunk: break
+            writer.write_batch(_to_batch(chunk, schema))
+            rows += len(chunk)
+    return rows
+
+def export_snapshot(conn: sqlite3.Connection, root: str = SNAPSHOT_DIR) -> Dict[str, Any]:
+    """
+    Writes SNAPSHOT_TABLES to root as Parquet, all read inside one transaction so the
+    tables agree with each other. The new snapshot replaces the old one only once complete.
+    Returns the manifest (created_at and row counts).
+    """
+    path = db_file(conn)
+    # A separate read connection keeps the long read transaction off the caller's connection
+    src = sqlite3.connect(path, timeout=BUSY_TIMEOUT_S, isolation_level=None) if path else conn
+    if path: configure_connection(src)
+    tmp = root.rstrip("/\\") + ".tmp"
+    shutil.rmtree(tmp, ignore_errors=True)
+    os.makedirs(tmp)
+    try:
+        began = not src.in_transaction
+        if began: src.execute("BEGIN")
+        try:
+            manifest = {"created_at": datetime.now().isoformat(timespec="seconds"), "source": path,
+                        "rows": {t: _export_table(src, t, os.path.join(tmp, f"{t}.parquet")) for t in SNAPSHOT_TABLES}}
+        finally:
+            if began: src.execute("COMMIT")
+        with open(os.path.join(tmp, MANIFEST), "w") as f: json.dump(manifest, f, indent=2)
+    except Exception:
+        shutil.rmtree(tmp, ignore_errors=True)
+        raise
+    finally:
+        if path: src.close()
+
+    old = root.rstrip("/\\") + ".old"
+    shutil.rmtree(old, ignore_errors=True)
+    if os.path.isdir(root): os.replace(root, old)
+    os.replace(tmp, root)
+    shutil.rmtree(old, ignore_errors=True)
+    return manifest
+
+class Snapshot:
+    """
+    Read-only handle on an exported snapshot. Pass it instead of a connection to the
+    analytics functions (see utils.analytics) to run them against the Parquet files.
+    """
+    def __init__(self, root: str = SNAPSHOT_DIR):
+        self.root = root
+        with open(os.path.join(root, MANIFEST)) as f:
+            self.manifest = json.load(f)
+
+    @property
+    def created_at(self) -> str:
+        return self.manifest["created_at"]
+
+    def table(self, name: str, columns: Optional[List[str]] = None, filters=None) -> pd.DataFrame:
+        """Reads one table with column pruning; `filters` as in pyarrow.parquet.read_table."""
+        if name not in SNAPSHOT_TABLES: raise KeyError(f"{name} is not in the snapshot")
+        table = pq.read_table(os.path.join(self.root, f"{name}.parquet"), columns=columns, filters=filters)
+        # Nullable ints keep ids exact; dictionaries become pandas categoricals
+        return table.to_pandas(types_mapper={pa.int64(): pd.Int64Dtype()}.get)
+
+def open_snapshot(root: str = SNAPSHOT_DIR) -> Optional[Snapshot]:
+    """The snapshot at root, or None if none has been exported yet."""
+    return Snapshot(root) if os.path.exists(os.path.join(root, MANIFEST)) else None
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Export analytics tables to a Parquet snapshot")
+    parser.add_argument("--db", type=str, default="auctions.db")
+    parser.add_argument("--out", type=str, default=SNAPSHOT_DIR)
+    args = parser.parse_args()
+    conn = create_connection(args.db)
+    try:
+        manifest = export_snapshot(conn, args.out)
+    finally:
+        conn.close()
+    for table, n in manifest["rows"].items():
+        print(f"📦 {table}: {n} rows")
+    print(f"✅ Snapshot written to {args.out} ({manifest['created_at']})")
@@ -0,0 +1,126 @@
+# utils/writer.py
+import queue
+import sqlite3
+import threading
+import functools
+from concurrent.futures import Future
+from typing import Any, Callable, Dict, Iterable, List
+
+# All mutations for a database file run on one writer thread with its own connection.
+# Jobs that pile up while a transaction is running are coalesced into the next one
+# (group commit), each inside its own SAVEPOINT so a failing job doesn't sink its batch.
+BUSY_TIMEOUT_S = 30
+MAX_BATCH = 500
+
+def configure_connection(conn: sqlite3.Connection) -> sqlite3.Connection:
+    """WAL lets readers keep reading while the writer commits."""
+    conn.execute(f"PRAGMA busy_timeout = {BUSY_TIMEOUT_S * 1000}")
+    conn.execute("PRAGMA journal_mode = WAL")
+    conn.execute("PRAGMA synchronous = NORMAL")
+    return conn
+
+class DatabaseWriter:
+    def __init__(self, db_path: str):
+        self.db_path = db_path
+        self._queue: "queue.Queue[tuple]" = queue.Queue()
+        self._thread = threading.Thread(target=self._run, name=f"db-writer:{db_path}", daemon=True)
+        self._thread.start()
+
+    def submit(self, op: Callable, *args, **kwargs) -> Future:
+        fut: Future = Future()
+        self._queue.put((op, args, kwargs, fut))
+        return fut
+
+    def is_writer_thread(self) -> bool:
+        return threading.current_thread() is self._thread
+
+    def _run(self) -> None:
+        conn = sqlite3.connect(self.db_path, timeout=BUSY_TIMEOUT_S, isolation_level=None, check_same_thread=False)
+        configure_connection(conn)
+        while True:
+            batch = [self._queue.get()]
+            while len(batch) < MAX_BATCH:
+                try: batch.append(self._queue.get_nowait())
+                except queue.Empty: break
+            self._run_batch(conn, batch)
+
+    def _run_batch(self, conn: sqlite3.Connection, batch: List[tuple]) -> None:
+        done = []
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            for op, args, kwargs, fut in batch:
+                if not fut.set_running_or_notify_cancel(): continue
+                conn.execute("SAVEPOINT job")
+                try:
+                    result = op(conn, *args, **kwargs)
+                    conn.execute("RELEASE job")
+                    done.append((fut, result, None))
+                except Exception as e:
+                    conn.execute("ROLLBACK TO job")
+                    conn.execute("RELEASE job")
+                    done.append((fut, None, e))
+            conn.execute("COMMIT")
+        except Exception as e:
+            # Commit (or BEGIN) failed: nothing in this batch was written
+            if conn.in_transaction: conn.execute("ROLLBACK")
+            for _, _, _, fut in batch:
+                if not fut.done(): fut.set_exception(e)
+            return
+        # Acks only go out once the batch is durable
+        for fut, result, err in done:
+            if err is not None: fut.set_exception(err)
+            else: fut.set_result(result)
+
+_writers: Dict[str, DatabaseWriter] = {}
+_writers_lock = threading.Lock()
+
+def get_writer(db_path: str) -> DatabaseWriter:
+    with _writers_lock:
+        if db_path not in _writers:
+            _writers[db_path] = DatabaseWriter(db_path)
+        return _writers[db_path]
+
+def db_file(conn: sqlite3.Connection) -> str:
+    """Absolute path of the connection's main database ('' for in-memory)."""
+    return conn.execute("PRAGMA database_list").fetchone()[2]
+
+def submit_write(conn: sqlite3.Connection, op: Callable, *args, **kwargs) -> Future:
+    """
+    Queues `op(write_conn, *args, **kwargs)` on the writer for conn's database.
+    Runs inline when already on the writer thread (nested mutations join the open batch)
+    and for in-memory databases, which a second connection can't see.
+    """
+    path = db_file(conn)
+    writer = get_writer(path) if path else None
+    if writer is not None and not writer.is_writer_thread():
+        return writer.submit(op, *args, **kwargs)
+
+    fut: Future = Future()
+    try:
+        result = op(conn, *args, **kwargs)
+        if writer is None: conn.commit()
+        fut.set_result(result)
+    except Exception as e:
+        if writer is None: conn.rollback()
+        else: raise
+        fut.set_exception(e)
+    return fut
+
+def run_write(conn: sqlite3.Connection, op: Callable, *args, **kwargs) -> Any:
+    """Like submit_write, but blocks until the write is committed and returns its result."""
+    return submit_write(conn, op, *args, **kwargs).result()
+
+def wait_all(futures: Iterable[Future]) -> List[Any]:
+    """Waits for queued writes; re-raises the first failure."""
+    return [f.result() for f in futures]
+
+def writes(fn: Callable) -> Callable:
+    """
+    Routes a `fn(conn, ...)` mutation through the writer. The body must not commit.
+    Callers block until it's committed, or pass wait=False to get a Future back.
+    """
+    @functools.wraps(fn)
+    def wrapper(conn, *args, wait: bool = True, **kwargs):
+        fut = submit_write(conn, fn, *args, **kwargs)
+        return fut.result() if wait else fut
+    return wrapper